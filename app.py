@@ -1,31 +1,18 @@
 import streamlit as st
-import pandas as pd
-import re
-import io
-import fitz  # PyMuPDF
-import pdfplumber
-from pdf2image import convert_from_bytes
-from PIL import Image
-import sqlite3
-import hashlib
+import functools
+import os
 import secrets
+import tempfile
 import time
 import threading
+from pathlib import Path
 
 import requests
-import streamlit.components.v1 as components
-
-import json
-from google.cloud import vision
-
-gcp_key = json.loads(st.secrets["gcp"]["key_json"])
-client = vision.ImageAnnotatorClient.from_service_account_info(gcp_key)
-
-from azure.cognitiveservices.vision.computervision import ComputerVisionClient
-from msrest.authentication import CognitiveServicesCredentials
 
 from user_auth import init_user_db, authenticate_user, add_user
-from db_logger import init_db, log_event, get_user_logs
+from db_logger import (init_db, log_event, get_user_logs_page, query_logs, log_filter_options, export_logs_csv,
+                       get_profiles)
+from result_cache import init_cache
 
 
 st.set_page_config(page_title="Precast Parser for Singapore PPVC/Precast", layout="centered")
@@ -48,13 +35,30 @@ if not hasattr(st, 'already_started_server'):
     t.start()
 
 
+# Admin log exports wait here until downloaded; a session's next export replaces its previous one,
+# and exports left behind by sessions that never came back are removed after LOG_EXPORT_MAX_AGE seconds
+LOG_EXPORT_DIR = Path(tempfile.gettempdir()) / "precast_log_exports"
+LOG_EXPORT_MAX_AGE = 3600
+
+def new_log_export_path():
+    """Create an empty file for a log export, removing expired exports first."""
+    LOG_EXPORT_DIR.mkdir(exist_ok=True)
+    cutoff = time.time() - LOG_EXPORT_MAX_AGE
+    for old in LOG_EXPORT_DIR.glob("*.csv"):
+        try:
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+        except FileNotFoundError:
+            pass  # removed by another session
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=LOG_EXPORT_DIR)
+    os.close(fd)
+    return path
+
+
 # Initialize databases
 init_user_db()
 init_db()
-
-# Initialize the Azure OCR client
-def init_azure_client(endpoint, key):
-    return ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
+init_cache()
 
 # Session state setup with CSRF protection
 if "csrf_token" not in st.session_state:
@@ -220,198 +224,418 @@ if st.button("Logout"):
 
 st.title(f"Welcome, {st.session_state.user_name}!")
 
+# Imported after login so the login page renders without loading pandas, PyMuPDF and the
+# extraction modules; Python caches them for later reruns and sessions in this process.
+# OCR SDKs are imported, and their clients created, when a method first needs them.
+import io
+from collections import ChainMap
+
+import pandas as pd
+from PIL import Image
+
+from pdf_text import TEXT_LAYER_METHODS, MAX_WORKERS, count_pages
+from zones import clean_zones, zones_for_page, list_templates, save_template, load_template
+from preview import render_preview
+from ingestion import ingest
+from engine import METHODS, OCR_METHODS, AUTO_METHOD, extract_components
+from jobs import QUEUED, DONE, FAILED, FINISHED, get_job_queue
+from export import EXPORT_FORMATS, available_formats, export_bytes
+from profiling import StageTimer, timing_percentiles
+from project import ProjectTakeoff
+from library import read_library
+from tesseract_ocr import TESSERACT_METHOD, PSM_MODES, tesseract_settings
+from preprocess import PREPROCESS_MODES, preprocess_settings
+from tiling import TILE_SIDE, tiling_settings
+
 # Admin Dashboard with secure queries
 if st.session_state.user_role == "admin":
     st.header("🔧 Admin Dashboard: All User Uploads")
-    conn = sqlite3.connect("data/extraction_log.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM extraction_logs ORDER BY timestamp DESC")
-    logs = cursor.fetchall()
-    conn.close()
-
-    # Get column names
-    conn = sqlite3.connect("data/extraction_log.db")
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA table_info(extraction_logs)")
-    columns = [info[1] for info in cursor.fetchall()]
-    conn.close()
-
-    df_logs = pd.DataFrame(logs, columns=columns)
-    st.dataframe(df_logs)
-    st.download_button("📥 Download Log", df_logs.to_csv(index=False), "logs.csv", "text/csv")
+
+    # Filters run in SQL and the log is read one page at a time
+    users, methods = log_filter_options()
+    filter_cols = st.columns(3)
+    user_filter = filter_cols[0].selectbox("User", ["All users"] + users)
+    method_filter = filter_cols[1].selectbox("Method", ["All methods"] + methods)
+    date_range = filter_cols[2].date_input("Date range", value=())
+    filters = {
+        "user_email": None if user_filter == "All users" else user_filter,
+        "method": None if method_filter == "All methods" else method_filter,
+        "start_date": date_range[0] if len(date_range) > 0 else None,
+        "end_date": date_range[-1] if len(date_range) > 0 else None,
+    }
+
+    # Cursors of the pages visited so far; None is the newest page
+    if st.session_state.get("admin_filters") != filters:
+        st.session_state.admin_filters = filters
+        st.session_state.admin_pages = [None]
+    pages = st.session_state.admin_pages
+
+    logs, columns, next_cursor = query_logs(before=pages[-1], **filters)
+    st.dataframe(pd.DataFrame(logs, columns=columns).drop(columns=["profile"]))
+
+    nav_cols = st.columns([1, 1, 3])
+    if nav_cols[0].button("⬅️ Newer", disabled=len(pages) == 1):
+        pages.pop()
+        st.rerun()
+    if nav_cols[1].button("Older ➡️", disabled=next_cursor is None):
+        pages.append(next_cursor)
+        st.rerun()
+    nav_cols[2].caption(f"Page {len(pages)}")
+
+    # Percentiles parse thousands of stored profiles, so they are computed only when asked for,
+    # and kept until the filters change rather than redone on every paging click
+    with st.expander("⏱️ Timing percentiles per method"):
+        if st.button("Compute percentiles"):
+            st.session_state.admin_percentiles = (filters, timing_percentiles(get_profiles(**filters)))
+        computed = st.session_state.get("admin_percentiles")
+        if computed and computed[0] == filters:
+            st.dataframe(computed[1], use_container_width=True)
+
+    # The export is written to a file in chunks, and only when asked for; the download reads it
+    # only when clicked, not on every rerun of the admin page
+    if st.button("Prepare CSV export"):
+        previous = st.session_state.get("log_export")
+        if previous and os.path.exists(previous[0]):
+            os.remove(previous[0])
+        export_path = new_log_export_path()
+        st.session_state.log_export = (export_path, export_logs_csv(export_path, **filters))
+    if st.session_state.get("log_export") and not os.path.exists(st.session_state.log_export[0]):
+        # Swept after LOG_EXPORT_MAX_AGE
+        st.session_state.log_export = None
+    if st.session_state.get("log_export"):
+        export_path, export_rows = st.session_state.log_export
+        st.download_button(f"📥 Download Log ({export_rows} rows)", lambda: Path(export_path).read_bytes(),
+                           "logs.csv", "text/csv")
     st.stop()
 
 # App for Users
-uploaded_file = st.file_uploader("Upload a PDF", type=["pdf"])
+@st.cache_resource(max_entries=4, show_spinner="Indexing the component library...")
+def load_component_library(data):
+    """The library index is built once per library file and shared by every session."""
+    return read_library(io.StringIO(data.decode("utf-8-sig")))
+
+project_mode = st.toggle("📚 Project mode: combine many drawings into one takeoff")
+uploaded_file = None if project_mode else st.file_uploader("Upload a PDF", type=["pdf"])
+library_file = st.file_uploader(
+    "🗂️ Component library (optional CSV of the project's component codes)", type=["csv"],
+    help="Extracted codes are matched against the library: OCR misreads are corrected and codes "
+         "that match nothing are left out.")
+library = load_component_library(library_file.getvalue()) if library_file else None
+
+def ocr_credentials(method, ocr_method, key):
+    """Credentials for an extraction; the OCR settings chosen here override the configured ones."""
+    reader = ocr_method if method == AUTO_METHOD else method
+    if reader not in OCR_METHODS:
+        return st.secrets
+    sections = ["tesseract"] if reader == TESSERACT_METHOD else ["preprocess", "tiling"]
+    try:
+        configured = {section: dict(st.secrets.get(section, {})) for section in sections}
+    except FileNotFoundError:
+        configured = {section: {} for section in sections}
+
+    if reader == TESSERACT_METHOD:
+        defaults = tesseract_settings(configured)
+        with st.expander("⚙️ Tesseract settings"):
+            cols = st.columns(2)
+            psm = cols[0].selectbox(
+                "Page segmentation mode", list(PSM_MODES), format_func=lambda mode: f"{mode}: {PSM_MODES[mode]}",
+                index=list(PSM_MODES).index(defaults["psm"]) if defaults["psm"] in PSM_MODES else 0,
+                key=f"{key}_psm")
+            dpi = cols[1].select_slider("Resolution (DPI)", [150, 200, 300, 400, 600], value=defaults["dpi"],
+                                        key=f"{key}_dpi", help="Higher finds smaller text but each page takes longer.")
+        chosen = {"tesseract": {"psm": psm, "dpi": dpi}}
+    else:
+        defaults = preprocess_settings(configured)
+        configured_side = tiling_settings(configured, reader)["tile_side"]
+        tile_side = configured_side or TILE_SIDE[reader]
+        with st.expander("⚙️ Upload image settings"):
+            cols = st.columns(3)
+            mode = cols[0].selectbox("Colour", list(PREPROCESS_MODES), format_func=PREPROCESS_MODES.get,
+                                     index=list(PREPROCESS_MODES).index(defaults["mode"]), key=f"{key}_mode",
+                                     help="Black and white uploads are the smallest; keep colour for faint scans.")
+            trim = cols[1].checkbox("Trim empty margins", value=defaults["trim"], key=f"{key}_trim")
+            deskew = cols[2].checkbox("Straighten skewed scans", value=defaults["deskew"], key=f"{key}_deskew")
+            tiled = st.checkbox(
+                "Split large sheets into overlapping tiles", value=bool(configured_side), key=f"{key}_tiles",
+                help=f"Sheets longer than {tile_side} px are sent as several images, so small labels are "
+                     "read at full resolution.")
+        chosen = {"preprocess": {"mode": mode, "trim": trim, "deskew": deskew},
+                  "tiling": {"tile_side": tile_side if tiled else 0}}
+    # st.secrets is read-only; the chosen settings are looked up in front of it
+    return ChainMap({section: {**configured[section], **chosen[section]} for section in sections}, st.secrets)
+
+ZONE_COLUMNS = ["Page", "Left %", "Top %", "Right %", "Bottom %"]
+
+def zones_to_rows(zones):
+    return [[zone["page"], zone["x0"] * 100, zone["y0"] * 100, zone["x1"] * 100, zone["y1"] * 100] for zone in zones]
+
+def rows_to_zones(rows):
+    return clean_zones([
+        {"page": row["Page"], "x0": row["Left %"] / 100, "y0": row["Top %"] / 100,
+         "x1": row["Right %"] / 100, "y1": row["Bottom %"] / 100}
+        for row in rows
+        if all(pd.notna(row[column]) for column in ZONE_COLUMNS[1:])
+    ])
+
+def draw_zones(image, zones):
+    """Outline zones on a rendered page image."""
+    from PIL import ImageDraw
+
+    image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    for zone in zones:
+        box = (zone["x0"] * width, zone["y0"] * height, zone["x1"] * width, zone["y1"] * height)
+        draw.rectangle(box, outline=(255, 85, 0), width=max(2, width // 300))
+    return image
+
+def run_extraction_job(job, upload, method, credentials, user_email, **options):
+    """Body of an extraction job; runs on a job worker thread, so it must not touch st.*."""
+    report = {}
+    with StageTimer() as timer:
+        df, from_cache = extract_components(
+            upload.path, method, credentials, file_hash=upload.file_hash,
+            report=report, timer=timer, progress=job.progress, **options,
+        )
+    # Secure logging
+    log_event(
+        user_email=user_email,
+        filename=upload.name,
+        method=method,
+        count=len(df),
+        feedback=None,
+        feedback_type=None,
+        file_hash=upload.file_hash,
+        profile=timer.summary()
+    )
+    return {"df": df, "from_cache": from_cache, "page_routes": report.get("page_routes"), "method": method,
+            "library_corrections": report.get("library_corrections"),
+            "library_unmatched": report.get("library_unmatched"), "ocr_uploads": report.get("ocr_uploads"),
+            "page_changes": report.get("page_changes")}
+
+@st.fragment(run_every=1.0)
+def extraction_progress(job_id):
+    """Progress of the session's running job, refreshed on its own; the whole page reruns when it ends."""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
 
-# Perform OCR using Azure
-def perform_azure_ocr(image_stream, client):
-    read_response = client.read_in_stream(image_stream, raw=True)
-    operation_location = read_response.headers["Operation-Location"]
-    operation_id = operation_location.split("/")[-1]
+    progress_cols = st.columns([4, 1])
+    if job.status == QUEUED:
+        progress_cols[0].progress(0.0, text=f"⏳ Queued behind {queue.position(job_id)} job(s)...")
+    else:
+        progress_cols[0].progress(job.fraction, text=f"🔄 Extracting {job.label}: {min(job.done, job.total)} of {job.total} pages")
+    if progress_cols[1].button("Cancel", key="cancel_extraction"):
+        queue.cancel(job_id)
+        st.rerun()
 
-    # Wait for OCR result
-    while True:
-        result = client.get_read_result(operation_id)
-        if result.status not in ['notStarted', 'running']:
-            break
-        time.sleep(1)
-
-    extracted_text = ""
-    if result.status == 'succeeded':
-        for page in result.analyze_result.read_results:
-            for line in page.lines:
-                extracted_text += line.text + "\n"
-    #debug
-   # st.text_area("🧾 Raw OCR Output", extracted_text, height=300)
-
-    return extracted_text
-
-#perform OCR using OCR Space
-def ocr_space_file(file, api_key, language='eng'):
-    """ OCR.Space API request with local file """
-    payload = {
-        'isOverlayRequired': False,
-        'apikey': api_key,
-        'language': language,
-        'OCREngine': 2  # optional: use engine 1 or 2
-    }
-    r = requests.post(
-        'https://api.ocr.space/parse/image',
-        files={'file': file},
-        data=payload,
-    )
-    result = r.json()
-    if result.get("IsErroredOnProcessing") or "ParsedResults" not in result:
-        return ""
-    return result["ParsedResults"][0]["ParsedText"]
-
-# perform OCR using Google Vision OCR
-def extract_text_google_vision(image):
-    from google.cloud.vision_v1 import types
-    import io
-
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-
-    content = img_byte_arr.read()
-    image = types.Image(content=content)
-
-    response = client.text_detection(image=image)
-    texts = response.text_annotations
-    return texts[0].description if texts else ""
-
-#Patterns using regex
-component_pattern = r'\b[1-2][A-Z]{1,3}[0-9a-zA-Z\-]*\b'
-bracket_pattern = r'\((?:\d+(?:-\d+)?(?:,\s*\d+(?:-\d+)?)*)\)'
-
-def count_levels(level_str):
-    level_str = level_str.strip("()")
-    total = 0
-    for part in level_str.split(","):
-        part = part.strip()
-        if "-" in part:
-            start, end = map(int, part.split("-"))
-            total += (end - start + 1)
-        elif part.isdigit():
-            total += 1
-    return total
-
-def extract_component_with_levels(text):
-    pairs = []
-    tokens = re.findall(rf'{component_pattern}|{bracket_pattern}', text)
-    current_component = None
-    levels = []
-
-    for token in tokens:
-        if re.match(component_pattern, token):
-            if current_component:
-                level_text = ", ".join(levels)
-                total_qty = sum(count_levels(lvl) for lvl in levels)
-                pairs.append((current_component, level_text, total_qty))
-            current_component = token
-            levels = []
-        elif re.match(bracket_pattern, token):
-            levels.append(token)
-
-    if current_component:
-        level_text = ", ".join(levels)
-        total_qty = sum(count_levels(lvl) for lvl in levels)
-        pairs.append((current_component, level_text, total_qty))
-
-    return pairs
-
-def extract_text(file, method):
-    text = ""
-    if method == "pdfplumber":
-        with pdfplumber.open(file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-    
-    elif method == "PyMuPDF":
-        doc = fitz.open(stream=file.read(), filetype="pdf")
-        for page in doc:
-            text += page.get_text()
-    
-    elif method == "OCR Space API":
-        images = convert_from_bytes(file.read(), dpi=300)
-        for img in images:
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
-            text += ocr_space_file(img_byte_arr, api_key=st.secrets["ocr_space"]["key"])
-
-    elif method == "Microsoft Azure OCR":
-        AZURE_ENDPOINT = st.secrets["azure"]["endpoint"]
-        AZURE_KEY = st.secrets["azure"]["key"]
-        client = init_azure_client(AZURE_ENDPOINT, AZURE_KEY)
-
-        images = convert_from_bytes(file.read())
-        for img in images:
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
-            text += perform_azure_ocr(img_byte_arr, client)
-    
-    elif method == "Google Vision OCR":
-        images = convert_from_bytes(file.read(), dpi=300)
-        for img in images:
-            text += extract_text_google_vision(img)
-    
-    return text
+@st.fragment(run_every=1.0)
+def project_progress(job_ids):
+    """Progress of the project's running jobs; the whole page reruns as each one ends, to add its result."""
+    queue = get_job_queue()
+    jobs = [queue.get(job_id) for job_id in job_ids]
+    if any(job is None or job.status in FINISHED for job in jobs):
+        st.rerun()
+
+    for job in jobs:
+        if job.status == QUEUED:
+            st.progress(0.0, text=f"⏳ {job.label}: queued")
+        else:
+            st.progress(job.fraction, text=f"🔄 {job.label}: {min(job.done, job.total)} of {job.total} pages")
+    if st.button("Cancel remaining", key="cancel_project"):
+        for job in jobs:
+            queue.cancel(job.id)
+        st.rerun()
+
+if project_mode:
+    project_files = st.file_uploader("Upload the project's PDFs", type=["pdf"], accept_multiple_files=True)
+    method = st.radio("Choose Extraction Method", METHODS, key="project_method")
+    ocr_method = None
+    if method == AUTO_METHOD:
+        ocr_method = st.selectbox("OCR service for scanned pages", OCR_METHODS, key="project_ocr_method")
+    layout_aware = st.checkbox("📍 Match levels to the nearest component on the sheet", key="project_layout_aware")
+    credentials = ocr_credentials(method, ocr_method, "project")
+    # Local OCR jobs share one process pool, so each can use every core
+    workers = MAX_WORKERS if TESSERACT_METHOD in (method, ocr_method) else 1
+
+    # Changing the method starts the takeoff over; the drawings are extracted again
+    queue = get_job_queue()
+    settings = (method, ocr_method, layout_aware, library.fingerprint if library else None,
+                repr(credentials.maps[0]) if isinstance(credentials, ChainMap) else None)
+    if (not isinstance(st.session_state.get("project"), ProjectTakeoff)
+            or st.session_state.get("project_settings") != settings):
+        for entry in (st.session_state.get("project_jobs") or {}).values():
+            if entry["job_id"]:
+                queue.cancel(entry["job_id"])
+        st.session_state.project = ProjectTakeoff()
+        st.session_state.project_jobs = {}
+        st.session_state.project_settings = settings
+    project = st.session_state.project
+    project_jobs = st.session_state.project_jobs
+
+    # Drawings taken out of the uploader leave the takeoff
+    current = {f.name: f for f in project_files or []}
+    for name in [name for name in project_jobs if name not in current]:
+        if project_jobs[name]["job_id"]:
+            queue.cancel(project_jobs[name]["job_id"])
+        project.remove(name)
+        del project_jobs[name]
+
+    # New and replaced drawings are extracted as jobs; an unchanged re-upload is kept as is
+    for name, f in current.items():
+        entry = project_jobs.get(name)
+        if entry is not None and entry["file_id"] == f.file_id:
+            continue
+        upload = ingest(f, name)
+        if entry is not None:
+            entry["file_id"] = f.file_id
+            if entry["file_hash"] == upload.file_hash and entry["status"] in (None, DONE):
+                continue
+            if entry["job_id"]:
+                queue.cancel(entry["job_id"])
+        job_id = queue.submit(
+            st.session_state.user_email, name,
+            functools.partial(run_extraction_job, upload=upload, method=method, credentials=credentials,
+                              user_email=st.session_state.user_email, ocr_method=ocr_method,
+                              layout_aware=layout_aware, library=library, workers=workers),
+            total=count_pages(upload.path),
+        )
+        project_jobs[name] = {"file_id": f.file_id, "file_hash": upload.file_hash, "job_id": job_id, "status": None}
+
+    # Fold in the drawings that finished since the last run; only their rows are grouped
+    running = []
+    for name, entry in project_jobs.items():
+        job = queue.get(entry["job_id"]) if entry["job_id"] else None
+        if job is None:
+            continue
+        if job.status not in FINISHED:
+            running.append(job.id)
+            continue
+        entry["job_id"] = None
+        entry["status"] = job.status if job.status != FAILED else f"failed: {job.error}"
+        if job.status == DONE:
+            project.add(name, entry["file_hash"], job.result["df"])
+
+    if running:
+        project_progress(running)
+
+    problems = {name: entry["status"] for name, entry in project_jobs.items()
+                if entry["status"] not in (None, DONE)}
+    for name, status in problems.items():
+        st.warning(f"{name}: {status}")
+
+    takeoff = project.table()
+    st.subheader(f"📊 Project takeoff: {len(project.drawings)} of {len(project_jobs)} drawings")
+    st.dataframe(takeoff, use_container_width=True)
+    with st.expander("Drawings in the takeoff"):
+        st.dataframe(project.summary(), use_container_width=True)
+
+    if len(takeoff):
+        export_cols = st.columns([1, 2])
+        export_label = export_cols[0].selectbox("Export format", available_formats(), label_visibility="collapsed",
+                                                key="project_export_format")
+        export_ext, export_mime = EXPORT_FORMATS[export_label]
+        export_cols[1].download_button(
+            f"📥 Download {export_label.split()[0]}",
+            lambda: export_bytes(takeoff, export_ext),
+            f"project_takeoff.{export_ext}",
+            mime=export_mime,
+            key="download_project_button"
+        )
+
+    display_footer()
+    st.stop()
 
 if uploaded_file:
-    st.subheader("👁️ Preview - Page 1")
+    # Spool and hash each upload once; everything below reads the spool file by path
+    upload = st.session_state.get("upload")
+    if (st.session_state.get("upload_id") != uploaded_file.file_id
+            or not upload or not os.path.exists(upload.path)):
+        st.session_state.upload_id = uploaded_file.file_id
+        st.session_state.upload = upload = ingest(uploaded_file, uploaded_file.name)
+
+    with st.expander("📐 Extraction zones (optional)"):
+        st.caption("Only text inside these regions is extracted or sent to OCR. Positions are % of the "
+                   "sheet width/height from the top-left corner; Page 0 applies a zone to every page.")
+        # Logout blanks every session key, so check the types rather than whether the keys exist
+        if not isinstance(st.session_state.get("zone_rows"), list):
+            st.session_state.zone_rows = []
+        if not isinstance(st.session_state.get("zone_editor_version"), int):
+            st.session_state.zone_editor_version = 0
+
+        templates = list_templates()
+        if templates:
+            template_cols = st.columns([3, 1])
+            template_name = template_cols[0].selectbox("Layout template", templates)
+            if template_cols[1].button("Load template"):
+                st.session_state.zone_rows = zones_to_rows(load_template(template_name))
+                st.session_state.zone_editor_version += 1
+
+        zone_table = st.data_editor(
+            pd.DataFrame(st.session_state.zone_rows, columns=ZONE_COLUMNS),
+            num_rows="dynamic",
+            use_container_width=True,
+            key=f"zone_editor_{st.session_state.zone_editor_version}",
+            column_config={
+                "Page": st.column_config.NumberColumn(min_value=0, step=1, default=0),
+                **{column: st.column_config.NumberColumn(min_value=0.0, max_value=100.0) for column in ZONE_COLUMNS[1:]},
+            },
+        )
+        zones = rows_to_zones(zone_table.to_dict("records"))
+
+        save_cols = st.columns([3, 1])
+        new_template_name = save_cols[0].text_input("Save zones as template", placeholder="e.g. A1 typical floor plan")
+        if save_cols[1].button("Save template"):
+            try:
+                save_template(new_template_name, zones)
+                st.success(f"Saved template '{new_template_name}'.")
+            except ValueError as e:
+                st.warning(str(e))
+
+    st.subheader("👁️ Preview")
     try:
-        uploaded_file.seek(0)
-        pages = convert_from_bytes(uploaded_file.read(), first_page=1, last_page=1)
-        st.image(pages[0], caption="First Page", use_container_width=True)
+        page_count = count_pages(upload.path)
+        preview_page = 1
+        if page_count > 1:
+            preview_page = st.number_input(f"Sheet (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1)
+        preview = render_preview(upload.path, upload.file_hash, preview_page)
+        page_zones = zones_for_page(zones, preview_page)
+        if page_zones:
+            preview = draw_zones(Image.open(io.BytesIO(preview)), page_zones)
+        st.image(preview, caption=f"Page {preview_page} of {page_count}", use_container_width=True)
     except Exception as e:
         st.error(f"Preview failed: {e}")
-    uploaded_file.seek(0)
-
-    # the methods of extraction, this list can be expanded as time goes by..
-    methods = [
-        "pdfplumber",
-        "PyMuPDF",
-        "OCR Space API",
-        "Microsoft Azure OCR",
-        "Google Vision OCR"
-    ]
-        
+
     method_desc = {
         "pdfplumber": "Extracts text using layout-aware parsing from PDF text layers.",
         "PyMuPDF": "Extracts block-level structured text using the PyMuPDF engine.",
         "OCR Space API": "Uses the OCR.Space cloud API for full image-based text recognition.",
         "Microsoft Azure OCR": "Extracts text via Microsoft Azure's Computer Vision OCR service.",
-        "Google Vision OCR": "Uses Google Vision API for advanced OCR extraction with layout detection."
+        "Google Vision OCR": "Uses Google Vision API for advanced OCR extraction with layout detection.",
+        TESSERACT_METHOD: "Runs Tesseract OCR on this server, a page per worker process; no cloud service is used.",
+        AUTO_METHOD: "Reads pages that have a text layer locally and sends only scanned pages to the chosen OCR service."
     }
 
     # method = st.radio("Choose extraction method", ["pdfplumber", "PyMuPDF", "OCR Space", "Microsoft Azure OCR", "Google Vision"])
-    method = st.radio("Choose Extraction Method", methods)
+    method = st.radio("Choose Extraction Method", METHODS)
+
+    ocr_method = None
+    if method == AUTO_METHOD:
+        ocr_method = st.selectbox("OCR service for scanned pages", OCR_METHODS)
+
+    layout_aware = st.checkbox(
+        "📍 Match levels to the nearest component on the sheet",
+        help="Use word positions instead of reading order, for drawings where the level label "
+             "sits beside or below the component code.")
+
+    credentials = ocr_credentials(method, ocr_method, "single")
+
+    workers = 1
+    local_ocr = TESSERACT_METHOD in (method, ocr_method)
+    if ((not layout_aware and method in TEXT_LAYER_METHODS) or local_ocr) and MAX_WORKERS > 1:
+        workers = st.slider("Worker processes", 1, MAX_WORKERS, MAX_WORKERS if local_ocr else min(4, MAX_WORKERS),
+                            help="Split pages across this many processes. Use 1 for small files.")
 
     with st.expander("ℹ️ Description of selected method"):
         st.markdown(method_desc[method])
@@ -427,81 +651,118 @@ if uploaded_file:
     else:
         st.session_state.current_method = method
 
-    # Extract button
-    if st.button("Extract Components & Levels"):
-        with st.spinner("🔄 Extracting..."):
-            uploaded_file.seek(0)
-            full_text = extract_text(uploaded_file, method)
-            pairs = extract_component_with_levels(full_text)
-            df = pd.DataFrame(pairs, columns=["Component Code", "Level(s)", "Component Quanity"])
-            df = df.drop_duplicates().sort_values("Component Code").reset_index(drop=True)
-            st.session_state.df = df
-            
-            # Clear previous download state on new extraction
-            if "download_clicked" in st.session_state:
-                st.session_state.download_clicked = False
-            if "excel_bytes" in st.session_state:
-                del st.session_state.excel_bytes
-
-        # Secure logging
-        log_event(
-            user_email=st.session_state.user_email,
-            filename=uploaded_file.name,
-            method=method,
-            count=len(df),
-            feedback=None,
-            feedback_type=None,
-            file_bytes=uploaded_file.getvalue()
+    # Extraction runs as a background job (jobs.py), so reruns from other widgets don't interrupt it
+    queue = get_job_queue()
+    job = queue.get(st.session_state.get("extraction_job") or "")
+    if st.button("Extract Components & Levels", disabled=job is not None and job.status not in FINISHED):
+        options = {"workers": workers, "ocr_method": ocr_method, "zones": zones, "layout_aware": layout_aware,
+                   "library": library}
+        st.session_state.extraction_job = queue.submit(
+            st.session_state.user_email, uploaded_file.name,
+            functools.partial(run_extraction_job, upload=upload, method=method, credentials=credentials,
+                              user_email=st.session_state.user_email, **options),
+            total=count_pages(upload.path),
         )
+        st.rerun()
 
-        st.toast(f"✅ Extracted {len(df)} components using {method}.")
+    if job is not None and job.status in FINISHED:
+        st.session_state.extraction_job = None
+        if job.status == DONE:
+            result = job.result
+            st.session_state.df = result["df"]
+            st.session_state.page_routes = result["page_routes"]
+            st.session_state.ocr_uploads = result["ocr_uploads"]
+            st.session_state.page_changes = result["page_changes"]
+            st.session_state.library_report = (result["library_corrections"], result["library_unmatched"])
+            # A new result can be downloaded (and logged) again
+            st.session_state.download_clicked = False
+            if result["from_cache"]:
+                st.toast(f"⚡ Loaded {len(result['df'])} components from cache ({result['method']}).")
+            else:
+                st.toast(f"✅ Extracted {len(result['df'])} components using {result['method']}.")
+        elif job.status == FAILED:
+            st.error(f"Extraction failed: {job.error}")
+        else:
+            st.warning("Extraction cancelled.")
+    elif job is not None:
+        extraction_progress(job.id)
+
+    # Results stay on screen across reruns (e.g. choosing an export format)
+    if st.session_state.get("page_changes"):
+        changes_df = pd.DataFrame(st.session_state.page_changes)
+        extracted = changes_df.loc[changes_df["status"] == "extracted", "page"].tolist()
+        if len(extracted) < len(changes_df):
+            st.info(f"♻️ {len(changes_df) - len(extracted)} of {len(changes_df)} sheets unchanged since an earlier "
+                    f"extraction; re-extracted {len(extracted)}"
+                    + (f" (pages {', '.join(map(str, extracted))})." if extracted else "."))
+            with st.expander("Per-page changes"):
+                st.dataframe(changes_df, use_container_width=True)
+
+    if st.session_state.get("page_routes"):
+        routes_df = pd.DataFrame(st.session_state.page_routes)
+        ocr_calls = int((routes_df["route"] == "ocr").sum())
+        st.info(f"🧭 {len(routes_df) - ocr_calls} of {len(routes_df)} pages needed no OCR "
+                f"({ocr_calls} OCR calls instead of {len(routes_df)}).")
+        skipped = routes_df.loc[routes_df["route"] == "skip", "page"].tolist()
+        if skipped:
+            st.warning(f"⚠️ {len(skipped)} page(s) had no text layer, images or drawings and were skipped as "
+                       f"blank: pages {', '.join(map(str, skipped))}.")
+        with st.expander("Per-page routing"):
+            st.dataframe(routes_df, use_container_width=True)
+
+    if st.session_state.get("ocr_uploads"):
+        uploads_df = pd.DataFrame(st.session_state.ocr_uploads)
+        sent, rendered = uploads_df["bytes"].sum(), uploads_df["rendered_bytes"].sum()
+        st.info(f"📦 Uploaded {sent / 1e6:.1f} MB for {len(uploads_df)} OCR image(s), "
+                f"{1 - sent / rendered:.0%} less than the rendered bitmaps.")
+        with st.expander("Upload size per image"):
+            uploads_df["saved"] = (1 - uploads_df["bytes"] / uploads_df["rendered_bytes"]).map("{:.1%}".format)
+            st.dataframe(uploads_df, use_container_width=True)
+
+    if st.session_state.get("library_report"):
+        corrections, unmatched = st.session_state.library_report
+        if corrections:
+            with st.expander(f"🗂️ {len(corrections)} code(s) corrected to the library"):
+                st.dataframe(pd.DataFrame(corrections, columns=["Extracted", "Library Code", "Edit Distance"])
+                             .value_counts().rename("Times").reset_index(), use_container_width=True)
+        if unmatched:
+            with st.expander(f"⚠️ {len(unmatched)} code(s) not in the library, left out"):
+                st.dataframe(pd.Series(unmatched, name="Extracted").value_counts().rename("Times").reset_index(),
+                             use_container_width=True)
+
+    if st.session_state.get("df") is not None:
+        st.dataframe(st.session_state.df, use_container_width=True)
+
+        # The file is built only when the download is clicked, not after every extraction
+        export_cols = st.columns([1, 2])
+        export_label = export_cols[0].selectbox("Export format", available_formats(), label_visibility="collapsed")
+        export_ext, export_mime = EXPORT_FORMATS[export_label]
+        export_df = st.session_state.df
+        download_clicked = export_cols[1].download_button(
+            f"📥 Download {export_label.split()[0]}",
+            lambda: export_bytes(export_df, export_ext),
+            f"components_with_levels.{export_ext}",
+            mime=export_mime,
+            key="download_export_button"
+        )
 
-        if st.session_state.df is not None:
-            st.dataframe(st.session_state.df, use_container_width=True)
-            
-            # Excel download
-            towrite = io.BytesIO()
-            if st.session_state.get("df") is not None:
-                st.session_state.df.to_excel(towrite, index=False, sheet_name="Components")
-                towrite.seek(0)
-                
-                # Store the Excel bytes in session state to prevent recomputation
-                if "excel_bytes" not in st.session_state:
-                    st.session_state.excel_bytes = towrite.getvalue()
-                
-                # Check if download was clicked previously
-                if "download_clicked" not in st.session_state:
-                    st.session_state.download_clicked = False
-                
-                # Create a download button
-                download_clicked = st.download_button(
-                    "📥 Download Excel", 
-                    st.session_state.excel_bytes, 
-                    "components_with_levels.xlsx", 
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="download_excel_button"
+        # Only log if newly clicked
+        if download_clicked and not st.session_state.get("download_clicked"):
+            st.session_state.download_clicked = True
+            try:
+                # Fix for NoneType + str issue
+                method_name = st.session_state.rated_method if st.session_state.rated_method else method
+                log_event(
+                    user_email=st.session_state.user_email,
+                    filename=f"{method_name}_download",
+                    method=method_name,
+                    count=len(st.session_state.df),
+                    feedback=f"📥 Downloaded {export_label.split()[0]}",
+                    feedback_type="download"
                 )
-                
-                # Only log if newly clicked
-                if download_clicked and not st.session_state.download_clicked:
-                    st.session_state.download_clicked = True
-                    try:
-                        # Fix for NoneType + str issue
-                        method_name = st.session_state.rated_method if st.session_state.rated_method else method
-                        log_event(
-                            user_email=st.session_state.user_email,
-                            filename=f"{method_name}_download",
-                            method=method_name,
-                            count=len(st.session_state.df),
-                            feedback="📥 Downloaded Excel",
-                            feedback_type="download"
-                        )
-                        st.toast("📦 Excel file downloaded successfully.")
-                    except Exception as e:
-                        st.warning(f"Logging issue: {e}")
-            else:
-                st.warning("⚠️ No data available to export. Please run an extraction first.")
-            
+                st.toast(f"📦 {export_label.split()[0]} file downloaded successfully.")
+            except Exception as e:
+                st.warning(f"Logging issue: {e}")
 
     # Feedback section in a container to ensure persistence
     with st.container():
@@ -590,19 +851,33 @@ if uploaded_file:
     if "history_refresh_key" not in st.session_state:
         st.session_state.history_refresh_key = time.time()
         
+    # Cursors of the history pages visited so far; None is the newest page
+    if not st.session_state.get("history_pages"):
+        st.session_state.history_pages = [None]
+
     # Add a refresh button for history
     if st.button("🔄 Refresh History"):
         st.session_state.history_refresh_key = time.time()
+        st.session_state.history_pages = [None]
         st.rerun()
         
     try:
-        user_logs = get_user_logs(st.session_state.user_email)
+        history_pages = st.session_state.history_pages
+        user_logs, next_cursor = get_user_logs_page(st.session_state.user_email, before=history_pages[-1])
         df_user_logs = pd.DataFrame(user_logs, columns=["Events", "method", "components count", "timestamp", "Activity"])
         df_user_logs['timestamp'] = pd.to_datetime(df_user_logs['timestamp']).dt.strftime('%Y-%m-%d %H:%M')
         
         # Display history in a container
         with st.container():
             st.dataframe(df_user_logs, use_container_width=True)
+
+        history_cols = st.columns([1, 1, 3])
+        if history_cols[0].button("⬅️ Newer", key="history_newer", disabled=len(history_pages) == 1):
+            history_pages.pop()
+            st.rerun()
+        if history_cols[1].button("Older ➡️", key="history_older", disabled=next_cursor is None):
+            history_pages.append(next_cursor)
+            st.rerun()
     except Exception as e:
         st.warning(f"Could not display history: {e}")
 
@@ -0,0 +1,237 @@
+"""Headless batch extraction of precast drawing PDFs.
+
+Processes a directory (searched recursively) or a manifest of PDFs across
+worker processes and writes one result table per file plus a combined table.
+With a cloud OCR service, files run as threads of this one process instead,
+so they share its rate-limited OCR scheduler (ocr_dispatch.py) and the
+service's limits hold for the whole batch.
+
+Usage:
+    python batch_extract.py drops/2024-06-01 --method PyMuPDF --out results --format csv xlsx
+    python batch_extract.py manifest.txt --method "Google Vision OCR" --secrets .streamlit/secrets.toml
+    python batch_extract.py scans/ --method "Tesseract (local)" --tesseract-psm 11 --tesseract-dpi 300
+
+A manifest is a text file with one PDF path per line (blank lines and lines
+starting with # are ignored) or a CSV with a "path" column; relative paths
+are resolved against the manifest's directory. Each file's outputs are
+named after its path below the directory or manifest it came from, with
+subfolders flattened (a/S-01.pdf -> a__S-01.csv). Run from the app directory so
+results are logged to the same data/extraction_log.db as the web app.
+"""
+import argparse
+import csv
+import functools
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from db_logger import init_db, log_event, flush_events
+from engine import METHODS, OCR_METHODS, AUTO_METHOD, extract_components, load_credentials
+from export import write_export
+from ingestion import ingest_path
+from library import load_library
+from pdf_text import TEXT_LAYER_METHODS
+from profiling import StageTimer
+from result_cache import init_cache
+from tesseract_ocr import TESSERACT_METHOD
+from zones import load_template
+
+FORMATS = ("csv", "xlsx", "parquet")
+DEFAULT_SECRETS = Path(".streamlit/secrets.toml")
+# Stem of the combined table; no per-file output may use it
+COMBINED_NAME = "combined"
+
+def find_inputs(sources):
+    """Expand directories and manifests into a de-duplicated list of (PDF path, label) pairs.
+
+    The label is the PDF's path relative to the directory or manifest it was
+    found through (just its name when given directly), made unique across the
+    inputs; it names the file's outputs and its rows in the combined table.
+    """
+    found = []
+    for source in map(Path, sources):
+        if source.is_dir():
+            found.extend((p, source) for p in sorted(p for p in source.rglob("*") if p.suffix.lower() == ".pdf"))
+        elif source.suffix.lower() == ".pdf":
+            found.append((source, None))
+        elif source.suffix.lower() == ".csv":
+            with open(source, newline="") as f:
+                found.extend((source.parent / row["path"], source.parent)
+                             for row in csv.DictReader(f) if row.get("path"))
+        else:
+            with open(source) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        found.append((source.parent / line, source.parent))
+
+    seen = set()
+    # Output names are compared case-insensitively, for case-insensitive file systems
+    names = {COMBINED_NAME}
+    unique = []
+    for path, root in found:
+        key = path.resolve()
+        if key in seen:
+            continue
+        seen.add(key)
+        label = _relative_label(path, root)
+        stem, suffix = label[:-len(path.suffix)], path.suffix
+        candidate, n = label, 1
+        while output_stem(candidate).lower() in names:
+            n += 1
+            candidate = f"{stem} ({n}){suffix}"
+        names.add(output_stem(candidate).lower())
+        unique.append((path, candidate))
+    return unique
+
+def _relative_label(path, root):
+    # Paths outside the root (or given directly) are labelled by their name alone
+    if root is not None:
+        relative = Path(os.path.relpath(path, root))
+        if relative.parts and ".." not in relative.parts:
+            return relative.as_posix()
+    return path.name
+
+def output_stem(label):
+    """File name stem of a PDF's outputs: its label without the extension, subfolders flattened."""
+    return Path(label).with_suffix("").as_posix().replace("/", "__")
+
+def write_table(df, path):
+    """Write a result table; the format follows the file extension."""
+    write_export(df, path, path.suffix.lower().lstrip("."))
+
+@functools.lru_cache(maxsize=1)
+def _worker_library(path):
+    # Each worker process builds the library index once and reuses it for every file
+    return load_library(path)
+
+def process_file(path, method, credentials, ocr_method, zones, layout_aware, use_cache, out_dir, formats,
+                 library_path=None, stem=None):
+    """Extract one PDF in a worker process (or thread) and write its per-file outputs; returns its timing profile too.
+
+    The outputs are named stem (the PDF's own stem by default) plus each format's extension.
+    """
+    with StageTimer() as timer:
+        # The PDF is hashed in chunks and then opened by path; it is never read into memory whole
+        with timer.stage("ingest"):
+            pdf = ingest_path(path)
+        df, from_cache = extract_components(
+            pdf.path, method, credentials, ocr_method=ocr_method, zones=zones,
+            layout_aware=layout_aware, file_hash=pdf.file_hash, use_cache=use_cache, timer=timer,
+            library=_worker_library(library_path) if library_path else None,
+        )
+        with timer.stage("write"):
+            for fmt in formats:
+                write_table(df, out_dir / f"{stem or Path(path).stem}.{fmt}")
+    return df, pdf.file_hash, from_cache, timer.summary()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or manifest files")
+    parser.add_argument("--method", default="PyMuPDF", choices=METHODS)
+    parser.add_argument("--ocr-method", choices=OCR_METHODS, help=f"OCR service for scanned pages with {AUTO_METHOD!r}")
+    parser.add_argument("--zones-template", help="Restrict extraction to a saved zone template")
+    parser.add_argument("--layout-aware", action="store_true", help="Match levels to the nearest component by position")
+    parser.add_argument("--library", help="CSV of the project's component codes to match extracted codes against")
+    parser.add_argument("--tesseract-psm", type=int, help=f"Page segmentation mode for {TESSERACT_METHOD!r}")
+    parser.add_argument("--tesseract-dpi", type=int, help=f"Render resolution for {TESSERACT_METHOD!r}")
+    parser.add_argument("--out", default="batch_results", help="Output directory")
+    parser.add_argument("--format", nargs="+", default=["csv"], choices=FORMATS, dest="formats")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Files extracted at once (as threads with a cloud OCR service)")
+    parser.add_argument("--secrets", default=str(DEFAULT_SECRETS), help="secrets.toml with OCR credentials")
+    parser.add_argument("--user", default="batch@localhost", help="User email recorded in the extraction log")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and don't update the result cache")
+    args = parser.parse_args(argv)
+
+    if args.method == AUTO_METHOD and not args.ocr_method:
+        parser.error(f"--ocr-method is required with {AUTO_METHOD!r}")
+
+    credentials = {}
+    # Text-layer methods and local OCR run without any keys
+    reader = args.ocr_method if args.method == AUTO_METHOD else args.method
+    if reader not in TEXT_LAYER_METHODS + (TESSERACT_METHOD,) and not Path(args.secrets).exists():
+        parser.error(f"{args.method} needs OCR credentials; {args.secrets} not found")
+    if Path(args.secrets).exists():
+        credentials = load_credentials(args.secrets)
+    overrides = {"psm": args.tesseract_psm, "dpi": args.tesseract_dpi}
+    credentials["tesseract"] = {**credentials.get("tesseract", {}),
+                                **{name: value for name, value in overrides.items() if value is not None}}
+
+    zones = load_template(args.zones_template) if args.zones_template else None
+    if args.library and not Path(args.library).exists():
+        parser.error(f"Component library {args.library} not found")
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error("No PDF files found")
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    init_db()
+    init_cache()
+
+    results = {}
+    failures = 0
+    if reader in OCR_METHODS and reader != TESSERACT_METHOD:
+        # Each process would have its own scheduler, multiplying the service's rate limits;
+        # the files' requests mostly wait on the network, so threads lose little
+        print(f"Extracting {len(inputs)} PDFs with {args.method} in {args.processes} threads")
+        pool = ThreadPoolExecutor(max_workers=args.processes)
+    else:
+        print(f"Extracting {len(inputs)} PDFs with {args.method} across {args.processes} processes")
+        # spawn, so each worker starts clean rather than inheriting this process's threads
+        pool = ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context("spawn"))
+    with pool:
+        futures = {
+            pool.submit(process_file, str(path), args.method, credentials, args.ocr_method, zones,
+                        args.layout_aware, not args.no_cache, out_dir, args.formats, args.library,
+                        output_stem(label)): (path, label)
+            for path, label in inputs
+        }
+        for future in as_completed(futures):
+            path, label = futures[future]
+            try:
+                df, file_hash, from_cache, profile = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {path}: {e}", file=sys.stderr)
+                continue
+
+            results[label] = df
+            log_event(
+                user_email=args.user,
+                filename=path.name,
+                method=args.method,
+                count=len(df),
+                feedback=None,
+                feedback_type="batch",
+                file_hash=file_hash,
+                profile=profile
+            )
+            reused = profile["counters"].get("pages_reused")
+            note = " (cached)" if from_cache else f" ({reused} unchanged pages reused)" if reused else ""
+            print(f"{label}: {len(df)} components in {profile['total']:.1f}s{note}")
+            if profile["counters"].get("pages_skipped"):
+                print(f"  {profile['counters']['pages_skipped']} blank page(s) skipped (no text layer, images "
+                      f"or drawings)")
+    flush_events()
+
+    if results:
+        combined = pd.concat(
+            [df.assign(**{"Source File": label}) for label, df in sorted(results.items())],
+            ignore_index=True,
+        )
+        combined = combined[["Source File"] + [c for c in combined.columns if c != "Source File"]]
+        for fmt in args.formats:
+            write_table(combined, out_dir / f"{COMBINED_NAME}.{fmt}")
+        print(f"Wrote {len(combined)} rows for {len(results)} files to {out_dir}")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,920 @@
+"""Performance measurements for the extraction pipeline.
+
+Usage:
+    python benchmark.py text drawings.pdf --workers 1 2 4 8
+    python benchmark.py parser [drawings.pdf] --chunks 200
+    python benchmark.py startup [--app app.py] --runs 5
+    python benchmark.py db --threads 32 --events 200
+    python benchmark.py suite --pages 20 --scanned 0.25 --json results.json [--compare baseline.json]
+    python benchmark.py export --rows 10000 100000 500000
+    python benchmark.py library --sizes 1000 10000 50000 --queries 2000
+    python benchmark.py tesseract --pages 8 --workers 1 2 4 --psm 11 --dpi 300
+    python benchmark.py preprocess --pages 4 --provider "OCR Space API" [--deskew]
+    python benchmark.py tiling --pages 4 --sheet A0 --tile-side 5000 --overlap 144
+    python benchmark.py revision --pages 40 --changed 3 --method pdfplumber
+"""
+import argparse
+import collections
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_text import TEXT_LAYER_METHODS, MAX_WORKERS, count_pages, extract_page_texts
+from component_parser import component_pattern, bracket_pattern, extract_components_from_pages
+
+def time_call(fn, repeat):
+    """Run fn `repeat` times and return the best wall time in seconds and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def serial_text_loop(pdf_bytes, method):
+    """The original single-process loop from app.extract_text, kept as the baseline."""
+    import io
+    import fitz
+    import pdfplumber
+
+    text = ""
+    if method == "pdfplumber":
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            for page in pdf.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text + "\n"
+    elif method == "PyMuPDF":
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        for page in doc:
+            text += page.get_text()
+    return text
+
+def bench_text(args):
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+    pages = count_pages(pdf_bytes)
+    print(f"{args.pdf}: {pages} pages")
+    print(f"{'method':<12} {'mode':<12} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+    for method in args.methods:
+        baseline, expected = time_call(lambda: serial_text_loop(pdf_bytes, method), args.repeat)
+        print(f"{method:<12} {'serial loop':<12} {baseline:>9.3f} {pages / baseline:>9.1f} {1.0:>8.2f}")
+
+        # extract_page_texts caps workers at the core count, so report what actually ran
+        for workers in sorted({min(w, MAX_WORKERS, pages) for w in args.workers}):
+            # Warm the pool first so process start-up is not counted against throughput
+            extract_page_texts(pdf_bytes, method, workers=workers)
+            elapsed, texts = time_call(lambda: extract_page_texts(pdf_bytes, method, workers=workers), args.repeat)
+            if "".join(texts) != expected:
+                raise SystemExit(f"{method} with {workers} workers produced different text than the serial loop")
+            print(f"{method:<12} {f'{workers} workers':<12} {elapsed:>9.3f} {pages / elapsed:>9.1f} {baseline / elapsed:>8.2f}")
+
+def reference_count_levels(level_str):
+    level_str = level_str.strip("()")
+    total = 0
+    for part in level_str.split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            total += (end - start + 1)
+        elif part.isdigit():
+            total += 1
+    return total
+
+def reference_extract_component_with_levels(text):
+    """The original per-token regex parser from app.py, kept for differential checks."""
+    pairs = []
+    tokens = re.findall(rf'{component_pattern}|{bracket_pattern}', text)
+    current_component = None
+    levels = []
+
+    for token in tokens:
+        if re.match(component_pattern, token):
+            if current_component:
+                level_text = ", ".join(levels)
+                total_qty = sum(reference_count_levels(lvl) for lvl in levels)
+                pairs.append((current_component, level_text, total_qty))
+            current_component = token
+            levels = []
+        elif re.match(bracket_pattern, token):
+            levels.append(token)
+
+    if current_component:
+        level_text = ", ".join(levels)
+        total_qty = sum(reference_count_levels(lvl) for lvl in levels)
+        pairs.append((current_component, level_text, total_qty))
+
+    return pairs
+
+def random_drawing_text(rng, tokens):
+    """Noisy OCR-like text mixing component codes, level brackets and near-misses."""
+    pieces = []
+    for _ in range(tokens):
+        pieces.append(rng.choice([
+            f"{rng.choice('12')}{rng.choice(['TD', 'AC', 'TC', 'S', 'W', 'CWD'])}{rng.randint(1, 9)}{rng.choice(['a', 'bX', ''])}-{rng.randint(1, 12)}",
+            f"({rng.randint(1, 9)})",
+            f"({rng.randint(1, 3)}, {rng.randint(4, 6)}-{rng.randint(7, 12)})",
+            f"({rng.randint(1, 3)},\n{rng.randint(4, 9)})",
+            "(2, 4-", "6)", "3A", "1a", "(x)", "LEVEL", "-CS", "12", "\n",
+        ]))
+        pieces.append(rng.choice([" ", "  ", "\n", "", ",", "("]))
+    return "".join(pieces)
+
+def random_chunks(rng, text, chunks):
+    """Split text at random offsets, including mid-token."""
+    cuts = sorted(rng.sample(range(1, len(text)), min(chunks - 1, len(text) - 1))) if len(text) > 1 else []
+    bounds = [0] + cuts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+# Regression cases for parsing against a library: (text, expected pairs)
+LIBRARY_CHECK_CODES = ["1TD2aX-3", "1TD2aX-5", "1AC2b-1"]
+LIBRARY_CHECK_CASES = [
+    # Numbers and words the OCR-tolerant pattern catches are ignored, not taken for codes
+    ("1TD2aX-3 1200 (2, 4-6)", [("1TD2aX-3", "(2, 4-6)", 4)]),
+    ("1TD2aX-3 ISSUE (2, 4-6)", [("1TD2aX-3", "(2, 4-6)", 4)]),
+    # A code missing from the library ends the one before it, and its levels are dropped with it
+    ("1TD2aX-3 (2, 4-6)\n2WX9z-7 (10-20)\n1AC2b-1 (3)", [("1TD2aX-3", "(2, 4-6)", 4), ("1AC2b-1", "(3)", 1)]),
+    # So does a misread that is equally close to two library codes
+    ("1AC2b-1 (3) ITD2aX-4 (5-9)", [("1AC2b-1", "(3)", 1)]),
+    # A misread close to one library code is corrected
+    ("ITD2aX-3 (2)", [("1TD2aX-3", "(2)", 1)]),
+]
+
+def bench_parser(args):
+    rng = random.Random(args.seed)
+
+    # Differential check: the streaming scanner must match the original parser exactly,
+    # however the text is split into chunks
+    for case in range(args.cases):
+        text = random_drawing_text(rng, rng.randint(1, 300))
+        expected = reference_extract_component_with_levels(text)
+        for chunks in (1, 2, 7, len(text)):
+            got = extract_components_from_pages(random_chunks(rng, text, chunks))
+            if got != expected:
+                raise SystemExit(f"Mismatch on case {case} split into {chunks} chunks:\n{text!r}")
+    print(f"differential check: {args.cases} random texts identical to the reference parser")
+
+    # Library check: what the library drops must not take quantities from the codes it keeps
+    from library import ComponentLibrary
+
+    library = ComponentLibrary(LIBRARY_CHECK_CODES)
+    for text, expected in LIBRARY_CHECK_CASES:
+        got = extract_components_from_pages([text], resolve=library.resolver())
+        if got != expected:
+            raise SystemExit(f"Library check failed on {text!r}: {got}")
+    print(f"library check: {len(LIBRARY_CHECK_CASES)} texts with dropped tokens parsed as expected")
+
+    if args.pdf:
+        import fitz
+        with fitz.open(args.pdf) as doc:
+            pages = [page.get_text() for page in doc]
+    else:
+        pages = [random_drawing_text(rng, 2000) for _ in range(args.chunks)]
+    text = "".join(pages)
+
+    baseline, expected = time_call(lambda: reference_extract_component_with_levels(text), args.repeat)
+    elapsed, got = time_call(lambda: extract_components_from_pages(pages), args.repeat)
+    if got != expected:
+        raise SystemExit("Streaming parser disagrees with the reference parser on the benchmark text")
+    mb = len(text.encode("utf-8")) / 1e6
+    print(f"{len(pages)} pages, {mb:.1f} MB, {len(expected)} components")
+    print(f"reference parser  {baseline:.3f} s  {mb / baseline:.1f} MB/s")
+    print(f"compiled scanner  {elapsed:.3f} s  {mb / elapsed:.1f} MB/s  ({baseline / elapsed:.2f}x)")
+
+# Modules that should not be loaded just to show the login page
+HEAVY_MODULES = ["pandas", "fitz", "pdfplumber", "pdf2image", "PIL.Image",
+                 "azure.cognitiveservices.vision.computervision", "google.cloud.vision"]
+
+# Run in a fresh interpreter: render the app's first page twice with Streamlit's
+# test runner and report the cold first run, the warm rerun and what got imported
+STARTUP_SCRIPT = """
+import json, os, sys, time
+from streamlit.testing.v1 import AppTest
+
+app, secrets_path = sys.argv[1], sys.argv[2]
+sys.path.insert(0, os.path.dirname(app))
+at = AppTest.from_file(app, default_timeout=300)
+if secrets_path:
+    import toml
+    for key, value in toml.load(secrets_path).items():
+        at.secrets[key] = value
+
+times = []
+for _ in range(2):
+    start = time.perf_counter()
+    at.run()
+    times.append(time.perf_counter() - start)
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+print(json.dumps({"first": times[0], "rerun": times[1], "modules": [m for m in sys.argv[3:] if m in sys.modules]}))
+"""
+
+def bench_startup(args):
+    app = os.path.abspath(args.app)
+    secrets_path = os.path.abspath(args.secrets) if args.secrets else ""
+    runs = []
+    for _ in range(args.runs):
+        # A scratch working directory, so the app's data/ databases start empty and stay out of the repo
+        with tempfile.TemporaryDirectory() as workdir:
+            out = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, app, secrets_path] + HEAVY_MODULES,
+                cwd=workdir, capture_output=True, text=True,
+            )
+        if out.returncode != 0:
+            raise SystemExit(f"App run failed:\n{out.stderr or out.stdout}")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    first = statistics.median(run["first"] for run in runs)
+    rerun = statistics.median(run["rerun"] for run in runs)
+    print(f"{app}: login page over {args.runs} fresh processes (median)")
+    print(f"first render  {first:.3f} s")
+    print(f"rerun         {rerun:.3f} s")
+    print(f"heavy modules loaded: {', '.join(runs[-1]['modules']) or 'none'}")
+
+def direct_log_event(row):
+    """The original db_logger.log_event: a new connection and a commit per event."""
+    conn = sqlite3.connect("data/extraction_log.db")
+    conn.execute(
+        "INSERT INTO extraction_logs (user_email, filename, method, component_count, timestamp, feedback,"
+        " feedback_type, file_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        row
+    )
+    conn.commit()
+    conn.close()
+
+def direct_user_logs(user_email):
+    conn = sqlite3.connect("data/extraction_log.db")
+    rows = conn.execute(
+        "SELECT filename, method, component_count, timestamp, feedback FROM extraction_logs"
+        " WHERE user_email = ? ORDER BY timestamp DESC",
+        (user_email,)
+    ).fetchall()
+    conn.close()
+    return rows
+
+def bench_db(args):
+    import db_logger
+    import db_pool
+
+    print(f"{args.threads} threads x {args.events} log events, a history read every {args.read_every} events")
+    print(f"{'mode':<8} {'seconds':>8} {'events/s':>9} {'p95 ms':>8} {'max ms':>8} {'errors':>7} {'rows':>7}")
+    cwd = os.getcwd()
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                os.mkdir("data")
+                db_logger.init_db()
+                db_pool.close_all()
+                if mode == "direct":
+                    # Put the file back in the default rollback journal mode the old code ran with
+                    with sqlite3.connect("data/extraction_log.db") as conn:
+                        conn.execute("PRAGMA journal_mode=DELETE")
+                    log, read = direct_log_event, direct_user_logs
+                else:
+                    db_logger.BATCHED_LOGGING = mode == "batched"
+                    log = lambda row: db_logger.log_event(*row[:6], file_hash=row[7])
+                    read = db_logger.get_user_logs
+
+                latencies = []
+                errors = []
+                lock = threading.Lock()
+                logged = [0]
+
+                def worker(index):
+                    email = f"user{index}@example.com"
+                    mine = []
+                    for n in range(args.events):
+                        row = (email, f"drawing{n}.pdf", "PyMuPDF", n, time.time(), None, None, f"{index:04x}{n:08x}")
+                        start = time.perf_counter()
+                        try:
+                            log(row)
+                            if n % args.read_every == 0:
+                                read(email)
+                        except sqlite3.OperationalError as e:
+                            with lock:
+                                errors.append(str(e))
+                            continue
+                        mine.append(time.perf_counter() - start)
+                    with lock:
+                        latencies.extend(mine)
+                        logged[0] += len(mine)
+
+                start = time.perf_counter()
+                threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                db_logger.flush_events()
+                elapsed = time.perf_counter() - start
+
+                with sqlite3.connect("data/extraction_log.db") as conn:
+                    rows = conn.execute("SELECT COUNT(*) FROM extraction_logs").fetchone()[0]
+                db_pool.close_all()
+            finally:
+                db_logger.BATCHED_LOGGING = True
+                os.chdir(cwd)
+
+        # Every call that didn't raise must have left exactly one row
+        if rows != logged[0]:
+            raise SystemExit(f"{mode}: {logged[0]} successful events but {rows} rows written")
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float("nan")
+        worst = latencies[-1] * 1000 if latencies else float("nan")
+        print(f"{mode:<8} {elapsed:>8.2f} {rows / elapsed:>9.0f} {p95:>8.1f} {worst:>8.1f} {len(errors):>7} {rows:>7}")
+        for message in sorted(set(errors)):
+            print(f"         {errors.count(message)} x {message}")
+
+SUITE_STAGES = ["PyMuPDF", "pdfplumber", "layout", "classify", "rasterize", "rasterize-zones", "parse", "excel"]
+
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+def _reset_peak_rss():
+    """Reset the peak-RSS counter where the OS allows it (Linux); returns the baseline in MB."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        return _peak_rss_mb()
+
+def _peak_rss_mb():
+    try:
+        return _proc_status_mb("VmHWM")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _label_recall(pairs, truth):
+    """Fraction of the generated (code, levels) labels the pipeline found."""
+    expected = collections.Counter(label for page in truth for label in page)
+    found = collections.Counter((code, levels) for code, levels, _ in pairs)
+    return sum((expected & found).values()) / max(1, sum(expected.values()))
+
+def suite_stage(stage, path, truth, repeat):
+    """Run one stage in this (fresh) process.
+
+    Inputs are prepared and modules imported before the memory baseline is
+    taken, so peak_mb is how far the stage raised RSS above that baseline.
+    """
+    from engine import components_dataframe
+    from pdf_text import extract_page_words, classify_pages
+    from rasterize import iter_page_images, iter_zone_images
+    from spatial import associate_components
+
+    result = {}
+    pages = count_pages(path)
+    units, unit = pages, "pages"
+
+    def count_images(images):
+        count = 0
+        for _ in images:
+            count += 1
+        return count
+
+    if stage in TEXT_LAYER_METHODS:
+        if stage == "pdfplumber":
+            import pdfplumber  # noqa: F401  (the import is not part of the timing)
+        fn = lambda: extract_page_texts(path, stage)
+    elif stage == "layout":
+        fn = lambda: associate_components(extract_page_words(path, "PyMuPDF"))
+    elif stage == "classify":
+        fn = lambda: classify_pages(path)
+    elif stage == "rasterize":
+        if not shutil.which("pdftoppm"):
+            return {"skipped": "poppler is not installed"}
+        import pdf2image  # noqa: F401
+        fn = lambda: count_images(iter_page_images(path, dpi=300))
+    elif stage == "rasterize-zones":
+        whole_page = [{"page": 0, "x0": 0.0, "y0": 0.0, "x1": 1.0, "y1": 1.0}]
+        fn = lambda: count_images(iter_zone_images(path, whole_page, dpi=300))
+    elif stage == "parse":
+        texts = extract_page_texts(path, "PyMuPDF")
+        units, unit = len("".join(texts).encode("utf-8")) / 1e6, "MB"
+        fn = lambda: extract_components_from_pages(texts)
+    elif stage == "excel":
+        import openpyxl  # noqa: F401
+        df = components_dataframe(extract_components_from_pages(extract_page_texts(path, "PyMuPDF")))
+        units, unit = len(df), "rows"
+        fn = lambda: df.to_excel(io.BytesIO(), index=False, sheet_name="Components")
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    baseline = _reset_peak_rss()
+    seconds, output = time_call(fn, repeat)
+    result.update({
+        "seconds": seconds,
+        "units": units,
+        "unit": unit,
+        "throughput": units / seconds if seconds else float("inf"),
+        "peak_mb": _peak_rss_mb() - baseline,
+    })
+
+    if truth is not None and stage in TEXT_LAYER_METHODS:
+        result["recall"] = _label_recall(extract_components_from_pages(output), truth)
+    elif truth is not None and stage == "layout":
+        result["recall"] = _label_recall(output, truth)
+    return result
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def bench_suite(args):
+    from synthetic import make_drawing
+
+    with tempfile.TemporaryDirectory() as workdir:
+        truth = None
+        if args.pdf:
+            path = args.pdf
+            source = {"pdf": os.path.abspath(args.pdf)}
+        else:
+            start = time.perf_counter()
+            pdf, truth = make_drawing(args.pages, args.sheet, args.components, args.scanned, args.dpi, args.seed)
+            path = os.path.join(workdir, "synthetic.pdf")
+            with open(path, "wb") as f:
+                f.write(pdf)
+            source = {"pages": args.pages, "sheet": args.sheet, "components": args.components,
+                      "scanned": args.scanned, "dpi": args.dpi, "seed": args.seed, "bytes": len(pdf)}
+            print(f"generated {args.pages} {args.sheet} sheets ({args.scanned:.0%} scanned), "
+                  f"{len(pdf) / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+        report = {
+            "revision": _git_revision(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "source": source,
+            "repeat": args.repeat,
+            "stages": {},
+        }
+        print(f"{'stage':<16} {'seconds':>8} {'throughput':>16} {'peak MB':>8} {'recall':>7}")
+        for stage in args.stages:
+            # A fresh process per stage, so one stage's memory peak doesn't hide the next one's
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(suite_stage, stage, path, truth, args.repeat).result()
+            report["stages"][stage] = result
+            if "skipped" in result:
+                print(f"{stage:<16} skipped: {result['skipped']}")
+                continue
+            recall = f"{result['recall']:.1%}" if "recall" in result else ""
+            throughput = f"{result['throughput']:.1f} {result['unit']}/s"
+            print(f"{stage:<16} {result['seconds']:>8.3f} {throughput:>16} {result['peak_mb']:>8.1f} {recall:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("source") != report["source"]:
+            print("warning: the baseline was run on a different input")
+        print(f"\nvs {args.compare} (revision {baseline.get('revision')}): time ratio < 1 is faster")
+        for stage, result in report["stages"].items():
+            old = baseline["stages"].get(stage)
+            if not old or "seconds" not in old or "seconds" not in result:
+                continue
+            print(f"{stage:<16} {result['seconds'] / old['seconds']:>6.2f}x time  "
+                  f"{result['peak_mb'] - old['peak_mb']:>+8.1f} MB peak")
+
+EXPORT_MODES = ["eager-xlsx", "xlsx", "csv", "parquet"]
+
+def export_stage(mode, rows, seed):
+    """Build one export of a synthetic result table in this (fresh) process."""
+    import pandas as pd
+    from export import write_export
+    from synthetic import random_component, random_levels
+
+    rng = random.Random(seed)
+    df = pd.DataFrame({
+        "Component Code": [random_component(rng) for _ in range(rows)],
+        "Level(s)": [random_levels(rng) for _ in range(rows)],
+        "Component Quanity": [rng.randint(1, 12) for _ in range(rows)],
+    })
+    import openpyxl  # noqa: F401  (imports are not part of the measurement)
+    if mode == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return {"skipped": "pyarrow is not installed"}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, f"export.{mode.split('-')[-1]}")
+        baseline = _reset_peak_rss()
+        start = time.perf_counter()
+        if mode == "eager-xlsx":
+            # What the app used to do after every extraction: the workbook in a BytesIO, kept as bytes
+            towrite = io.BytesIO()
+            df.to_excel(towrite, index=False, sheet_name="Components")
+            data = towrite.getvalue()
+            size = len(data)
+        else:
+            write_export(df, path, mode)
+            size = os.path.getsize(path)
+        seconds = time.perf_counter() - start
+        return {"seconds": seconds, "peak_mb": _peak_rss_mb() - baseline, "size_mb": size / 1e6}
+
+def bench_export(args):
+    print(f"{'rows':>8} {'mode':<11} {'seconds':>8} {'rows/s':>9} {'peak MB':>8} {'file MB':>8}")
+    for rows in args.rows:
+        for mode in args.modes:
+            # A fresh process per build, so each peak is measured from the same baseline
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(export_stage, mode, rows, args.seed).result()
+            if "skipped" in result:
+                print(f"{rows:>8} {mode:<11} skipped: {result['skipped']}")
+                continue
+            print(f"{rows:>8} {mode:<11} {result['seconds']:>8.2f} {rows / result['seconds']:>9.0f} "
+                  f"{result['peak_mb']:>8.1f} {result['size_mb']:>8.1f}")
+
+# Character swaps OCR typically makes in component codes
+OCR_MISREADS = {"1": "Il", "0": "OD", "D": "0O", "5": "S", "S": "5", "8": "B", "B": "8", "2": "Z", "6": "G", "a": "o"}
+
+def ocr_misread(rng, code):
+    """The code with one typical OCR confusion, or a random one-character edit if it has none."""
+    positions = [i for i, char in enumerate(code) if char in OCR_MISREADS]
+    if positions:
+        i = rng.choice(positions)
+        return code[:i] + rng.choice(OCR_MISREADS[code[i]]) + code[i + 1:]
+    i = rng.randrange(len(code))
+    return code[:i] + rng.choice("ABCDEFGHJKLMNPRTUVWXY0123456789") + code[i + 1:]
+
+def library_code(rng):
+    """A component code from a space large enough for project-sized libraries (random_component's is ~55k)."""
+    from synthetic import STRUCTURE_TYPES, SUFFIXES
+
+    return (f"{rng.choice('12')}{rng.choice(STRUCTURE_TYPES)}{rng.randint(1, 99)}"
+            f"{rng.choice(['a', 'b', 'bX', ''])}-{rng.randint(1, 60)}{rng.choice(SUFFIXES)}")
+
+def bench_library(args):
+    from library import ComponentLibrary, normalize, levenshtein
+
+    rng = random.Random(args.seed)
+    print(f"{'codes':>7} {'index':<7} {'build s':>8} {'us/lookup':>10} {'recovered':>10} {'miscorrected':>13} "
+          f"{'false match':>12}")
+    for size in args.sizes:
+        codes = set()
+        while len(codes) < size:
+            codes.add(library_code(rng))
+        codes = sorted(codes)
+        # Misread library codes, which should come back as the original, and made-up codes, which shouldn't match
+        queries = [(ocr_misread(rng, code), code) for code in rng.sample(codes, min(args.queries, size))]
+        queries += [(library_code(rng), None) for _ in range(len(queries) // 4)]
+
+        for index in args.indexes:
+            start = time.perf_counter()
+            if index == "linear":
+                keys = [(normalize(code), code) for code in codes]
+
+                def match(query):
+                    key = normalize(query)
+                    best = min(keys, key=lambda item: levenshtein(key, item[0]))
+                    return best[1] if levenshtein(key, best[0]) <= 2 else None
+                # Far too slow to run every query
+                lookups = queries[::20]
+            else:
+                library = ComponentLibrary(codes, index=index)
+
+                def match(query):
+                    found = library.match(query)
+                    return found.code if found else None
+                lookups = queries
+            build = time.perf_counter() - start
+
+            recovered = miscorrected = false_matches = 0
+            start = time.perf_counter()
+            results = [(match(query), query, expected) for query, expected in lookups]
+            seconds = time.perf_counter() - start
+            for found, query, expected in results:
+                if expected is not None:
+                    recovered += found == expected
+                    miscorrected += found is not None and found != expected
+                else:
+                    # A made-up code that happens to be in the library is a correct exact match
+                    false_matches += found is not None and found != query
+            misreads = sum(1 for _, expected in lookups if expected is not None)
+            made_up = len(lookups) - misreads
+            print(f"{size:>7} {index:<7} {build:>8.2f} {seconds / len(lookups) * 1e6:>10.0f} "
+                  f"{recovered / misreads:>10.1%} {miscorrected / misreads:>13.1%} "
+                  f"{false_matches / max(1, made_up):>12.1%}")
+
+def bench_tesseract(args):
+    from synthetic import make_drawing
+    from tesseract_ocr import tesseract_pages
+
+    if not shutil.which("tesseract"):
+        raise SystemExit("tesseract is not installed (apt install tesseract-ocr)")
+
+    pdf, truth = make_drawing(args.pages, args.sheet, args.components, scanned=1.0, dpi=args.scan_dpi, seed=args.seed)
+    credentials = {"tesseract": {"psm": args.psm, "dpi": args.dpi}}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "scanned.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf)
+        print(f"{args.pages} scanned {args.sheet} sheets, psm {args.psm}, {args.dpi} dpi")
+        print(f"{'workers':>7} {'seconds':>9} {'pages/s':>9} {'speedup':>8} {'recall':>7}")
+        baseline = None
+        for workers in sorted({min(w, MAX_WORKERS, args.pages) for w in args.workers}):
+            if workers > 1:
+                # Warm the pool so process start-up is not counted against throughput
+                tesseract_pages(path, pages=[1], credentials=credentials, workers=workers)
+            elapsed, texts = time_call(lambda: tesseract_pages(path, credentials=credentials, workers=workers), 1)
+            baseline = baseline or elapsed
+            recall = _label_recall(extract_components_from_pages(texts), truth)
+            print(f"{workers:>7} {elapsed:>9.2f} {args.pages / elapsed:>9.2f} {baseline / elapsed:>8.2f} {recall:>7.1%}")
+
+def bench_preprocess(args):
+    import fitz
+    from PIL import Image
+    from preprocess import PREPROCESS_MODES, PROVIDER_LIMITS, prepare_image
+    from rasterize import encode_png
+    from synthetic import make_drawing
+
+    pdf, truth = make_drawing(args.pages, args.sheet, args.components, seed=args.seed)
+    ocr = None
+    if shutil.which("tesseract"):
+        import pytesseract
+        ocr = lambda image: pytesseract.image_to_string(image, config="--psm 11")
+    limits = PROVIDER_LIMITS[args.provider]
+    point = 72.0 / args.dpi
+
+    rows = {mode: {"bytes": 0, "seconds": 0.0, "words": 0, "kept": 0, "texts": []}
+            for mode in ["before"] + list(PREPROCESS_MODES)}
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=args.dpi, alpha=False)
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            del pix
+            # The text layer says where every word is; a preprocessed image must still contain them all
+            words = [fitz.Rect(word[:4]) for word in page.get_text("words")]
+            for mode, row in rows.items():
+                start = time.perf_counter()
+                if mode == "before":
+                    stream, left, top, scale = encode_png(img), 0, 0, 1.0
+                else:
+                    stream, left, top, scale, _ = prepare_image(img, limits, {"mode": mode, "trim": not args.no_trim,
+                                                                              "deskew": args.deskew})
+                row["seconds"] += time.perf_counter() - start
+                row["bytes"] += stream.getbuffer().nbytes
+                with Image.open(stream) as sent:
+                    shown = fitz.Rect(left * point, top * point, (left + sent.width * scale) * point,
+                                      (top + sent.height * scale) * point)
+                    row["words"] += len(words)
+                    row["kept"] += sum(1 for word in words if word in shown)
+                    if ocr:
+                        row["texts"].append(ocr(sent))
+            img.close()
+
+    baseline = rows["before"]["bytes"]
+    print(f"{args.pages} {args.sheet} sheets at {args.dpi} dpi for {args.provider} "
+          f"(limit {limits['max_bytes'] / 1e6:.1f} MB)")
+    print(f"{'mode':<10} {'KB/page':>9} {'saved':>7} {'s/page':>7} {'words kept':>11} {'recall':>7}")
+    for mode, row in rows.items():
+        recall = f"{_label_recall(extract_components_from_pages(row['texts']), truth):.1%}" if ocr else "n/a"
+        print(f"{mode:<10} {row['bytes'] / args.pages / 1e3:>9.0f} {1 - row['bytes'] / baseline:>7.1%} "
+              f"{row['seconds'] / args.pages:>7.2f} {row['kept'] / max(1, row['words']):>11.1%} {recall:>7}")
+    if not ocr:
+        print("recall needs tesseract (apt install tesseract-ocr)")
+
+def simulated_tile_words(page, tile):
+    """What a perfect OCR of one tile would return, from the page's text layer, in page points.
+
+    Words cut by the tile's edge come back cut: their box is clipped and their
+    text shortened in proportion.
+    """
+    import fitz
+    from spatial import Word
+
+    words = []
+    for word in page.get_text("words"):
+        box = fitz.Rect(word[:4])
+        if not box.intersects(tile.rect):
+            continue
+        seen = box & tile.rect
+        text = word[4] if seen == box else word[4][:max(1, int(len(word[4]) * seen.width / box.width))]
+        words.append(Word(seen.x0, seen.y0, seen.x1, seen.y1, text))
+    return words
+
+def bench_tiling(args):
+    import fitz
+    from spatial import words_to_text
+    from synthetic import make_drawing
+    from tiling import page_tiles, owned_words
+
+    pdf, truth = make_drawing(args.pages, args.sheet, args.components, seed=args.seed)
+    settings = {"tile_side": args.tile_side, "overlap": args.overlap}
+    tiles = page_tiles(pdf, args.dpi, settings) or []
+    merged_texts, joined_texts = [], []
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        for page in doc:
+            page_tiles_ = [tile for tile in tiles if tile.page == page.number + 1]
+            tile_words = [simulated_tile_words(page, tile) for tile in page_tiles_]
+            merged_texts.append(words_to_text([w for tile, words in zip(page_tiles_, tile_words)
+                                               for w in owned_words(tile, words)]))
+            # What concatenating the tiles' text would give, before dropping duplicate rows
+            joined_texts.append("".join(words_to_text(words) for words in tile_words))
+
+    expected = collections.Counter(label for page in truth for label in page)
+    print(f"{args.pages} {args.sheet} sheets at {args.dpi} dpi: {len(tiles) / args.pages:.0f} tiles per sheet "
+          f"(side {args.tile_side} px, overlap {args.overlap:g} pt), perfect OCR per tile")
+    # Duplicates are labels read more often than they are on the sheets; cut labels are ones not on them at all
+    print(f"{'merge':<14} {'recall':>7} {'duplicates':>11} {'cut labels':>11}")
+    for name, texts in [("by position", merged_texts), ("joined text", joined_texts)]:
+        found = collections.Counter((code, levels) for code, levels, _ in extract_components_from_pages(texts))
+        hits = sum((expected & found).values())
+        duplicates = sum(count - expected[label] for label, count in found.items() if label in expected)
+        cut = sum(1 for label in found if label not in expected)
+        print(f"{name:<14} {hits / max(1, sum(expected.values())):>7.1%} {max(0, duplicates):>11} {cut:>11}")
+
+def revised_drawing(pdf, changed, sheet, components, seed):
+    """The drawing set with the given 1-based sheets redrawn, as a new PDF's bytes."""
+    import fitz
+    from synthetic import make_drawing
+
+    redrawn, _ = make_drawing(max(changed), sheet, components, seed=seed + 1)
+    with fitz.open(stream=pdf, filetype="pdf") as doc, fitz.open(stream=redrawn, filetype="pdf") as new:
+        for page_no in sorted(changed):
+            doc.delete_page(page_no - 1)
+            doc.insert_pdf(new, from_page=page_no - 1, to_page=page_no - 1, start_at=page_no - 1)
+        # Saved from scratch, like a re-issued set: objects are renumbered and the file hash changes
+        return doc.tobytes(garbage=4)
+
+def bench_revision(args):
+    import result_cache
+    from engine import extract_components
+    from synthetic import make_drawing
+
+    rng = random.Random(args.seed)
+    pdf, _ = make_drawing(args.pages, args.sheet, args.components, seed=args.seed)
+    changed = sorted(rng.sample(range(1, args.pages + 1), args.changed))
+    revision = revised_drawing(pdf, changed, args.sheet, args.components, args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result_cache.CACHE_DB = os.path.join(workdir, "result_cache.db")
+        result_cache.init_cache()
+        paths = {}
+        for name, data in [("original", pdf), ("revision", revision)]:
+            paths[name] = os.path.join(workdir, f"{name}.pdf")
+            with open(paths[name], "wb") as f:
+                f.write(data)
+
+        def extract(name, use_cache, report=None):
+            start = time.perf_counter()
+            df, _ = extract_components(paths[name], args.method, layout_aware=args.layout_aware,
+                                       file_hash=f"{name}-{use_cache}", use_cache=use_cache, report=report)
+            return time.perf_counter() - start, df
+
+        full_seconds, full_df = extract("revision", False)
+        extract("original", True)
+        report = {}
+        incremental_seconds, incremental_df = extract("revision", True, report)
+
+    extracted = [change["page"] for change in report["page_changes"] if change["status"] == "extracted"]
+    print(f"{args.pages} {args.sheet} sheets with {args.method}, sheets {', '.join(map(str, changed))} revised")
+    print(f"{'run':<12} {'seconds':>8} {'pages read':>11}")
+    print(f"{'full':<12} {full_seconds:>8.2f} {args.pages:>11}")
+    print(f"{'incremental':<12} {incremental_seconds:>8.2f} {len(extracted):>11}")
+    print(f"changed sheets found: {extracted == changed}, same result: {full_df.equals(incremental_df)}")
+
+def main():
+    from tesseract_ocr import TESSERACT_METHOD
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    text_parser = subparsers.add_parser("text", help="Text layer extraction throughput vs worker count")
+    text_parser.add_argument("pdf")
+    text_parser.add_argument("--methods", nargs="+", default=list(TEXT_LAYER_METHODS), choices=TEXT_LAYER_METHODS)
+    text_parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    text_parser.add_argument("--repeat", type=int, default=3)
+    text_parser.set_defaults(func=bench_text)
+
+    parser_parser = subparsers.add_parser("parser", help="Component/level parsing: differential check and throughput")
+    parser_parser.add_argument("pdf", nargs="?", help="Parse this PDF's text layer instead of synthetic text")
+    parser_parser.add_argument("--chunks", type=int, default=200, help="Synthetic pages to parse")
+    parser_parser.add_argument("--cases", type=int, default=500, help="Random texts for the differential check")
+    parser_parser.add_argument("--seed", type=int, default=0)
+    parser_parser.add_argument("--repeat", type=int, default=3)
+    parser_parser.set_defaults(func=bench_parser)
+
+    startup_parser = subparsers.add_parser("startup", help="Login page time-to-first-render in a fresh process")
+    startup_parser.add_argument("--app", default="app.py", help="App script, e.g. from an older checkout to compare")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--secrets", help="secrets.toml to expose as st.secrets, if the app reads it on start-up")
+    startup_parser.set_defaults(func=bench_startup)
+
+    db_parser = subparsers.add_parser("db", help="Concurrent log writes/reads: per-call connections vs the pool")
+    db_parser.add_argument("--threads", type=int, default=32)
+    db_parser.add_argument("--events", type=int, default=200, help="Log events per thread")
+    db_parser.add_argument("--read-every", type=int, default=10, help="Read the thread's history every N events")
+    db_parser.add_argument("--modes", nargs="+", default=["direct", "pooled", "batched"],
+                           choices=["direct", "pooled", "batched"])
+    db_parser.set_defaults(func=bench_db)
+
+    suite_parser = subparsers.add_parser("suite", help="Every local stage on a synthetic drawing set, optionally as JSON")
+    suite_parser.add_argument("--pdf", help="Benchmark this PDF instead of a generated one (no recall figures)")
+    suite_parser.add_argument("--pages", type=int, default=20)
+    suite_parser.add_argument("--sheet", default="A1", choices=["A3", "A2", "A1", "A0"])
+    suite_parser.add_argument("--components", type=int, default=150, help="Labelled components per sheet")
+    suite_parser.add_argument("--scanned", type=float, default=0.0, help="Fraction of sheets without a text layer")
+    suite_parser.add_argument("--dpi", type=int, default=150, help="Resolution of the scanned sheets")
+    suite_parser.add_argument("--seed", type=int, default=0)
+    suite_parser.add_argument("--stages", nargs="+", default=SUITE_STAGES, choices=SUITE_STAGES)
+    suite_parser.add_argument("--repeat", type=int, default=3)
+    suite_parser.add_argument("--json", help="Write the results here")
+    suite_parser.add_argument("--compare", help="Results JSON from an earlier run to compare against")
+    suite_parser.set_defaults(func=bench_suite)
+
+    export_parser = subparsers.add_parser("export", help="Result export build time and peak memory per format")
+    export_parser.add_argument("--rows", nargs="+", type=int, default=[10000, 100000])
+    export_parser.add_argument("--modes", nargs="+", default=EXPORT_MODES, choices=EXPORT_MODES)
+    export_parser.add_argument("--seed", type=int, default=0)
+    export_parser.set_defaults(func=bench_export)
+
+    library_parser = subparsers.add_parser("library", help="Component library lookups: trie vs BK-tree vs linear scan")
+    library_parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000])
+    library_parser.add_argument("--queries", type=int, default=2000, help="Misread codes looked up per size")
+    library_parser.add_argument("--indexes", nargs="+", default=["linear", "bktree", "trie"],
+                                choices=["linear", "bktree", "trie"])
+    library_parser.add_argument("--seed", type=int, default=0)
+    library_parser.set_defaults(func=bench_library)
+
+    tesseract_parser = subparsers.add_parser("tesseract", help="Local Tesseract OCR throughput vs worker count")
+    tesseract_parser.add_argument("--pages", type=int, default=8)
+    tesseract_parser.add_argument("--sheet", default="A1", choices=["A3", "A2", "A1", "A0"])
+    tesseract_parser.add_argument("--components", type=int, default=150, help="Labelled components per sheet")
+    tesseract_parser.add_argument("--scan-dpi", type=int, default=200, help="Resolution of the scanned sheets")
+    tesseract_parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    tesseract_parser.add_argument("--psm", type=int, default=11)
+    tesseract_parser.add_argument("--dpi", type=int, default=300, help="Resolution the sheets are OCR'd at")
+    tesseract_parser.add_argument("--seed", type=int, default=0)
+    tesseract_parser.set_defaults(func=bench_tesseract)
+
+    preprocess_parser = subparsers.add_parser("preprocess", help="OCR upload size and recall per preprocessing mode")
+    preprocess_parser.add_argument("--pages", type=int, default=4)
+    preprocess_parser.add_argument("--sheet", default="A1", choices=["A3", "A2", "A1", "A0"])
+    preprocess_parser.add_argument("--components", type=int, default=150, help="Labelled components per sheet")
+    preprocess_parser.add_argument("--provider", default="OCR Space API",
+                                   choices=["OCR Space API", "Microsoft Azure OCR", "Google Vision OCR"])
+    preprocess_parser.add_argument("--dpi", type=int, default=300)
+    preprocess_parser.add_argument("--no-trim", action="store_true")
+    preprocess_parser.add_argument("--deskew", action="store_true")
+    preprocess_parser.add_argument("--seed", type=int, default=0)
+    preprocess_parser.set_defaults(func=bench_preprocess)
+
+    tiling_parser = subparsers.add_parser("tiling", help="Tiled OCR merge: labels found once by position vs joined text")
+    tiling_parser.add_argument("--pages", type=int, default=4)
+    tiling_parser.add_argument("--sheet", default="A0", choices=["A3", "A2", "A1", "A0"])
+    tiling_parser.add_argument("--components", type=int, default=300, help="Labelled components per sheet")
+    tiling_parser.add_argument("--dpi", type=int, default=300)
+    tiling_parser.add_argument("--tile-side", type=int, default=5000, help="Longest tile side in pixels")
+    tiling_parser.add_argument("--overlap", type=float, default=144.0, help="Tile overlap in points")
+    tiling_parser.add_argument("--seed", type=int, default=0)
+    tiling_parser.set_defaults(func=bench_tiling)
+
+    revision_parser = subparsers.add_parser("revision", help="Re-extracting a revised drawing set: full vs changed pages")
+    revision_parser.add_argument("--pages", type=int, default=40)
+    revision_parser.add_argument("--changed", type=int, default=3, help="Sheets redrawn in the revision")
+    revision_parser.add_argument("--sheet", default="A1", choices=["A3", "A2", "A1", "A0"])
+    revision_parser.add_argument("--components", type=int, default=150, help="Labelled components per sheet")
+    revision_parser.add_argument("--method", default="pdfplumber",
+                                 choices=list(TEXT_LAYER_METHODS) + [TESSERACT_METHOD])
+    revision_parser.add_argument("--layout-aware", action="store_true")
+    revision_parser.add_argument("--seed", type=int, default=0)
+    revision_parser.set_defaults(func=bench_revision)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
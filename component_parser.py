@@ -0,0 +1,102 @@
+import re
+from functools import lru_cache
+
+#Patterns using regex
+component_pattern = r'\b[1-2][A-Z]{1,3}[0-9a-zA-Z\-]*\b'
+bracket_pattern = r'\((?:\d+(?:-\d+)?(?:,\s*\d+(?:-\d+)?)*)\)'
+
+# Component codes as OCR may misread them (a leading 1 read as I or l, a type letter as a digit);
+# only used with a component library, which decides what each such token really is
+ocr_component_pattern = r'\b[12Il][A-Z0-9]{1,3}[0-9a-zA-Z\-]*\b'
+
+# What a resolve function returns for a component code that isn't in the library, as opposed
+# to None for a token the OCR-tolerant pattern caught that isn't a code at all (a number, a word)
+REJECTED = object()
+
+# One compiled scanner; the named group that matched tells components from level brackets
+TOKEN_SCANNER = re.compile(rf'(?P<component>{component_pattern})|(?P<bracket>{bracket_pattern})')
+OCR_TOKEN_SCANNER = re.compile(rf'(?P<component>{ocr_component_pattern})|(?P<bracket>{bracket_pattern})')
+
+# Characters that may follow "(" in a level bracket that hasn't been closed yet
+_OPEN_BRACKET_TAIL = re.compile(r'[\d,\s-]*')
+
+@lru_cache(maxsize=4096)
+def count_levels(level_str):
+    level_str = level_str.strip("()")
+    total = 0
+    for part in level_str.split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            total += (end - start + 1)
+        elif part.isdigit():
+            total += 1
+    return total
+
+def _safe_cut(buffer):
+    """Return an index no token can straddle, so buffer[:cut] can be scanned on its own.
+
+    Tokens never contain whitespace except inside a level bracket, so the cut goes
+    after the last whitespace or ")", or before a "(" that may still be closed by
+    the next chunk.
+    """
+    open_at = buffer.rfind("(")
+    if open_at != -1 and _OPEN_BRACKET_TAIL.fullmatch(buffer, open_at + 1):
+        return open_at
+    for i in range(len(buffer) - 1, -1, -1):
+        char = buffer[i]
+        if char == ")" or char.isspace():
+            return i + 1
+    return 0
+
+def iter_tokens(texts, scanner=TOKEN_SCANNER):
+    """Yield (kind, token) pairs from an iterable of text chunks, exactly as if they were joined.
+
+    kind is "component" or "bracket". Only the unfinished tail of each chunk is
+    carried over, so page texts never have to be concatenated into one string.
+    """
+    carry = ""
+    for chunk in texts:
+        buffer = carry + chunk if carry else chunk
+        cut = _safe_cut(buffer)
+        for match in scanner.finditer(buffer, 0, cut):
+            yield match.lastgroup, match.group()
+        carry = buffer[cut:]
+    if carry:
+        for match in scanner.finditer(carry):
+            yield match.lastgroup, match.group()
+
+def extract_components_from_pages(texts, resolve=None):
+    """Pair each component code with the level brackets that follow it, across page texts.
+
+    With resolve (see library.py), component codes are found with the
+    OCR-tolerant pattern and each is replaced by resolve(code). A code it
+    returns REJECTED for is left out along with the brackets that follow it,
+    so they aren't counted against the component before it; a token it
+    returns None for isn't a code and is ignored.
+    """
+    pairs = []
+    current_component = None
+    levels = []
+
+    for kind, token in iter_tokens(texts, OCR_TOKEN_SCANNER if resolve else TOKEN_SCANNER):
+        if kind == "component":
+            if resolve:
+                token = resolve(token)
+                if token is None:
+                    continue
+            if current_component:
+                pairs.append((current_component, ", ".join(levels), sum(count_levels(lvl) for lvl in levels)))
+            # A rejected code still ends the previous component; its brackets are discarded
+            current_component = None if token is REJECTED else token
+            levels = []
+        elif current_component:
+            levels.append(token)
+
+    if current_component:
+        pairs.append((current_component, ", ".join(levels), sum(count_levels(lvl) for lvl in levels)))
+
+    return pairs
+
+def extract_component_with_levels(text):
+    return extract_components_from_pages((text,))
@@ -1,30 +1,67 @@
-import sqlite3
+import csv
 import datetime
+import json
 import os
 from pathlib import Path
 
+from db_pool import connect, BatchWriter
+
 # Create data directory if it doesn't exist
 Path("data").mkdir(exist_ok=True)
 
+LOG_DB = "data/extraction_log.db"
+
+# Rows per page of history / admin log listings
+PAGE_SIZE = 50
+
+# Write log events on a background thread in batches instead of one commit per event
+BATCHED_LOGGING = True
+
+_log_writer = BatchWriter(
+    LOG_DB,
+    """
+    INSERT INTO extraction_logs
+    (user_email, filename, method, component_count, timestamp, feedback, feedback_type, file_hash,
+     duration_s, page_count, peak_rss_mb, profile)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+)
+
+# Timing columns added after the table was first created, with their types
+PROFILE_COLUMNS = {
+    "duration_s": "REAL",
+    "page_count": "INTEGER",
+    "peak_rss_mb": "REAL",
+    "profile": "TEXT",
+}
+
 def init_db():
     """Initialize the database with the extraction_logs table if it doesn't exist."""
-    conn = sqlite3.connect("data/extraction_log.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS extraction_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_email TEXT NOT NULL,
-        filename TEXT NOT NULL,
-        method TEXT NOT NULL,
-        component_count INTEGER,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        feedback TEXT,
-        feedback_type TEXT,
-        file_hash TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
+    with connect(LOG_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            method TEXT NOT NULL,
+            component_count INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            feedback TEXT,
+            feedback_type TEXT,
+            file_hash TEXT
+        )
+        ''')
+        # Older databases predate the timing columns
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(extraction_logs)")}
+        for name, column_type in PROFILE_COLUMNS.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE extraction_logs ADD COLUMN {name} {column_type}")
+        # History is per user, newest first; the admin view lists everyone by time;
+        # the cache and duplicate-upload lookups go by file hash
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_user_time ON extraction_logs (user_email, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_time ON extraction_logs (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_file_hash ON extraction_logs (file_hash)")
 
 def compute_file_hash(file_bytes):
     """Compute a hash for the file if bytes are provided."""
@@ -33,49 +70,154 @@ def compute_file_hash(file_bytes):
         return hashlib.sha256(file_bytes).hexdigest()
     return None
 
-def log_event(user_email, filename, method, count, feedback=None, feedback_type=None, file_bytes=None):
-    """Log an extraction event with protection against SQL injection."""
-    file_hash = compute_file_hash(file_bytes) if file_bytes else None
+def log_event(user_email, filename, method, count, feedback=None, feedback_type=None, file_bytes=None, file_hash=None,
+              profile=None):
+    """Log an extraction event with protection against SQL injection.
+
+    profile is a StageTimer summary; its total, page count and peak memory get
+    their own columns and the whole summary is stored as JSON. With
+    BATCHED_LOGGING the row is queued for the background writer; reads in this
+    module flush the queue first, so they always see it.
+    """
+    if file_hash is None:
+        file_hash = compute_file_hash(file_bytes) if file_bytes else None
     
     # Input validation
     if not user_email or not filename or not method:
         raise ValueError("Required fields missing for logging")
     
     timestamp = datetime.datetime.now().isoformat()
-    
-    conn = sqlite3.connect("data/extraction_log.db")
-    cursor = conn.cursor()
-    
-    # Use parameterized query to prevent SQL injection
-    cursor.execute(
-        """
-        INSERT INTO extraction_logs 
-        (user_email, filename, method, component_count, timestamp, feedback, feedback_type, file_hash) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, 
-        (user_email, filename, method, count, timestamp, feedback, feedback_type, file_hash)
-    )
-    
-    conn.commit()
-    conn.close()
+    duration = page_count = peak_rss = profile_json = None
+    if profile:
+        duration = profile.get("total")
+        page_count = profile.get("counters", {}).get("pages")
+        peak_rss = profile.get("peak_rss_mb")
+        profile_json = json.dumps(profile, separators=(",", ":"))
+    row = (user_email, filename, method, count, timestamp, feedback, feedback_type, file_hash,
+           duration, page_count, peak_rss, profile_json)
+
+    if BATCHED_LOGGING:
+        _log_writer.submit(row)
+        return
+
+    with connect(LOG_DB) as conn:
+        # Use parameterized query to prevent SQL injection
+        conn.execute(_log_writer.sql, row)
+
+def flush_events():
+    """Wait until every queued log event has been written."""
+    _log_writer.flush()
 
 def get_user_logs(user_email):
     """Get logs for a specific user with protection against SQL injection."""
-    conn = sqlite3.connect("data/extraction_log.db")
-    cursor = conn.cursor()
-    
-    # Use parameterized query to prevent SQL injection
-    cursor.execute(
-        """
-        SELECT filename, method, component_count, timestamp, feedback 
-        FROM extraction_logs 
-        WHERE user_email = ? 
-        ORDER BY timestamp DESC
-        """, 
-        (user_email,)
-    )
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return results
\ No newline at end of file
+    flush_events()
+    with connect(LOG_DB) as conn:
+        cursor = conn.cursor()
+
+        # Use parameterized query to prevent SQL injection
+        cursor.execute(
+            """
+            SELECT filename, method, component_count, timestamp, feedback
+            FROM extraction_logs
+            WHERE user_email = ?
+            ORDER BY timestamp DESC
+            """,
+            (user_email,)
+        )
+        return cursor.fetchall()
+
+def _log_filters(user_email=None, method=None, start_date=None, end_date=None):
+    """WHERE clauses and parameters for the log filters; the date range is inclusive."""
+    clauses = []
+    params = []
+    if user_email:
+        clauses.append("user_email = ?")
+        params.append(user_email)
+    if method:
+        clauses.append("method = ?")
+        params.append(method)
+    if start_date:
+        clauses.append("timestamp >= ?")
+        params.append(start_date.isoformat())
+    if end_date:
+        clauses.append("timestamp < ?")
+        params.append((end_date + datetime.timedelta(days=1)).isoformat())
+    return clauses, params
+
+def query_logs(user_email=None, method=None, start_date=None, end_date=None, before=None, limit=PAGE_SIZE):
+    """One page of log rows, newest first, filtered in SQL.
+
+    Returns (rows, column names, cursor for the next, older page or None).
+    Pass that cursor back as `before`; pages are found by seeking the
+    (timestamp, id) index rather than with OFFSET, so deep pages cost the same
+    as the first one.
+    """
+    flush_events()
+    clauses, params = _log_filters(user_email, method, start_date, end_date)
+    if before:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with connect(LOG_DB) as conn:
+        cursor = conn.cursor()
+        # Use parameterized query to prevent SQL injection
+        cursor.execute(
+            f"SELECT * FROM extraction_logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        )
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = (last["timestamp"], last["id"])
+    return rows, columns, next_cursor
+
+def get_user_logs_page(user_email, before=None, limit=PAGE_SIZE):
+    """One page of a user's history in the get_user_logs columns, plus the cursor for the next page."""
+    rows, columns, next_cursor = query_logs(user_email=user_email, before=before, limit=limit)
+    keep = [columns.index(name) for name in ("filename", "method", "component_count", "timestamp", "feedback")]
+    return [tuple(row[i] for i in keep) for row in rows], next_cursor
+
+def log_filter_options():
+    """Distinct users and methods in the log, for the admin filters."""
+    flush_events()
+    with connect(LOG_DB) as conn:
+        users = [row[0] for row in conn.execute("SELECT DISTINCT user_email FROM extraction_logs ORDER BY user_email")]
+        methods = [row[0] for row in conn.execute("SELECT DISTINCT method FROM extraction_logs ORDER BY method")]
+    return users, methods
+
+def export_logs_csv(path, user_email=None, method=None, start_date=None, end_date=None, chunk_size=5000):
+    """Write the filtered log to a CSV file chunk by chunk, without holding it in memory; returns the row count."""
+    flush_events()
+    clauses, params = _log_filters(user_email, method, start_date, end_date)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    count = 0
+    with connect(LOG_DB) as conn, open(path, "w", newline="", encoding="utf-8") as f:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM extraction_logs {where} ORDER BY timestamp DESC, id DESC", params)
+        writer = csv.writer(f)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def get_profiles(user_email=None, method=None, start_date=None, end_date=None, limit=10000):
+    """(method, profile JSON) of the most recent profiled extractions matching the filters."""
+    flush_events()
+    clauses, params = _log_filters(user_email, method, start_date, end_date)
+    clauses.append("profile IS NOT NULL")
+    with connect(LOG_DB) as conn:
+        return conn.execute(
+            f"SELECT method, profile FROM extraction_logs WHERE {' AND '.join(clauses)} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
@@ -0,0 +1,190 @@
+"""Shared SQLite connections for the app's databases.
+
+Streamlit runs every session on its own thread, so instead of opening a
+connection per call each database keeps a small pool of connections in WAL
+mode (readers don't block the writer) with a busy timeout, handed to one
+thread at a time. BatchWriter moves inserts that nobody waits on, like the
+extraction log, to a background thread that writes them in batches.
+"""
+import atexit
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# How long a connection waits on a lock held by another writer before failing
+BUSY_TIMEOUT = 10.0
+
+# Idle connections kept per database; extra ones are closed when returned
+POOL_SIZE = 8
+
+# A batch that still finds the database locked after the busy timeout is retried this many
+# times, WRITE_RETRY_DELAY seconds apart and doubling, before its rows are kept for the next batch
+WRITE_RETRIES = 3
+WRITE_RETRY_DELAY = 0.5
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _open(path):
+    # check_same_thread is off because pooled connections move between threads,
+    # but a connection is only ever used by the thread that checked it out
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+    return conn
+
+def _pool(path):
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return pool
+
+@contextmanager
+def connect(path):
+    """Check out a pooled connection to path; commits on success and rolls back on error."""
+    pool = _pool(path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open(path)
+
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def close_all():
+    """Close every idle pooled connection (e.g. before deleting the database files)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+def _locked(error):
+    # "database is locked" / "database table is locked" / SQLITE_BUSY: worth trying again later
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+class BatchWriter:
+    """Background thread that runs one INSERT statement for queued rows, many rows per transaction.
+
+    Rows are written once max_batch have queued, max_delay seconds after the
+    first one arrived, or as soon as someone calls flush(). A batch the
+    database rejects is retried, then written row by row: rows that still
+    find it locked go into the next batch, and a row it refuses outright is
+    reported by raising its error from the next submit(), the way a direct
+    INSERT would have.
+    """
+
+    def __init__(self, path, sql, max_batch=500, max_delay=0.2):
+        self.path = path
+        self.sql = sql
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._error = None
+
+    def submit(self, row):
+        """Queue one row of parameters for the INSERT."""
+        error, self._error = self._error, None
+        if error is not None:
+            # This row is still queued; the error is an earlier row's
+            self._queue.put(row)
+            raise error
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sqlite-batch-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._queue.put(row)
+
+    def flush(self):
+        """Wait until every row this thread queued before the call has been written.
+
+        Rows kept back because the database stayed locked are written later, after flush returns.
+        """
+        if self._thread is None:
+            return
+        # The queue is FIFO, so once the writer reaches this marker everything before it is written
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _insert(self, rows):
+        with connect(self.path) as conn:
+            conn.executemany(self.sql, rows)
+
+    def _write(self, batch):
+        # Locks outlasting the busy timeout are retried; anything else goes straight to row by row
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                self._insert(batch)
+                return
+            except sqlite3.Error as e:
+                if not _locked(e) or attempt == WRITE_RETRIES:
+                    break
+                time.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+
+        for i, row in enumerate(batch):
+            try:
+                self._insert([row])
+            except sqlite3.Error as e:
+                if _locked(e):
+                    print(f"BatchWriter: {self.path} is locked, keeping {len(batch) - i} rows for the next batch",
+                          file=sys.stderr)
+                    self._pending = batch[i:] + self._pending
+                    return
+                print(f"BatchWriter: {self.path} rejected a row: {e}", file=sys.stderr)
+                self._error = e
+
+    def _run(self):
+        while True:
+            # Rows kept back while the database was locked go first, and are retried even if nothing new arrives
+            batch, self._pending = self._pending, []
+            waiters = []
+            try:
+                item = self._queue.get(timeout=WRITE_RETRY_DELAY) if batch else self._queue.get()
+            except queue.Empty:
+                item = None
+            deadline = time.monotonic() + self.max_delay
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if waiters or len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                for waiter in waiters:
+                    waiter.set()
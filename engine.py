@@ -0,0 +1,441 @@
+"""Extraction engine shared by the Streamlit app and the batch CLI.
+
+Nothing here imports Streamlit. OCR credentials are passed in as a mapping
+shaped like .streamlit/secrets.toml:
+
+    {"ocr_space": {"key": ...}, "azure": {"endpoint": ..., "key": ...}, "gcp": {"key_json": ...}}
+
+Local Tesseract OCR needs no key; its optional "tesseract" section holds its
+settings (see tesseract_ocr.py), and "preprocess" says how page images are
+prepared for the cloud services (see preprocess.py).
+
+The `pdf` argument is a file path (an ingested upload, see ingestion.py) or
+the PDF's bytes.
+"""
+import threading
+import time
+
+import pandas as pd
+
+from component_parser import component_pattern, bracket_pattern, extract_components_from_pages
+from ocr_dispatch import get_scheduler
+from ocr_providers import (get_vision_client, get_azure_client, perform_azure_ocr_batch, azure_result_text,
+                           azure_result_words, ocr_space_file, ocr_space_words, extract_text_google_vision,
+                           google_vision_words)
+from profiling import StageTimer, timed_pages
+from pdf_text import (TEXT_LAYER_METHODS, open_pdf, count_pages, page_sizes, extract_page_texts,
+                      extract_page_words, fitz_page_words, classify_pages, page_fingerprints)
+from preprocess import PROVIDER_LIMITS, preprocess_settings, prepare_image, settings_key as preprocess_key
+from rasterize import iter_page_images, iter_zone_images, zone_image_pages
+from result_cache import compute_parser_version, get_cached_result, store_result, get_cached_pages, store_pages
+from spatial import Word, associate_components, words_to_text
+from tiling import tiling_settings, page_tiles, iter_tile_images, owned_words, settings_key as tiling_key
+from tesseract_ocr import TESSERACT_METHOD, tesseract_settings, settings_key as tesseract_key, tesseract_pages
+from zones import zones_for_page, zones_key
+
+OCR_METHODS = ["OCR Space API", "Microsoft Azure OCR", "Google Vision OCR", TESSERACT_METHOD]
+AUTO_METHOD = "Auto (text layer + OCR fallback)"
+
+# the methods of extraction, this list can be expanded as time goes by..
+METHODS = list(TEXT_LAYER_METHODS) + OCR_METHODS + [AUTO_METHOD]
+
+# Render resolution per cloud OCR method (Tesseract's is in its settings)
+OCR_DPI = {"OCR Space API": 300, "Microsoft Azure OCR": 200, "Google Vision OCR": 300}
+
+RESULT_COLUMNS = ["Component Code", "Level(s)", "Component Quanity"]
+
+# OCR methods render one page at a time so memory doesn't grow with the page count,
+# and pages are sent concurrently through the shared, rate-limited scheduler
+def page_streams(pdf, dpi, pages=None, zones=None, timer=None, method=None, settings=None, uploads=None,
+                 tiles=None):
+    """Upload-ready image streams of the pages (or only their zones, or the given tiles) and where each one sits.
+
+    Images are preprocessed with settings (see preprocess.py) within the
+    method's limits. Placements are (page number, x offset, y offset, scale):
+    the top-left of the sent image on the page and the size of its pixels, in
+    points. A placement is final once its stream has been produced. With a
+    timer, each image's render and preprocessing time and the encoded bytes
+    are recorded; a list passed as uploads gets a dict per image describing
+    what was sent.
+    """
+    timer = timer or StageTimer()
+    settings = settings or preprocess_settings()
+    grayscale = settings["mode"] != "color"
+    sizes = page_sizes(pdf)
+    if tiles:
+        placements = [(tile.page, tile.rect.x0, tile.rect.y0) for tile in tiles]
+        images = iter_tile_images(pdf, tiles, dpi=dpi, grayscale=grayscale)
+    elif zones:
+        placements = []
+        # zone_image_pages lists a page once per zone, in the order iter_zone_images renders them
+        for page_no in sorted(set(zone_image_pages(pdf, zones, pages))):
+            width, height = sizes[page_no - 1]
+            for zone in zones_for_page(zones, page_no):
+                placements.append((page_no, zone["x0"] * width, zone["y0"] * height))
+        images = iter_zone_images(pdf, zones, dpi=dpi, pages=pages, grayscale=grayscale)
+    else:
+        page_numbers = sorted(pages) if pages is not None else range(1, len(sizes) + 1)
+        placements = [(page_no, 0.0, 0.0) for page_no in page_numbers]
+        images = iter_page_images(pdf, dpi=dpi, pages=pages, grayscale=grayscale)
+
+    point = 72.0 / dpi
+    limits = PROVIDER_LIMITS.get(method)
+
+    def encoded(images):
+        for i, img in enumerate(images):
+            prepared = prepare_image(img, limits, settings)
+            # Trimming moved the image's corner and scaling changed its pixel size
+            page_no, x_offset, y_offset = placements[i]
+            placements[i] = (page_no, x_offset + prepared.left * point, y_offset + prepared.top * point,
+                             prepared.scale * point)
+            timer.count("ocr_bytes", prepared.info["bytes"])
+            timer.count("ocr_rendered_bytes", prepared.info["rendered_bytes"])
+            if uploads is not None:
+                uploads.append({"page": page_no, **prepared.info})
+            yield prepared.stream
+
+    return placements, timed_pages(encoded(images), timer, "rasterize")
+
+def _timed_requests(fn, timer, progress=None):
+    """Wrap an OCR request function so every attempt's round trip is recorded.
+
+    progress, if given, is called with 1 when a request succeeds.
+    """
+    def call(stream, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(stream, **kwargs)
+        finally:
+            timer.add_page("ocr_request", time.perf_counter() - start)
+            timer.count("ocr_requests")
+        if progress:
+            progress(1)
+        return result
+    return call
+
+def _page_progress(progress, images, pages):
+    """Progress in images (zone crops or tiles) turned into progress in pages, spread evenly over the images."""
+    if not progress or images == pages:
+        return progress
+    if not images:
+        progress(pages)
+        return None
+    lock = threading.Lock()
+    finished = {"images": 0, "pages": 0}
+
+    def image_progress(count):
+        # Requests finish on the scheduler's threads
+        with lock:
+            finished["images"] += count
+            pages_done = finished["images"] * pages // images
+            count, finished["pages"] = pages_done - finished["pages"], pages_done
+        # Called even with 0, so a cancelled job still stops at the next image
+        progress(count)
+    return image_progress
+
+def run_ocr(method, streams, credentials, words=False, timer=None, progress=None):
+    """Send page streams to an OCR service; returns text, or positioned words, per stream."""
+    timer = timer or StageTimer()
+    if method == "OCR Space API":
+        fn = _timed_requests(ocr_space_words if words else ocr_space_file, timer, progress)
+        return get_scheduler().map("ocr_space", fn, streams, api_key=credentials["ocr_space"]["key"])
+
+    elif method == "Microsoft Azure OCR":
+        azure_client = get_azure_client(credentials["azure"]["endpoint"], credentials["azure"]["key"])
+        parse = azure_result_words if words else azure_result_text
+        return perform_azure_ocr_batch(streams, azure_client, get_scheduler(), parse=parse, progress=progress)
+
+    elif method == "Google Vision OCR":
+        vision_client = get_vision_client(credentials["gcp"]["key_json"])
+        fn = _timed_requests(google_vision_words if words else extract_text_google_vision, timer, progress)
+        return get_scheduler().map("google", fn, streams, client=vision_client)
+
+    return []
+
+def ocr_pages(pdf, method, credentials, pages=None, zones=None, words=False, timer=None, progress=None, workers=1,
+              report=None):
+    """OCR the given 1-based pages (all pages by default) and return one result per page, in page order.
+
+    Results are text, or with words=True lists of Words in page points.
+    Local Tesseract OCR spreads the pages over `workers` processes. For the
+    cloud services, report["ocr_uploads"] lists what was sent per image when
+    a report dict is given.
+    """
+    timer = timer or StageTimer()
+    if method == TESSERACT_METHOD:
+        with timer.stage("ocr"):
+            return tesseract_pages(pdf, pages, zones, words=words, credentials=credentials, workers=workers,
+                                   timer=timer, progress=progress)
+
+    dpi = OCR_DPI[method]
+    uploads = []
+    if report is not None:
+        report["ocr_uploads"] = uploads
+    # Sheets too large for the service are split into overlapping tiles (see tiling.py), which are
+    # merged by word position, so tiled pages are always read as words
+    tiles = page_tiles(pdf, dpi, tiling_settings(credentials, method), pages, zones)
+    read_words = words or tiles is not None
+    page_numbers = sorted(pages) if pages is not None else list(range(1, count_pages(pdf) + 1))
+    # The job counts pages, but zones and tiles give several images per page
+    images = len(tiles) if tiles else len(zone_image_pages(pdf, zones, pages)) if zones else len(page_numbers)
+    progress = _page_progress(progress, images, len(page_numbers))
+    # Pages are rendered while earlier ones are in flight, so the "ocr" stage includes rendering;
+    # the per-image "rasterize" times break it out
+    with timer.stage("ocr"):
+        placements, streams = page_streams(pdf, dpi, pages, zones, timer, method, preprocess_settings(credentials),
+                                           uploads, tiles)
+        results = run_ocr(method, streams, credentials, words=read_words, timer=timer, progress=progress)
+
+    # Zones and tiles give several images per page; join them back into one result per page
+    page_results = {page_no: [] if read_words else "" for page_no in page_numbers}
+    for i, ((page_no, x_offset, y_offset, scale), result) in enumerate(zip(placements, results)):
+        if read_words:
+            result = [
+                Word(x_offset + w.x0 * scale, y_offset + w.y0 * scale,
+                     x_offset + w.x1 * scale, y_offset + w.y1 * scale, w.text)
+                for w in result
+            ]
+        if tiles:
+            result = owned_words(tiles[i], result)
+        page_results[page_no] += result
+    if read_words and not words:
+        return [words_to_text(page_results[page_no]) for page_no in page_numbers]
+    return [page_results[page_no] for page_no in page_numbers]
+
+def extract_auto(pdf, ocr_method, credentials, zones=None, words=False, report=None, timer=None, progress=None,
+                 workers=1, pages=None):
+    """Read text-layer pages locally and OCR only the pages without a usable text layer.
+
+    pages restricts extraction to the given 1-based page numbers. The per-page
+    routing decisions are stored in report["page_routes"] when a report dict is given.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("classify"):
+        routes = classify_pages(pdf, zones=zones, pages=pages)
+    ocr_page_numbers = [route["page"] for route in routes if route["route"] == "ocr"]
+    timer.count("pages_skipped", sum(1 for route in routes if route["route"] == "skip"))
+    # Text-layer and blank pages are done once they're classified
+    if progress:
+        progress(len(routes) - len(ocr_page_numbers))
+    ocr_results = {}
+    # Without scanned pages the OCR service isn't needed, nor its credentials
+    if ocr_page_numbers:
+        ocr_results = dict(zip(
+            ocr_page_numbers,
+            ocr_pages(pdf, ocr_method, credentials, pages=ocr_page_numbers, zones=zones, words=words, timer=timer,
+                      progress=progress, workers=workers, report=report),
+        ))
+
+    if words:
+        with timer.stage("words"), open_pdf(pdf) as doc:
+            local = {
+                route["page"]: fitz_page_words(doc[route["page"] - 1], zones or None)
+                for route in routes if route["route"] == "text"
+            }
+    else:
+        local = {route["page"]: route["text"] for route in routes if route["route"] == "text"}
+
+    results = []
+    for route in routes:
+        if route["route"] == "text":
+            results.append(local[route["page"]])
+        elif route["route"] == "ocr":
+            results.append(ocr_results[route["page"]])
+        else:
+            results.append([] if words else "")
+        del route["text"]
+
+    if report is not None:
+        report["page_routes"] = routes
+    return results
+
+def extract_pages(pdf, method, credentials=None, workers=1, ocr_method=None, zones=None, report=None, timer=None,
+                  progress=None, pages=None):
+    """Extract text with the chosen method and return it as a list with one string per page.
+
+    pages restricts extraction to the given 1-based page numbers (all pages by default).
+    With zones, only those page regions are read (text layer) or rendered and uploaded (OCR).
+    workers is the number of processes for text-layer methods and local OCR.
+    progress, if given, is called with the number of pages just finished.
+    """
+    timer = timer or StageTimer()
+    if method in TEXT_LAYER_METHODS:
+        page_times = []
+        with timer.stage("text"):
+            texts = extract_page_texts(pdf, method, workers=workers, zones=zones, page_times=page_times,
+                                       progress=progress, pages=pages)
+        for seconds in page_times:
+            timer.add_page("text", seconds)
+        return texts
+
+    elif method in OCR_METHODS:
+        return ocr_pages(pdf, method, credentials, pages=pages, zones=zones, timer=timer, progress=progress,
+                         workers=workers, report=report)
+
+    elif method == AUTO_METHOD:
+        return extract_auto(pdf, ocr_method, credentials, zones=zones, report=report, timer=timer, progress=progress,
+                            workers=workers, pages=pages)
+
+    raise ValueError(f"Unknown extraction method: {method}")
+
+def extract_words(pdf, method, credentials=None, ocr_method=None, zones=None, report=None, timer=None,
+                  progress=None, workers=1, pages=None):
+    """Like extract_pages, but returns each page's positioned words for layout-aware matching."""
+    timer = timer or StageTimer()
+    if method in TEXT_LAYER_METHODS:
+        with timer.stage("words"):
+            return extract_page_words(pdf, method, zones=zones, progress=progress, pages=pages)
+
+    elif method in OCR_METHODS:
+        return ocr_pages(pdf, method, credentials, pages=pages, zones=zones, words=True, timer=timer,
+                         progress=progress, workers=workers, report=report)
+
+    elif method == AUTO_METHOD:
+        return extract_auto(pdf, ocr_method, credentials, zones=zones, words=True, report=report, timer=timer,
+                            progress=progress, workers=workers, pages=pages)
+
+    raise ValueError(f"Unknown extraction method: {method}")
+
+def extract_text(pdf, method, credentials=None, workers=1, ocr_method=None, zones=None):
+    return "".join(extract_pages(pdf, method, credentials, workers=workers, ocr_method=ocr_method, zones=zones))
+
+def components_dataframe(pairs):
+    """The result table shown, cached and exported for one document."""
+    df = pd.DataFrame(pairs, columns=RESULT_COLUMNS)
+    return df.drop_duplicates().sort_values("Component Code").reset_index(drop=True)
+
+def cache_method_key(method, ocr_method=None, zones=None, layout_aware=False, library=None, credentials=None):
+    """The method part of the result cache key; every option that changes the result is in it."""
+    key = f"{method} / {ocr_method}" if ocr_method else method
+    if TESSERACT_METHOD in (method, ocr_method):
+        key += f" [{tesseract_key(tesseract_settings(credentials))}]"
+    elif method in OCR_METHODS or ocr_method:
+        reader = ocr_method or method
+        key += (f" [{preprocess_key(preprocess_settings(credentials))}, "
+                f"{tiling_key(tiling_settings(credentials, reader))}]")
+    if zones:
+        key += f" [zones {zones_key(zones)}]"
+    if layout_aware:
+        key += " [layout]"
+    if library is not None:
+        key += f" [library {library.fingerprint}]"
+    return key
+
+def extract_changed_pages(pdf, method, credentials=None, workers=1, ocr_method=None, zones=None,
+                          layout_aware=False, report=None, timer=None, progress=None):
+    """Extract every page through the per-page cache, reading only the pages it doesn't hold yet.
+
+    Pages are looked up by content fingerprint (pdf_text.page_fingerprints),
+    so in a revised drawing set only the changed and added sheets are read
+    again. Returns one result per page, like extract_pages, or like
+    extract_words with layout_aware. report["page_changes"] says for each
+    page whether it was reused or extracted.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("fingerprint"):
+        fingerprints = page_fingerprints(pdf)
+    keys = []
+    for page_no, fingerprint in enumerate(fingerprints, 1):
+        # Only the zones on this page matter, wherever the page is in the set
+        page_zones = [dict(zone, page=0) for zone in zones_for_page(zones, page_no)] if zones else None
+        keys.append((fingerprint, cache_method_key(method, ocr_method, page_zones, layout_aware,
+                                                   credentials=credentials)))
+    with timer.stage("cache"):
+        stored = get_cached_pages(keys)
+    changed = [page_no for page_no, key in enumerate(keys, 1) if key not in stored]
+    timer.count("pages_reused", len(keys) - len(changed))
+    if progress and len(changed) < len(keys):
+        progress(len(keys) - len(changed))
+
+    if changed:
+        extract = extract_words if layout_aware else extract_pages
+        results = extract(pdf, method, credentials, ocr_method=ocr_method, zones=zones, report=report, timer=timer,
+                          progress=progress, workers=workers, pages=changed)
+        fresh = {keys[page_no - 1]: result for page_no, result in zip(changed, results)}
+        with timer.stage("cache"):
+            store_pages({key: [list(word) for word in result] if layout_aware else result
+                         for key, result in fresh.items()})
+        stored.update(fresh)
+
+    if report is not None:
+        changed = set(changed)
+        report["page_changes"] = [
+            {"page": page_no, "fingerprint": fingerprint[:12],
+             "status": "extracted" if page_no in changed else "reused"}
+            for page_no, fingerprint in enumerate(fingerprints, 1)
+        ]
+    if layout_aware:
+        return [[Word(*word) for word in stored[key]] for key in keys]
+    return [stored[key] for key in keys]
+
+def extract_components(pdf, method, credentials=None, workers=1, ocr_method=None, zones=None,
+                       layout_aware=False, file_hash=None, use_cache=True, report=None, timer=None,
+                       progress=None, library=None):
+    """Extract one document end to end and return (components DataFrame, whether it came from the cache).
+
+    Pass the upload's file_hash to use the result cache; on a miss, pages whose
+    content was extracted before (in an earlier revision of the set) are reused
+    and only the rest are read, see extract_changed_pages. report, if given,
+    collects details like the Auto method's per-page routing. A started StageTimer, if
+    given, records how long each stage took; progress is called with the number
+    of pages finished as extraction goes (see jobs.py).
+
+    With a ComponentLibrary (library.py), codes are matched against it: OCR
+    misreads are corrected and codes matching nothing are dropped; the report
+    lists both under "library_corrections" and "library_unmatched".
+    """
+    timer = timer or StageTimer()
+    parser_version = compute_parser_version(component_pattern, bracket_pattern)
+    cache_method = cache_method_key(method, ocr_method, zones, layout_aware, library, credentials)
+    if use_cache and file_hash:
+        with timer.stage("cache"):
+            df = get_cached_result(file_hash, cache_method, parser_version)
+        if df is not None:
+            timer.count("cache_hit")
+            return df, True
+
+    timer.count("pages", count_pages(pdf))
+    resolve = None
+    if library is not None:
+        corrections, unmatched = [], []
+        resolve = library.resolver(corrections, unmatched)
+        if report is not None:
+            report["library_corrections"] = corrections
+            report["library_unmatched"] = unmatched
+    if use_cache and file_hash:
+        # A revision of a drawing set seen before: only its changed pages are extracted
+        page_results = extract_changed_pages(pdf, method, credentials, workers=workers, ocr_method=ocr_method,
+                                             zones=zones, layout_aware=layout_aware, report=report, timer=timer,
+                                             progress=progress)
+        with timer.stage("parse"):
+            if layout_aware:
+                pairs = associate_components(page_results, resolve=resolve)
+            else:
+                pairs = extract_components_from_pages(page_results, resolve=resolve)
+    elif layout_aware:
+        page_words = extract_words(pdf, method, credentials, ocr_method=ocr_method, zones=zones, report=report,
+                                   timer=timer, progress=progress, workers=workers)
+        with timer.stage("parse"):
+            pairs = associate_components(page_words, resolve=resolve)
+    else:
+        page_texts = extract_pages(pdf, method, credentials, workers=workers, ocr_method=ocr_method,
+                                   zones=zones, report=report, timer=timer, progress=progress)
+        with timer.stage("parse"):
+            pairs = extract_components_from_pages(page_texts, resolve=resolve)
+    with timer.stage("dataframe"):
+        df = components_dataframe(pairs)
+
+    if use_cache and file_hash:
+        with timer.stage("cache"):
+            store_result(file_hash, cache_method, parser_version, df)
+    return df, False
+
+def load_credentials(path):
+    """Read OCR credentials from a secrets.toml file (the same one Streamlit uses)."""
+    try:
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except ImportError:
+        import toml
+        return toml.load(path)
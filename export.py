@@ -0,0 +1,89 @@
+"""Result table export for downloads and the batch CLI.
+
+Exports are built only when someone asks for one, and written straight to a
+file a chunk of rows at a time: XLSX with openpyxl's write-only mode (rows
+are streamed into the sheet XML instead of building every cell object
+first), CSV and Parquet in row chunks. Memory use while exporting stays
+flat no matter how many rows there are.
+"""
+import importlib.util
+import os
+import tempfile
+
+# Download formats: label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV (.csv)": ("csv", "text/csv"),
+    "Parquet (.parquet)": ("parquet", "application/vnd.apache.parquet"),
+}
+
+SHEET_NAME = "Components"
+
+# Rows converted and written per step
+CHUNK_ROWS = 10000
+
+def available_formats():
+    """The EXPORT_FORMATS labels usable here; Parquet needs pyarrow, which is optional."""
+    return [label for label, (ext, _) in EXPORT_FORMATS.items()
+            if ext != "parquet" or importlib.util.find_spec("pyarrow") is not None]
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def write_xlsx(df, path, sheet_name=SHEET_NAME, chunk_rows=CHUNK_ROWS):
+    """Stream df into an XLSX file with a header row, like df.to_excel(index=False)."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([str(column) for column in df.columns])
+    for chunk in _chunks(df, chunk_rows):
+        # Plain Python values, with missing values as empty cells
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+
+def write_parquet(df, path, chunk_rows=CHUNK_ROWS):
+    """Write df to a Parquet file one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from e
+
+    writer = None
+    try:
+        for chunk in _chunks(df, chunk_rows):
+            table = pa.Table.from_pandas(chunk, schema=writer.schema if writer else None, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_export(df, path, fmt):
+    """Write df to path as "xlsx", "csv" or "parquet"."""
+    if fmt == "xlsx":
+        write_xlsx(df, path)
+    elif fmt == "csv":
+        df.to_csv(path, index=False, chunksize=CHUNK_ROWS)
+    elif fmt == "parquet":
+        write_parquet(df, path)
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
+
+def export_bytes(df, fmt):
+    """Build an export in a temporary file and return its bytes, for a download."""
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        write_export(df, path, fmt)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
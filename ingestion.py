@@ -0,0 +1,88 @@
+"""Upload ingestion: read each upload once.
+
+An upload is copied to a spool file in chunks while being hashed, so the
+bytes are walked exactly once. Everything downstream (preview, page counts,
+text extraction, rasterization, worker processes, logging) gets the spool
+file's path and the precomputed hash instead of its own copy of the bytes;
+PyMuPDF, pdfplumber and poppler open the file and read only what they need.
+
+Spool files are named by hash, so the same drawing uploaded by several
+sessions is stored once.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+SPOOL_DIR = Path(tempfile.gettempdir()) / "precast_uploads"
+
+# Chunk size for copying and hashing
+CHUNK_SIZE = 1024 * 1024
+
+# Spool files untouched for this long are removed by cleanup_spool()
+SPOOL_MAX_AGE_HOURS = 24
+
+IngestedPDF = namedtuple("IngestedPDF", ["path", "name", "size", "file_hash"])
+
+def _chunks(fileobj):
+    """Yield the contents of fileobj in CHUNK_SIZE pieces, as zero-copy views where possible."""
+    if hasattr(fileobj, "getbuffer"):
+        # In-memory uploads (Streamlit's UploadedFile is a BytesIO): slice the buffer without copying
+        with fileobj.getbuffer() as buffer:
+            for start in range(0, len(buffer), CHUNK_SIZE):
+                yield buffer[start:start + CHUNK_SIZE]
+        return
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def hash_file(path):
+    """SHA-256 of a file, read in chunks; matches db_logger.compute_file_hash of its bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in _chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ingest(fileobj, name):
+    """Spool an uploaded file once, hashing it on the way, and return an IngestedPDF."""
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in _chunks(fileobj):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        file_hash = digest.hexdigest()
+        path = SPOOL_DIR / f"{file_hash}.pdf"
+        # Atomic, and harmless if another session spooled the same file meanwhile
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    cleanup_spool()
+    return IngestedPDF(str(path), name, size, file_hash)
+
+def ingest_path(path):
+    """An IngestedPDF for a file already on disk (batch runs); it is hashed but not copied."""
+    return IngestedPDF(str(path), Path(path).name, os.path.getsize(path), hash_file(path))
+
+def cleanup_spool(max_age_hours=SPOOL_MAX_AGE_HOURS):
+    """Remove spool files that haven't been written for max_age_hours."""
+    cutoff = time.time() - max_age_hours * 3600
+    for path in SPOOL_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
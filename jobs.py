@@ -0,0 +1,169 @@
+"""Background extraction jobs.
+
+Extractions run on a small pool of worker threads shared by every session
+in the process instead of on the session's script thread, so a rerun from
+another widget doesn't abort them and a long OCR job doesn't hold the page.
+Each user has their own queue and the workers take jobs from the users in
+turn, so one user's long queue can't starve everyone else. A job reports
+per-page progress, can be cancelled, and its result is fetched by job ID.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+
+# Jobs running at once; each can use its own worker processes or OCR requests as well
+JOB_WORKERS = 2
+
+# Finished jobs are forgotten this long after they finish
+JOB_RETENTION_SECONDS = 3600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once the job has been cancelled."""
+
+class Job:
+    """One submitted extraction; fn(job) does the work and returns the result."""
+
+    def __init__(self, user, label, fn, total):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.label = label
+        self.fn = fn
+        self.total = total
+        self.done = 0
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def progress(self, pages=1):
+        """Count finished pages; raises JobCancelled once the job is cancelled, to stop the work."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        # OCR requests finish on the scheduler's threads
+        with self._lock:
+            self.done += pages
+
+    @property
+    def fraction(self):
+        if self.status == DONE:
+            return 1.0
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+class JobQueue:
+    """Per-user job queues served round-robin by a pool of worker threads."""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self._jobs = OrderedDict()
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f"extraction-job-{n}", daemon=True).start()
+
+    def submit(self, user, label, fn, total=0):
+        """Queue fn(job) for user and return the job ID; total is the page count, for progress."""
+        job = Job(user, label, fn, total)
+        with self._cond:
+            self._forget_finished()
+            self._jobs[job.id] = job
+            self._queues.setdefault(user, deque()).append(job)
+            self._cond.notify()
+        return job.id
+
+    def get(self, job_id):
+        """The job with this ID, or None if it's unknown or was forgotten."""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job: a queued job never starts, a running one stops at its next page."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._queues[job.user].remove(job)
+                if not self._queues[job.user]:
+                    del self._queues[job.user]
+                job.status = CANCELLED
+                job.finished = time.time()
+
+    def position(self, job_id):
+        """How many jobs will start before this queued one, or 0 if it isn't queued."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            # Users are served one job each per round, starting with the first user in line
+            mine = list(self._queues[job.user]).index(job)
+            ahead = 0
+            before = True
+            for user, queue in self._queues.items():
+                if user == job.user:
+                    ahead += mine
+                    before = False
+                else:
+                    ahead += min(len(queue), mine + 1 if before else mine)
+            return ahead
+
+    def _forget_finished(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINISHED and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        # Take the first user's next job, then move that user to the back of the line
+        while not self._queues:
+            self._cond.wait()
+        user, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        del self._queues[user]
+        if queue:
+            self._queues[user] = queue
+        job.status = RUNNING
+        job.started = time.time()
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+            try:
+                job.result = job.fn(job)
+                status = DONE
+            except JobCancelled:
+                status = CANCELLED
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+                status = FAILED
+            with self._cond:
+                job.status = status
+                job.finished = time.time()
+                # The closure can hold the upload's path and settings; the result is all that's needed now
+                job.fn = None
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the job queue shared by all sessions in this process."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,237 @@
+"""Matching extracted component codes against a project's component library.
+
+A library is a CSV of the component codes that exist on the job. Extracted
+codes are looked up in it, so OCR misreads like ITD2aX-3 or 1T02aX-3 come
+back as the canonical 1TD2aX-3 with their edit distance, and tokens that
+aren't close to any library code are dropped instead of becoming bogus rows.
+
+Codes are indexed once per library under a key with the usual OCR confusions
+folded together (I/l -> 1, O/D/Q -> 0, S -> 5, B -> 8, Z -> 2, G -> 6). The
+keys go into a trie; an edit-distance search walks it with one Levenshtein
+row per node and prunes every subtree whose row is already over the limit,
+so a lookup visits a small part of the library. A BK-tree over the same keys
+is available as the other index; `python benchmark.py library` compares
+both with a linear scan.
+"""
+import csv
+import hashlib
+import re
+from collections import namedtuple
+
+from component_parser import REJECTED, component_pattern
+
+# OCR confusions folded together in the index key
+CONFUSABLE = str.maketrans({
+    "I": "1", "l": "1", "|": "1", "!": "1",
+    "O": "0", "o": "0", "D": "0", "Q": "0",
+    "S": "5", "B": "8", "Z": "2", "G": "6",
+})
+
+# Beyond the folded confusions, an extracted code may be this many edits from a library key,
+# if it is at least SHORT_CODE_LENGTH long and no other key is within MATCH_MARGIN more edits.
+# In a dense library a one-edit difference is as likely a different code as a misread, so
+# the margin keeps made-up codes from snapping to a neighbour (see benchmark.py library)
+MAX_EDIT_DISTANCE = 1
+MATCH_MARGIN = 1
+SHORT_CODE_LENGTH = 7
+
+# Column names tried, in order, for the codes in a library CSV; otherwise the first column is used
+CODE_COLUMNS = ("Component Code", "code", "Code", "component")
+
+Match = namedtuple("Match", ["code", "distance"])
+
+_STRICT_CODE = re.compile(component_pattern)
+
+def normalize(code):
+    """The index key of a code, with OCR-confusable characters folded together."""
+    return code.translate(CONFUSABLE)
+
+def levenshtein(a, b):
+    """Edit distance between two strings (insertions, deletions and substitutions)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+class CodeTrie:
+    """Trie of index keys, each holding the library codes that share it."""
+
+    _END = ""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, code):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(self._END, []).append(code)
+
+    def get(self, key):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get(self._END, [])
+
+    def search(self, word, max_distance):
+        """(codes, distance) for every key within max_distance edits of word."""
+        results = []
+        first_row = list(range(len(word) + 1))
+        for char, child in self.root.items():
+            if char != self._END:
+                self._search(child, char, word, first_row, max_distance, results)
+        return results
+
+    def _search(self, node, char, word, previous, max_distance, results):
+        row = [previous[0] + 1]
+        for j, word_char in enumerate(word, 1):
+            row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + (word_char != char)))
+        if row[-1] <= max_distance and self._END in node:
+            results.append((node[self._END], row[-1]))
+        # Every key below this node costs at least min(row) edits
+        if min(row) <= max_distance:
+            for next_char, child in node.items():
+                if next_char != self._END:
+                    self._search(child, next_char, word, row, max_distance, results)
+
+class BKTree:
+    """Burkhard-Keller tree of index keys under the Levenshtein metric."""
+
+    def __init__(self):
+        self.root = None
+        self.codes = {}
+
+    def add(self, key, code):
+        if key in self.codes:
+            self.codes[key].append(code)
+            return
+        self.codes[key] = [code]
+        if self.root is None:
+            self.root = (key, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(key, node[0])
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (key, {})
+                return
+            node = child
+
+    def get(self, key):
+        return self.codes.get(key, [])
+
+    def search(self, word, max_distance):
+        """(codes, distance) for every key within max_distance edits of word."""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            key, children = stack.pop()
+            distance = levenshtein(word, key)
+            if distance <= max_distance:
+                results.append((self.codes[key], distance))
+            # By the triangle inequality only children in this band can be close enough
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+INDEXES = {"trie": CodeTrie, "bktree": BKTree}
+
+class ComponentLibrary:
+    """A project's component codes with an OCR-tolerant lookup index."""
+
+    def __init__(self, codes, index="trie"):
+        self.codes = sorted({code.strip() for code in codes if code and code.strip()})
+        self.fingerprint = hashlib.sha256("\n".join(self.codes).encode("utf-8")).hexdigest()[:16]
+        self._exact = set(self.codes)
+        self._index = INDEXES[index]()
+        for code in self.codes:
+            self._index.add(normalize(code), code)
+        self._matches = {}
+        self._near_misses = set()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def match(self, code):
+        """The library code an extracted code stands for, as a Match, or None.
+
+        The distance is the plain edit distance between the extracted and the
+        library code. A code equally close to two library codes, or near a
+        crowd of them, is ambiguous and not matched.
+        """
+        if code in self._exact:
+            return Match(code, 0)
+        if code in self._matches:
+            return self._matches[code]
+
+        key = normalize(code)
+        candidates = self._index.get(key)
+        near = []
+        if not candidates and len(code) >= SHORT_CODE_LENGTH:
+            near = self._index.search(key, MAX_EDIT_DISTANCE)
+            # The wider search only runs for the few codes with exactly one near key
+            if len(near) == 1 and len(self._index.search(key, MAX_EDIT_DISTANCE + MATCH_MARGIN)) == 1:
+                candidates = near[0][0]
+
+        match = None
+        if candidates:
+            scored = sorted((levenshtein(code, candidate), candidate) for candidate in candidates)
+            if len(scored) == 1 or scored[0][0] < scored[1][0]:
+                match = Match(scored[0][1], scored[0][0])
+        if match is None and (candidates or near):
+            self._near_misses.add(code)
+        self._matches[code] = match
+        return match
+
+    def near_miss(self, code):
+        """Whether match() turned the code down for being close to more than one library code."""
+        return code in self._near_misses
+
+    def resolver(self, corrections=None, unmatched=None):
+        """A resolve function for the parsers: the library code for a token, REJECTED or None.
+
+        REJECTED is for a token that is a component code, but not one in the
+        library: it matches the strict pattern, or is near library codes
+        without being a clear match. None is for other tokens the OCR-tolerant
+        pattern finds, like plain numbers or words, which aren't codes at all.
+        Pass lists to collect (extracted, library code, distance) for corrected
+        codes and the rejected codes that match the strict pattern.
+        """
+        def resolve(token):
+            match = self.match(token)
+            if match is None:
+                strict = _STRICT_CODE.fullmatch(token)
+                if unmatched is not None and strict:
+                    unmatched.append(token)
+                return REJECTED if strict or self.near_miss(token) else None
+            if match.distance and corrections is not None:
+                corrections.append((token, match.code, match.distance))
+            return match.code
+        return resolve
+
+def load_library(path, index="trie"):
+    """A ComponentLibrary from a CSV of codes, with or without a header row."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return read_library(f, index)
+
+def read_library(lines, index="trie"):
+    """Like load_library, from an iterable of CSV lines (e.g. an uploaded file)."""
+    rows = list(csv.reader(lines))
+    if not rows:
+        return ComponentLibrary([], index)
+    header = [cell.strip() for cell in rows[0]]
+    column = next((header.index(name) for name in CODE_COLUMNS if name in header), None)
+    if column is not None:
+        rows = rows[1:]
+    else:
+        column = 0
+    return ComponentLibrary((row[column] for row in rows if len(row) > column), index)
@@ -0,0 +1,158 @@
+"""Concurrent, rate-limited dispatch of OCR requests.
+
+One scheduler is shared by every Streamlit session in the process, so the
+per-provider limits hold no matter how many users are extracting at once.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Requests per second, burst size and concurrent requests per provider.
+# OCR.Space's free tier is the strictest; Azure S1 allows 10 transactions per second.
+PROVIDER_LIMITS = {
+    "ocr_space": {"rate": 1.0, "burst": 2, "concurrency": 2},
+    "azure": {"rate": 10.0, "burst": 10, "concurrency": 8},
+    "google": {"rate": 30.0, "burst": 30, "concurrency": 8},
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# Pages rendered and queued ahead of the slowest outstanding request
+MAX_IN_FLIGHT = 8
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Hold back new requests, e.g. after the provider answered with Retry-After."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+def _status_code(exc):
+    """Best-effort HTTP status of an exception from requests, msrest or google-api-core."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        code = getattr(exc, "code", None)
+        status = code if isinstance(code, int) else None
+    return status
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on the failed response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def is_retryable(exc):
+    """Throttling, server errors and dropped connections are worth retrying; bad requests are not."""
+    import requests
+
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    try:
+        from msrest.exceptions import ClientRequestError
+        if isinstance(exc, ClientRequestError):
+            return True
+    except ImportError:
+        pass
+    return _status_code(exc) in RETRYABLE_STATUS
+
+class OCRScheduler:
+    """Process-wide thread pool with per-provider token buckets and concurrency caps."""
+
+    def __init__(self, limits=None, max_workers=32):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+        self.buckets = {}
+        self.semaphores = {}
+        for provider, limit in (limits or PROVIDER_LIMITS).items():
+            self.configure(provider, **limit)
+
+    def configure(self, provider, rate, burst, concurrency):
+        """Set (or replace) the limits for a provider."""
+        self.buckets[provider] = TokenBucket(rate, burst)
+        self.semaphores[provider] = threading.BoundedSemaphore(concurrency)
+
+    def call(self, provider, fn, *args, **kwargs):
+        """Run fn under the provider's limits, retrying transient failures with backoff."""
+        bucket = self.buckets[provider]
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                with self.semaphores[provider]:
+                    return fn(*args, **kwargs)
+            except Exception as exc:
+                attempt += 1
+                if attempt > MAX_RETRIES or not is_retryable(exc):
+                    raise
+                retry_after = _retry_after(exc)
+                if retry_after is not None:
+                    # The provider told us when to come back; hold the whole provider, not just this call
+                    bucket.penalize(retry_after)
+                else:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def submit(self, provider, fn, *args, **kwargs):
+        return self.executor.submit(self.call, provider, fn, *args, **kwargs)
+
+    def map(self, provider, fn, payloads, max_in_flight=MAX_IN_FLIGHT, **kwargs):
+        """Apply fn(payload, **kwargs) to each payload concurrently and return results in input order.
+
+        payloads may be a lazy iterator; at most max_in_flight are pulled ahead of
+        the oldest unfinished request, so rendering can't run away from the network.
+        If a request fails or the payloads raise (e.g. a cancelled job), requests
+        not yet started are cancelled.
+        """
+        pending = deque()
+        results = []
+        try:
+            for payload in payloads:
+                pending.append(self.submit(provider, fn, payload, **kwargs))
+                if len(pending) >= max_in_flight:
+                    results.append(pending.popleft().result())
+            while pending:
+                results.append(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+        return results
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return the scheduler shared by all sessions in this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = OCRScheduler()
+        return _scheduler
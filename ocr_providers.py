@@ -0,0 +1,209 @@
+import functools
+import json
+import time
+
+import requests
+
+from spatial import Word
+
+OCR_SPACE_URL = "https://api.ocr.space/parse/image"
+
+def build_vision_client(key_info=None, api_endpoint=None):
+    """Create a Google Vision client; api_endpoint points it at a stand-in server over REST."""
+    from google.cloud import vision
+
+    if api_endpoint:
+        from google.api_core.client_options import ClientOptions
+        from google.auth.credentials import AnonymousCredentials
+        return vision.ImageAnnotatorClient(
+            credentials=AnonymousCredentials(),
+            transport="rest",
+            client_options=ClientOptions(api_endpoint=api_endpoint),
+        )
+    return vision.ImageAnnotatorClient.from_service_account_info(key_info)
+
+@functools.lru_cache(maxsize=4)
+def get_vision_client(key_json, api_endpoint=None):
+    """Return a process-wide Google Vision client for a service account key given as a JSON string."""
+    return build_vision_client(json.loads(key_json) if key_json else None, api_endpoint)
+
+# Initialize the Azure OCR client
+def init_azure_client(endpoint, key):
+    # The cloud SDKs are imported on first use so they don't slow down app start-up
+    from azure.cognitiveservices.vision.computervision import ComputerVisionClient
+    from msrest.authentication import CognitiveServicesCredentials
+
+    return ComputerVisionClient(endpoint, CognitiveServicesCredentials(key))
+
+@functools.lru_cache(maxsize=4)
+def get_azure_client(endpoint, key):
+    """Return a process-wide Azure client, reused across sessions, reruns and pages."""
+    return init_azure_client(endpoint, key)
+
+# Adaptive polling for Azure Read operations
+AZURE_POLL_INITIAL = 0.5
+AZURE_POLL_MAX = 5.0
+AZURE_POLL_FACTOR = 1.5
+
+def azure_submit_read(image_stream, client):
+    """Start an Azure Read operation for one image and return its operation id."""
+    image_stream.seek(0)  # the stream may have been consumed by an earlier, retried attempt
+    read_response = client.read_in_stream(image_stream, raw=True)
+    operation_location = read_response.headers["Operation-Location"]
+    return operation_location.split("/")[-1]
+
+def _azure_get_read_result(operation_id, client):
+    return client.get_read_result(operation_id, raw=True)
+
+def azure_result_text(result):
+    """Join the recognized lines of a finished Read operation."""
+    extracted_text = ""
+    if result.status == 'succeeded':
+        for page in result.analyze_result.read_results:
+            for line in page.lines:
+                extracted_text += line.text + "\n"
+    return extracted_text
+
+def azure_poll_results(operation_ids, client, scheduler=None, parse=azure_result_text, progress=None):
+    """Poll all outstanding Read operations together and return their parsed results in order.
+
+    Every round polls each unfinished operation once (concurrently when a scheduler
+    is given), then sleeps. The sleep grows geometrically up to AZURE_POLL_MAX and
+    never undercuts a Retry-After hint from the service. progress, if given, is
+    called with 1 as each operation finishes and with 0 before each sleep; an
+    exception it raises (e.g. a cancelled job) stops the polling.
+    """
+    texts = [None] * len(operation_ids)
+    outstanding = dict(enumerate(operation_ids))
+    delay = AZURE_POLL_INITIAL
+
+    while outstanding:
+        if scheduler is not None:
+            futures = {
+                index: scheduler.submit("azure", _azure_get_read_result, operation_id, client)
+                for index, operation_id in outstanding.items()
+            }
+            responses = {index: future.result() for index, future in futures.items()}
+        else:
+            responses = {
+                index: _azure_get_read_result(operation_id, client)
+                for index, operation_id in outstanding.items()
+            }
+
+        retry_after = 0.0
+        for index, response in responses.items():
+            result = response.output
+            if result.status in ['notStarted', 'running']:
+                try:
+                    retry_after = max(retry_after, float(response.response.headers.get("Retry-After", 0)))
+                except ValueError:
+                    pass
+                continue
+            texts[index] = parse(result)
+            del outstanding[index]
+            if progress:
+                progress(1)
+
+        if outstanding:
+            if progress:
+                progress(0)
+            time.sleep(max(delay, retry_after))
+            delay = min(AZURE_POLL_MAX, delay * AZURE_POLL_FACTOR)
+
+    return texts
+
+def azure_result_words(result):
+    """Positioned words of a finished Read operation, in image pixels."""
+    words = []
+    if result.status == 'succeeded':
+        for page in result.analyze_result.read_results:
+            for line in page.lines:
+                for word in line.words or []:
+                    xs, ys = word.bounding_box[0::2], word.bounding_box[1::2]
+                    words.append(Word(min(xs), min(ys), max(xs), max(ys), word.text))
+    return words
+
+def perform_azure_ocr_batch(image_streams, client, scheduler=None, parse=azure_result_text, progress=None):
+    """OCR many pages with Azure: submit them all up front, then poll them together.
+
+    parse turns each finished operation into the result, e.g. azure_result_words.
+    progress, if given, is called with 0 after each submission, so a cancelled
+    job stops submitting, and with 1 as each page's result comes in.
+    """
+    def submit(image_stream, client):
+        operation_id = azure_submit_read(image_stream, client)
+        if progress:
+            progress(0)
+        return operation_id
+
+    if scheduler is not None:
+        operation_ids = scheduler.map("azure", submit, image_streams, client=client)
+    else:
+        operation_ids = [submit(image_stream, client) for image_stream in image_streams]
+    return azure_poll_results(operation_ids, client, scheduler, parse, progress)
+
+# Perform OCR using Azure
+def perform_azure_ocr(image_stream, client):
+    return perform_azure_ocr_batch([image_stream], client)[0]
+
+#perform OCR using OCR Space
+def _ocr_space_request(file, api_key, language, url, overlay):
+    payload = {
+        'isOverlayRequired': overlay,
+        'apikey': api_key,
+        'language': language,
+        'OCREngine': 2  # optional: use engine 1 or 2
+    }
+    file.seek(0)  # the stream may have been consumed by an earlier, retried attempt
+    r = requests.post(
+        url,
+        files={'file': file},
+        data=payload,
+    )
+    # Throttling and server errors are raised so the dispatcher can retry them
+    if r.status_code == 429 or r.status_code >= 500:
+        r.raise_for_status()
+    result = r.json()
+    if result.get("IsErroredOnProcessing") or "ParsedResults" not in result:
+        return None
+    return result["ParsedResults"][0]
+
+def ocr_space_file(file, api_key, language='eng', url=OCR_SPACE_URL):
+    """ OCR.Space API request with local file """
+    parsed = _ocr_space_request(file, api_key, language, url, overlay=False)
+    return parsed["ParsedText"] if parsed else ""
+
+def ocr_space_words(file, api_key, language='eng', url=OCR_SPACE_URL):
+    """Positioned words from OCR.Space's text overlay, in image pixels."""
+    parsed = _ocr_space_request(file, api_key, language, url, overlay=True)
+    if not parsed:
+        return []
+    return [
+        Word(word["Left"], word["Top"], word["Left"] + word["Width"], word["Top"] + word["Height"], word["WordText"])
+        for line in (parsed.get("TextOverlay") or {}).get("Lines", [])
+        for word in line.get("Words", [])
+    ]
+
+# perform OCR using Google Vision OCR
+def _google_text_annotations(image_stream, client):
+    from google.cloud.vision_v1 import types
+
+    image_stream.seek(0)  # the stream may have been consumed by an earlier, retried attempt
+    image = types.Image(content=image_stream.read())
+
+    response = client.text_detection(image=image)
+    return response.text_annotations
+
+def extract_text_google_vision(image_stream, client):
+    texts = _google_text_annotations(image_stream, client)
+    return texts[0].description if texts else ""
+
+def google_vision_words(image_stream, client):
+    """Positioned words from Google Vision (every annotation after the full-text one), in image pixels."""
+    words = []
+    for annotation in _google_text_annotations(image_stream, client)[1:]:
+        xs = [vertex.x for vertex in annotation.bounding_poly.vertices]
+        ys = [vertex.y for vertex in annotation.bounding_poly.vertices]
+        if xs and ys:
+            words.append(Word(min(xs), min(ys), max(xs), max(ys), annotation.description))
+    return words
@@ -0,0 +1,193 @@
+"""Local stand-in for the OCR.Space, Azure Read and Google Vision HTTP APIs.
+
+Lets the OCR dispatch path be exercised without credentials or quota:
+
+    python ocr_standin.py --port 8765 --latency 0.5 --throttle-rate 0.1
+
+then point the providers at it, e.g.
+    ocr_space_file(stream, "key", url="http://127.0.0.1:8765/parse/image")
+    init_azure_client("http://127.0.0.1:8765", "key")
+    build_vision_client(api_endpoint="http://127.0.0.1:8765")
+
+Every request is answered with STANDIN_TEXT after `latency` seconds; a
+`throttle_rate` fraction of requests get a 429 with Retry-After instead.
+"""
+import argparse
+import base64
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STANDIN_TEXT = "1TD2aX-3 (2, 4-6)\n1AC2b-1 (3)\n"
+
+def standin_words():
+    """STANDIN_TEXT laid out as (text, left, top, width, height) words, one line per 20 px."""
+    words = []
+    for row, line in enumerate(STANDIN_TEXT.splitlines()):
+        left = 0
+        for text in line.split():
+            width = 10 * len(text)
+            words.append((text, left, row * 20, width, 15))
+            left += width + 10
+    return words
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Set on the server instance by make_server()
+    #   latency, throttle_rate, operations, counter, stats
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def _throttled(self):
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["active"] += 1
+            server.stats["max_active"] = max(server.stats["max_active"], server.stats["active"])
+        try:
+            time.sleep(server.latency)
+        finally:
+            with server.lock:
+                server.stats["active"] -= 1
+        if random.random() < server.throttle_rate:
+            with server.lock:
+                server.stats["throttled"] += 1
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+            return True
+        return False
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split("?")[0]
+
+        if path == "/parse/image":
+            if self._throttled():
+                return
+            overlay = {"Lines": [
+                {"Words": [{"WordText": text, "Left": left, "Top": top, "Width": width, "Height": height}
+                           for text, left, top, width, height in standin_words()]}
+            ]}
+            self._send_json(200, {
+                "ParsedResults": [{"ParsedText": STANDIN_TEXT, "FileParseExitCode": 1, "TextOverlay": overlay}],
+                "IsErroredOnProcessing": False,
+            })
+
+        elif path.endswith("/read/analyze"):
+            if self._throttled():
+                return
+            operation_id = f"op-{next(self.server.counter)}"
+            with self.server.lock:
+                # Report "running" for a couple of polls, like the real service
+                self.server.operations[operation_id] = 2
+            location = f"http://{self.headers['Host']}{path.rsplit('/', 1)[0]}/analyzeResults/{operation_id}"
+            self.send_response(202)
+            self.send_header("Operation-Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        elif path == "/v1/images:annotate":
+            if self._throttled():
+                return
+            requests_ = json.loads(body or b"{}").get("requests", [{}])
+            responses = []
+            for request in requests_:
+                content = base64.b64decode(request.get("image", {}).get("content", ""))
+                annotations = [{"description": STANDIN_TEXT, "locale": "en"}] + [
+                    {"description": text, "boundingPoly": {"vertices": [
+                        {"x": left, "y": top}, {"x": left + width, "y": top},
+                        {"x": left + width, "y": top + height}, {"x": left, "y": top + height}]}}
+                    for text, left, top, width, height in standin_words()
+                ]
+                responses.append({"textAnnotations": annotations if content else []})
+            self._send_json(200, {"responses": responses})
+
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if "/read/analyzeResults/" in path:
+            operation_id = path.rsplit("/", 1)[-1]
+            with self.server.lock:
+                remaining = self.server.operations.get(operation_id)
+                if remaining:
+                    self.server.operations[operation_id] = remaining - 1
+            if remaining is None:
+                self._send_json(404, {"error": {"code": "NotFound", "message": "Unknown operation"}})
+            elif remaining > 0:
+                self._send_json(200, {"status": "running"}, {"Retry-After": "0"})
+            else:
+                lines = [
+                    {"boundingBox": [0, i * 20, 200, i * 20, 200, i * 20 + 15, 0, i * 20 + 15], "text": text, "words": [
+                        {"boundingBox": [left, top, left + width, top, left + width, top + height, left, top + height],
+                         "text": word, "confidence": 0.99}
+                        for word, left, top, width, height in standin_words() if top == i * 20
+                    ]}
+                    for i, text in enumerate(STANDIN_TEXT.splitlines())
+                ]
+                self._send_json(200, {
+                    "status": "succeeded",
+                    "createdDateTime": "2024-01-01T00:00:00Z",
+                    "lastUpdatedDateTime": "2024-01-01T00:00:00Z",
+                    "analyzeResult": {
+                        "version": "3.2.0",
+                        "readResults": [{"page": 1, "angle": 0, "width": 200, "height": 200, "unit": "pixel", "lines": lines}],
+                    },
+                })
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, throttle_rate=0.0):
+    """Create (but don't start) a stand-in server; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.throttle_rate = throttle_rate
+    server.operations = {}
+    server.counter = itertools.count(1)
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "throttled": 0, "active": 0, "max_active": 0}
+    return server
+
+def start_in_thread(**kwargs):
+    """Start a stand-in server on a background thread and return it with its base URL."""
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before answering")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.throttle_rate)
+    print(f"OCR stand-in listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
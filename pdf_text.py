@@ -0,0 +1,318 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import multiprocessing
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import fitz  # PyMuPDF
+
+from zones import zones_for_page, text_rect, plumber_bbox
+from spatial import Word
+
+# Methods that read the PDF text layer and can be split across processes by page
+TEXT_LAYER_METHODS = ("pdfplumber", "PyMuPDF")
+
+# Auto routing: pages with fewer text-layer characters than this are OCR'd if images cover
+# at least AUTO_MIN_IMAGE_COVERAGE of the page or it draws at least AUTO_MIN_DRAWINGS vector
+# paths (CAD exports often draw their text as outlines, e.g. SHX fonts); the rest are blank
+AUTO_MIN_CHARS = 20
+AUTO_MIN_IMAGE_COVERAGE = 0.05
+AUTO_MIN_DRAWINGS = 50
+
+MAX_WORKERS = os.cpu_count() or 1
+
+# With progress reporting, pages are split into this many ranges per worker process
+PROGRESS_RANGES_PER_WORKER = 4
+
+# One pool of MAX_WORKERS processes is shared by every extraction, so worker start-up is only
+# paid once per process; each extraction limits how many of its tasks run at a time
+_pool = None
+_pool_lock = threading.Lock()
+
+def open_pdf(pdf):
+    """Open a PDF with PyMuPDF; pdf is a file path (like an ingested upload) or the file's bytes."""
+    if isinstance(pdf, (str, os.PathLike)):
+        return fitz.open(pdf)
+    return fitz.open(stream=pdf, filetype="pdf")
+
+def open_plumber(pdf):
+    """Open a PDF with pdfplumber; pdf is a file path or the file's bytes."""
+    import pdfplumber  # only loaded when the method is used
+
+    if isinstance(pdf, (str, os.PathLike)):
+        return pdfplumber.open(pdf)
+    return pdfplumber.open(io.BytesIO(pdf))
+
+def count_pages(pdf):
+    """Return the number of pages in a PDF."""
+    with open_pdf(pdf) as doc:
+        return doc.page_count
+
+def _plumber_page_text(page, zones):
+    if zones is None:
+        page_text = page.extract_text()
+        return page_text + "\n" if page_text else ""
+    text = ""
+    for zone in zones:
+        zone_text = page.crop(plumber_bbox(zone, page)).extract_text()
+        if zone_text:
+            text += zone_text + "\n"
+    return text
+
+def fitz_page_text(page, zones=None):
+    """Text layer of a PyMuPDF page, restricted to the zones that apply to it when given."""
+    if zones is None:
+        return page.get_text()
+    return "".join(page.get_text(clip=text_rect(zone, page)) for zone in zones_for_page(zones, page.number + 1))
+
+def page_sizes(pdf):
+    """(width, height) of each page as displayed, in points."""
+    with open_pdf(pdf) as doc:
+        return [(page.rect.width, page.rect.height) for page in doc]
+
+def fitz_page_words(page, zones=None):
+    """Positioned words of a PyMuPDF page, restricted to the zones that apply to it when given."""
+    clips = [None] if zones is None else [text_rect(zone, page) for zone in zones_for_page(zones, page.number + 1)]
+    return [Word(*word[:5]) for clip in clips for word in page.get_text("words", clip=clip)]
+
+def _plumber_page_words(page, zones):
+    regions = [page] if zones is None else [page.crop(plumber_bbox(zone, page)) for zone in zones]
+    return [
+        Word(word["x0"], word["top"], word["x1"], word["bottom"], word["text"])
+        for region in regions for word in region.extract_words()
+    ]
+
+def extract_page_words(pdf, method, zones=None, progress=None, pages=None):
+    """Positioned words of every page (or the given 1-based pages), for layout-aware component matching.
+
+    progress, if given, is called with 1 after each page.
+    """
+    page_words = []
+    if method == "pdfplumber":
+        with open_plumber(pdf) as plumber_doc:
+            for page in _selected(plumber_doc.pages, pages):
+                page_zones = zones_for_page(zones, page.page_number) if zones else None
+                page_words.append(_plumber_page_words(page, page_zones))
+                page.close()
+                if progress:
+                    progress(1)
+
+    elif method == "PyMuPDF":
+        with open_pdf(pdf) as doc:
+            for page in _selected(doc, pages):
+                page_words.append(fitz_page_words(page, zones or None))
+                if progress:
+                    progress(1)
+
+    else:
+        raise ValueError(f"Unsupported text layer method: {method}")
+
+    return page_words
+
+def _selected(pages, page_numbers):
+    # All pages, or only the given 1-based page numbers, in order
+    if page_numbers is None:
+        return pages
+    return [pages[page_no - 1] for page_no in sorted(page_numbers)]
+
+def _extract_page_range(pdf, method, indices, zones=None, progress=None):
+    """Extract the text of the pages with the given 0-based indices as a list with one string per page.
+
+    With zones, only the text inside the zones that apply to each page is read.
+    Returns the texts and the seconds spent on each page. progress (in-process
+    calls only) is called with 1 after each page.
+    """
+    texts = []
+    seconds = []
+    if method == "pdfplumber":
+        with open_plumber(pdf) as plumber_doc:
+            for page in [plumber_doc.pages[i] for i in indices]:
+                page_start = time.perf_counter()
+                page_zones = zones_for_page(zones, page.page_number) if zones else None
+                texts.append(_plumber_page_text(page, page_zones))
+                # pdfplumber keeps parsed layout objects around until the page is closed
+                page.close()
+                seconds.append(time.perf_counter() - page_start)
+                if progress:
+                    progress(1)
+
+    elif method == "PyMuPDF":
+        with open_pdf(pdf) as doc:
+            for page_no in indices:
+                page_start = time.perf_counter()
+                texts.append(fitz_page_text(doc[page_no], zones or None))
+                seconds.append(time.perf_counter() - page_start)
+                if progress:
+                    progress(1)
+
+    else:
+        raise ValueError(f"Unsupported text layer method: {method}")
+
+    return texts, seconds
+
+def get_pool():
+    """Return the shared process pool, creating it on first use (its processes start as they are needed)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the Streamlit server is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def run_in_pool(fn, tasks, workers):
+    """Run fn(*args) for each args tuple in tasks on the shared pool, at most `workers` at a time.
+
+    Yields (task index, result) as tasks finish. Tasks not yet started when
+    the generator is closed (e.g. by an exception in the consumer) never run.
+    """
+    pool = get_pool()
+    tasks = enumerate(tasks)
+    running = {}
+
+    def submit_next():
+        for index, args in tasks:
+            running[pool.submit(fn, *args)] = index
+            return
+
+    try:
+        for _ in range(workers):
+            submit_next()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                result = future.result()
+                # Keep the worker busy while the consumer handles the result
+                submit_next()
+                yield index, result
+    finally:
+        for future in running:
+            future.cancel()
+
+def split_pages(page_count, chunks):
+    """Split page indices into at most `chunks` contiguous (start, stop) ranges."""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def extract_page_texts(pdf, method, workers=1, zones=None, page_times=None, progress=None, pages=None):
+    """Extract per-page text in page order, splitting pages across `workers` processes.
+
+    pages restricts extraction to the given 1-based page numbers. Pass a list
+    as page_times to have each page's extraction time appended to it.
+    progress, if given, is called with the number of pages finished as they
+    finish; an exception it raises (e.g. a cancelled job) stops the extraction.
+    """
+    indices = _selected(range(count_pages(pdf)), pages)
+    page_count = len(indices)
+    workers = max(1, min(workers, MAX_WORKERS, page_count))
+
+    if workers == 1:
+        texts, seconds = _extract_page_range(pdf, method, indices, zones, progress)
+        if page_times is not None:
+            page_times.extend(seconds)
+        return texts
+
+    # One contiguous range per worker, or a few per worker when someone is watching the
+    # progress. Pass a path rather than bytes so each worker opens the file itself and
+    # only the path is pickled
+    ranges = split_pages(page_count, workers * (PROGRESS_RANGES_PER_WORKER if progress else 1))
+    tasks = [(pdf, method, indices[start:stop], zones) for start, stop in ranges]
+
+    results = [None] * len(ranges)
+    with closing(run_in_pool(_extract_page_range, tasks, workers)) as finished:
+        for index, (range_texts, seconds) in finished:
+            results[index] = range_texts
+            if page_times is not None:
+                page_times.extend(seconds)
+            if progress:
+                progress(len(range_texts))
+    return [text for range_texts in results for text in range_texts]
+
+def _page_fingerprint(doc, page):
+    digest = hashlib.sha256()
+    digest.update(repr((tuple(page.rect), page.rotation)).encode("utf-8"))
+    digest.update(page.read_contents())
+    # Images and form XObjects by their data, not their xref numbers, which move when a revision
+    # is saved; the same drawing re-exported page by page keeps its fingerprints
+    streams = {item[0] for item in page.get_images(full=True)} | {item[0] for item in page.get_xobjects()}
+    for stream_digest in sorted(hashlib.sha256(doc.xref_stream_raw(xref) or b"").digest() for xref in streams):
+        digest.update(stream_digest)
+    for font in sorted(font[2:5] for font in page.get_fonts(full=True)):
+        digest.update(repr(font).encode("utf-8"))
+    # Annotations show up in renders, so OCR reads them
+    for annot in page.annots() or []:
+        digest.update(repr((annot.type[1], tuple(annot.rect), annot.info.get("content", ""))).encode("utf-8"))
+    return digest.hexdigest()
+
+def page_fingerprints(pdf):
+    """A fingerprint of each page's content, in page order, to tell which sheets a revision changed.
+
+    It covers the page's size and rotation, content stream, images and forms,
+    fonts and annotations, so a page that draws the same thing gets the same
+    fingerprint in any PDF, whatever else changed in the file.
+    """
+    with open_pdf(pdf) as doc:
+        return [_page_fingerprint(doc, page) for page in doc]
+
+def image_coverage(page):
+    """Fraction of the page area covered by images (overlaps counted once per image)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        covered += abs(bbox)
+    return min(1.0, covered / page_area)
+
+def vector_paths(page, zones=None):
+    """Number of vector paths the page draws, only counting those inside its zones when given."""
+    paths = page.get_cdrawings()
+    if zones is None:
+        return len(paths)
+    clips = [text_rect(zone, page) for zone in zones_for_page(zones, page.number + 1)]
+    return sum(1 for path in paths if any(clip.intersects(path["rect"]) for clip in clips))
+
+def classify_pages(pdf, min_chars=AUTO_MIN_CHARS, min_image_coverage=AUTO_MIN_IMAGE_COVERAGE, zones=None, pages=None,
+                   min_drawings=AUTO_MIN_DRAWINGS):
+    """Decide for each page (or the given 1-based pages) whether to read its text layer, OCR it, or skip it.
+
+    Returns one dict per page with the page number (1-based), the measurements
+    the decision was based on, the route ("text", "ocr" or "skip") and the
+    text layer, so text-routed pages don't have to be read twice. With zones,
+    characters and vector paths are counted only inside the zones. Paths are
+    only counted on pages without a text layer (None otherwise).
+    """
+    routes = []
+    with open_pdf(pdf) as doc:
+        for page in _selected(doc, pages):
+            text = fitz_page_text(page, zones or None)
+            chars = sum(1 for c in text if not c.isspace())
+            coverage = image_coverage(page)
+            drawings = None
+            if chars >= min_chars:
+                route = "text"
+            elif coverage >= min_image_coverage:
+                route = "ocr"
+            else:
+                drawings = vector_paths(page, zones or None)
+                route = "ocr" if drawings >= min_drawings else "skip"
+            routes.append({
+                "page": page.number + 1,
+                "chars": chars,
+                "image_coverage": round(coverage, 2),
+                "drawings": drawings,
+                "route": route,
+                "text": text,
+            })
+    return routes
@@ -0,0 +1,189 @@
+"""Page image preprocessing before an OCR upload.
+
+A rendered page goes to the cloud services as small as it can while the
+text stays readable: converted to grayscale or 1-bit black and white,
+optionally straightened, trimmed to the inked area, and encoded in each of
+the formats that suit the mode and the service, keeping the smallest. If that is still over
+the service's size limit, the image is scaled down until it fits.
+
+Settings come from a [preprocess] section of the credentials mapping, like
+the Tesseract settings; every entry is optional:
+
+    [preprocess]
+    mode = "grayscale"   # "color", "grayscale" or "binary", see PREPROCESS_MODES
+    trim = true
+    deskew = false
+
+Trimming and scaling are undone when word positions are mapped back onto
+the page. Deskewing is not: at the few degrees it corrects, words move by
+less than the distance layout-aware matching works with.
+"""
+import io
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+PREPROCESS_DEFAULTS = {"mode": "grayscale", "trim": True, "deskew": False}
+
+PREPROCESS_MODES = {
+    "color": "Full colour",
+    "grayscale": "Grayscale",
+    "binary": "Black and white (1-bit)",
+}
+
+# Encodings tried per mode, of those the service accepts; the smallest is sent
+ENCODINGS = {
+    "color": ["png"],
+    "grayscale": ["png"],
+    "binary": ["tiff", "png"],
+}
+
+# Per-image limits of each service: the file size of its free tier (OCR.space 1 MB, Azure 4 MB),
+# and for Google the 10 MB request cap, which base64 leaves about 7.5 MB of image for; and the
+# encodings each one documents for single images. OCR.space and Azure list TIFF; Google's image
+# annotation doesn't (it takes TIFF only as a file, through files:annotate), so it gets PNG
+PROVIDER_LIMITS = {
+    "OCR Space API": {"max_bytes": 1024 * 1024, "max_side": None, "formats": ("png", "tiff")},
+    "Microsoft Azure OCR": {"max_bytes": 4 * 1024 * 1024, "max_side": 10000, "formats": ("png", "tiff")},
+    "Google Vision OCR": {"max_bytes": 7_500_000, "max_side": None, "formats": ("png",)},
+}
+
+# Pixels darker than this count as ink when trimming; TRIM_PADDING pixels of margin are kept
+TRIM_THRESHOLD = 200
+TRIM_PADDING = 16
+
+# Deskewing tries angles up to MAX_SKEW_DEGREES either way, on a copy at most SKEW_SAMPLE_SIDE pixels wide
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+SKEW_SAMPLE_SIDE = 1200
+
+# Scaling down to fit a size limit is given up after this many tries
+MAX_FIT_ATTEMPTS = 4
+
+# stream: the encoded image; left/top: where the sent image starts in the rendered one, in its pixels;
+# scale: rendered pixels per sent pixel; info: what was sent, for reporting
+Prepared = namedtuple("Prepared", ["stream", "left", "top", "scale", "info"])
+
+def preprocess_settings(credentials=None):
+    """PREPROCESS_DEFAULTS updated with the [preprocess] section of the credentials, if any."""
+    settings = dict(PREPROCESS_DEFAULTS)
+    if credentials is not None:
+        settings.update(credentials.get("preprocess") or {})
+    return settings
+
+def settings_key(settings):
+    """The settings that can change what the OCR service reads, for the result cache key."""
+    key = settings["mode"]
+    if settings["trim"]:
+        key += " trim"
+    if settings["deskew"]:
+        key += " deskew"
+    return key
+
+def otsu_threshold(gray):
+    """The gray level that best separates ink from paper in a grayscale image (Otsu's method)."""
+    histogram = np.array(gray.histogram(), dtype=np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(histogram)
+    total = weight[-1]
+    if not total:
+        return 128
+    mean = np.cumsum(histogram * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between))
+
+def binarize(gray, threshold=None):
+    """A 1-bit copy of a grayscale image, split at the Otsu threshold unless one is given."""
+    threshold = otsu_threshold(gray) if threshold is None else threshold
+    return gray.point(lambda value: 255 if value > threshold else 0).convert("1", dither=Image.Dither.NONE)
+
+def estimate_skew(gray):
+    """The rotation in degrees that best straightens the text lines (projection profile method)."""
+    sample = gray.copy()
+    sample.thumbnail((SKEW_SAMPLE_SIDE, SKEW_SAMPLE_SIDE))
+    ink = np.asarray(sample) <= otsu_threshold(sample)
+    sample = Image.fromarray(ink.astype(np.uint8) * 255)
+    best_angle, best_score = 0.0, None
+    for angle in np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + SKEW_STEP_DEGREES / 2, SKEW_STEP_DEGREES):
+        rotated = np.asarray(sample.rotate(float(angle), resample=Image.Resampling.NEAREST))
+        # Straight text lines give rows that are all ink or all paper
+        score = np.var(rotated.sum(axis=1, dtype=np.int64))
+        if best_score is None or score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def trim_box(gray, threshold=TRIM_THRESHOLD, padding=TRIM_PADDING):
+    """The (left, top, right, bottom) box around the ink, with padding, or None for a blank image."""
+    box = gray.point(lambda value: 255 if value < threshold else 0).getbbox()
+    if box is None:
+        return None
+    left, top, right, bottom = box
+    return (max(0, left - padding), max(0, top - padding),
+            min(gray.width, right + padding), min(gray.height, bottom + padding))
+
+def encode(img, fmt):
+    """Encode an image as "png" or, for 1-bit images, CCITT group 4 "tiff" into a rewound BytesIO.
+
+    The stream is named after the format, which is how requests names the uploaded file.
+    """
+    stream = io.BytesIO()
+    if fmt == "tiff":
+        img.save(stream, format="TIFF", compression="group4")
+    else:
+        img.save(stream, format="PNG")
+    stream.name = f"page.{fmt}"
+    stream.seek(0)
+    return stream
+
+def prepare_image(img, limits=None, settings=None):
+    """Preprocess a rendered page (or zone) image for upload and return a Prepared."""
+    settings = settings or PREPROCESS_DEFAULTS
+    limits = limits or {}
+    mode = settings["mode"]
+    formats = [fmt for fmt in ENCODINGS[mode] if fmt in limits.get("formats", ENCODINGS[mode])] or ["png"]
+    rendered_bytes = img.width * img.height * len(img.getbands())
+
+    work = img if mode == "color" else img.convert("L")
+    angle = 0.0
+    if settings["deskew"] and mode != "color":
+        angle = estimate_skew(work)
+        if angle:
+            work = work.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+
+    left = top = 0
+    if settings["trim"]:
+        box = trim_box(work if work.mode == "L" else work.convert("L"))
+        if box is not None:
+            left, top = box[0], box[1]
+            work = work.crop(box)
+
+    scale = 1.0
+    max_side = limits.get("max_side")
+    if max_side and max(work.size) > max_side:
+        scale = max(work.size) / max_side
+
+    for _ in range(MAX_FIT_ATTEMPTS):
+        sized = work
+        if scale > 1.0:
+            sized = work.resize((max(1, round(work.width / scale)), max(1, round(work.height / scale))),
+                                Image.Resampling.LANCZOS)
+        if mode == "binary":
+            sized = binarize(sized)
+        stream = min((encode(sized, fmt) for fmt in formats), key=lambda s: s.getbuffer().nbytes)
+        size = stream.getbuffer().nbytes
+        if not limits.get("max_bytes") or size <= limits["max_bytes"]:
+            break
+        # Encoded size goes roughly with the pixel count; aim a little under the limit
+        scale *= max(1.1, (size / limits["max_bytes"]) ** 0.5 * 1.05)
+
+    info = {
+        "format": stream.name.rsplit(".", 1)[-1],
+        "width": sized.width,
+        "height": sized.height,
+        "skew": angle,
+        "bytes": size,
+        "rendered_bytes": rendered_bytes,
+    }
+    return Prepared(stream, left, top, scale, info)
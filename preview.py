@@ -0,0 +1,35 @@
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from pdf_text import open_pdf
+
+# Screen-resolution preview width in pixels, and how many rendered pages to keep
+PREVIEW_WIDTH = 1000
+PREVIEW_CACHE_SIZE = 64
+
+# Shared by all sessions: (file hash, page number, width) -> PNG bytes, least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def render_preview(pdf, file_hash, page_no, width=PREVIEW_WIDTH):
+    """PNG thumbnail of a 1-based page at screen resolution, cached by file hash with LRU eviction."""
+    key = (file_hash, page_no, width)
+    with _cache_lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+            return png
+
+    with open_pdf(pdf) as doc:
+        page = doc[page_no - 1]
+        zoom = width / page.rect.width
+        png = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False).tobytes("png")
+
+    with _cache_lock:
+        _cache[key] = png
+        _cache.move_to_end(key)
+        while len(_cache) > PREVIEW_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
@@ -0,0 +1,161 @@
+"""Lightweight per-stage profiling of one extraction.
+
+A StageTimer is handed down the extraction pipeline; each stage wraps its
+work in `with timer.stage(name):` and per-page work adds individual page
+times. The summary is stored with the extraction_logs row, and the admin
+dashboard turns the stored summaries into percentiles per method.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# How often the memory sampler reads the process RSS, in seconds
+RSS_SAMPLE_INTERVAL = 0.05
+
+def current_rss_mb():
+    """Resident memory of this process in MB, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class StageTimer:
+    """Wall time per stage, per-page times, counters and peak RSS for one extraction.
+
+    Peak RSS is sampled from a background thread while the timer is running.
+    It is process-wide, so it includes anything else the server was doing at
+    the time, like other sessions' extractions.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.page_times = defaultdict(list)
+        self.counters = defaultdict(int)
+        self.peak_rss_mb = None
+        self._lock = threading.Lock()
+        self._started = None
+        self._elapsed = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self.peak_rss_mb = current_rss_mb()
+        if self.peak_rss_mb is not None:
+            self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._started is not None and self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+            self._stop.set()
+            if self._sampler is not None:
+                self._sampler.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _sample_rss(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            rss = current_rss_mb()
+            if rss is not None and rss > self.peak_rss_mb:
+                self.peak_rss_mb = rss
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak_rss_mb:
+            self.peak_rss_mb = rss
+
+    @contextmanager
+    def stage(self, name):
+        """Add the time spent in the block to the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] += seconds
+
+    def add_page(self, name, seconds):
+        """Record one page's (or one image's) time for a per-page stage."""
+        with self._lock:
+            self.page_times[name].append(seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    @property
+    def elapsed(self):
+        if self._elapsed is not None:
+            return self._elapsed
+        return time.perf_counter() - self._started if self._started is not None else 0.0
+
+    def summary(self):
+        """A JSON-serialisable summary of everything recorded so far."""
+        with self._lock:
+            return {
+                "total": round(self.elapsed, 4),
+                "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+                "pages": {name: [round(s, 4) for s in times] for name, times in self.page_times.items()},
+                "counters": dict(self.counters),
+                "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            }
+
+def timed_pages(iterable, timer, name):
+    """Yield from iterable, recording the time spent producing each item as one page of `name`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        timer.add_page(name, time.perf_counter() - start)
+        yield item
+
+def timing_percentiles(rows, percentiles=(50, 90, 99)):
+    """Per-method percentiles of the total time and each stage from (method, profile JSON) rows.
+
+    Returns a DataFrame with one row per method and metric.
+    """
+    import pandas as pd
+
+    samples = []
+    for method, profile_json in rows:
+        try:
+            profile = json.loads(profile_json)
+        except (TypeError, ValueError):
+            continue
+        samples.append({"method": method, "metric": "total s", "value": profile.get("total")})
+        page_count = profile.get("counters", {}).get("pages")
+        if page_count and profile.get("total") is not None:
+            samples.append({"method": method, "metric": "s per page", "value": profile["total"] / page_count})
+        for stage, seconds in profile.get("stages", {}).items():
+            samples.append({"method": method, "metric": f"{stage} s", "value": seconds})
+        if profile.get("peak_rss_mb") is not None:
+            samples.append({"method": method, "metric": "peak RSS MB", "value": profile["peak_rss_mb"]})
+        if profile.get("counters", {}).get("ocr_bytes"):
+            samples.append({"method": method, "metric": "OCR upload MB", "value": profile["counters"]["ocr_bytes"] / 1e6})
+
+    columns = ["method", "metric", "runs"] + [f"p{p}" for p in percentiles]
+    if not samples:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.DataFrame(samples).dropna()
+    grouped = df.groupby(["method", "metric"])["value"]
+    table = grouped.quantile([p / 100 for p in percentiles]).unstack()
+    table.columns = [f"p{p}" for p in percentiles]
+    table.insert(0, "runs", grouped.size())
+    return table.reset_index()[columns].round(3)
@@ -0,0 +1,83 @@
+"""Project takeoff: one component quantity table across many drawings.
+
+Each drawing's result is grouped by component code and level once, when it
+arrives, and added to the running totals; replacing or removing a drawing
+subtracts its earlier contribution. Adding the fortieth drawing of a block
+costs one group-by of that drawing's rows and an update of its keys' totals,
+instead of regrouping the rows of the other thirty-nine.
+"""
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ["Component Code", "Level(s)"]
+QUANTITY_COLUMN = "Component Quanity"
+DRAWINGS_COLUMN = "Drawings"
+
+def drawing_totals(df):
+    """Quantity per (component code, level) in one drawing's result table, as a Series."""
+    return df.groupby(KEY_COLUMNS, sort=False)[QUANTITY_COLUMN].sum()
+
+class ProjectTakeoff:
+    """Running totals over the drawings added so far, keyed by drawing name.
+
+    Every (code, level) key seen gets a fixed slot in the totals arrays, so a
+    drawing is added or removed by updating only its own keys' slots.
+    """
+
+    def __init__(self):
+        self.drawings = {}
+        self._keys = []
+        self._slots = {}
+        self._quantity = np.zeros(1024, dtype=np.int64)
+        self._drawing_count = np.zeros(1024, dtype=np.int64)
+
+    def _slots_for(self, keys):
+        slots = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+            slots[i] = slot
+        if len(self._keys) > len(self._quantity):
+            grow = np.zeros(max(len(self._keys), 2 * len(self._quantity)) - len(self._quantity), dtype=np.int64)
+            self._quantity = np.concatenate([self._quantity, grow])
+            self._drawing_count = np.concatenate([self._drawing_count, grow])
+        return slots
+
+    def add(self, name, file_hash, df):
+        """Add a drawing's result table, replacing the one added earlier under the same name."""
+        if name in self.drawings:
+            if self.drawings[name][0] == file_hash:
+                return
+            self.remove(name)
+        totals = drawing_totals(df)
+        slots = self._slots_for(totals.index)
+        quantities = totals.to_numpy(dtype=np.int64)
+        # Keys are unique within a drawing after the group-by, so plain fancy indexing adds correctly
+        self._quantity[slots] += quantities
+        self._drawing_count[slots] += 1
+        self.drawings[name] = (file_hash, slots, quantities, len(df))
+
+    def remove(self, name):
+        """Take a drawing's contribution out of the totals."""
+        if name not in self.drawings:
+            return
+        _, slots, quantities, _ = self.drawings.pop(name)
+        self._quantity[slots] -= quantities
+        self._drawing_count[slots] -= 1
+
+    def table(self):
+        """The aggregated takeoff: code, level, total quantity and how many drawings it appears in."""
+        present = np.flatnonzero(self._drawing_count[:len(self._keys)])
+        table = pd.DataFrame([self._keys[i] for i in present], columns=KEY_COLUMNS)
+        table[QUANTITY_COLUMN] = self._quantity[present]
+        table[DRAWINGS_COLUMN] = self._drawing_count[present]
+        return table.sort_values(KEY_COLUMNS, ignore_index=True)
+
+    def summary(self):
+        """One row per drawing: its name and the number of result rows it contributed."""
+        return pd.DataFrame(
+            [(name, rows) for name, (_, _, _, rows) in self.drawings.items()],
+            columns=["Drawing", "Rows"],
+        )
@@ -0,0 +1,96 @@
+import io
+import os
+import tempfile
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from pdf_text import count_pages, open_pdf
+from zones import zones_for_page, display_rect
+
+def page_windows(page_numbers, window):
+    """Group sorted 1-based page numbers into runs of consecutive pages at most `window` long."""
+    runs = []
+    for page_no in page_numbers:
+        if runs and page_no == runs[-1][1] + 1 and page_no - runs[-1][0] < window:
+            runs[-1][1] = page_no
+        else:
+            runs.append([page_no, page_no])
+    return runs
+
+def iter_page_images(pdf, dpi=300, window=1, pages=None, grayscale=False):
+    """Lazily render a PDF, yielding one PIL image per page in order.
+
+    `pages` restricts rendering to the given 1-based page numbers; grayscale
+    renders 8-bit gray images, a third of the size of colour. Only `window`
+    pages are rendered at a time and each image is closed once the consumer asks
+    for the next one, so callers must not keep references to yielded images.
+    Peak memory is bounded by the window, not the page count.
+    """
+    page_count = count_pages(pdf)
+    if pages is None:
+        pages = range(1, page_count + 1)
+    page_numbers = sorted(p for p in set(pages) if 1 <= p <= page_count)
+    if not page_numbers:
+        return
+
+    from pdf2image import convert_from_path  # imported on first OCR use to keep app start-up fast
+
+    # poppler reads from a file: use the ingested upload's path as is, or write bytes once
+    # (convert_from_bytes would write a fresh temp copy per window)
+    path = pdf
+    temp_path = None
+    if not isinstance(pdf, (str, os.PathLike)):
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        path = temp_path
+
+    try:
+        for first_page, last_page in page_windows(page_numbers, window):
+            images = convert_from_path(path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                       grayscale=grayscale)
+            while images:
+                img = images.pop(0)
+                try:
+                    yield img
+                finally:
+                    img.close()
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+def zone_image_pages(pdf, zones, pages=None):
+    """The 1-based page number of each image iter_zone_images will yield, in order."""
+    page_count = count_pages(pdf)
+    if pages is None:
+        pages = range(1, page_count + 1)
+    page_numbers = sorted(p for p in set(pages) if 1 <= p <= page_count)
+    return [page_no for page_no in page_numbers for _ in zones_for_page(zones, page_no)]
+
+def iter_zone_images(pdf, zones, dpi=300, pages=None, grayscale=False):
+    """Lazily render only the zone regions of each page, one PIL image per zone.
+
+    Pages without a zone are not rendered at all. Like iter_page_images, each
+    image is closed once the consumer moves on.
+    """
+    page_numbers = set(zone_image_pages(pdf, zones, pages))
+    with open_pdf(pdf) as doc:
+        for page_no in sorted(page_numbers):
+            page = doc[page_no - 1]
+            for zone in zones_for_page(zones, page_no):
+                pix = page.get_pixmap(dpi=dpi, clip=display_rect(zone, page), alpha=False,
+                                      colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
+                img = Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+                del pix
+                try:
+                    yield img
+                finally:
+                    img.close()
+
+def encode_png(img):
+    """Encode a PIL image as PNG into a rewound BytesIO."""
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='PNG')
+    img_byte_arr.seek(0)
+    return img_byte_arr
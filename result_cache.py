@@ -0,0 +1,204 @@
+import datetime
+import hashlib
+import io
+import json
+from pathlib import Path
+
+from db_pool import connect
+
+
+# Create data directory if it doesn't exist
+Path("data").mkdir(exist_ok=True)
+
+CACHE_DB = "data/result_cache.db"
+
+# Bump when the parsing logic changes in a way the regex patterns alone don't capture
+PARSER_VERSION = 4
+
+# Eviction limits: entries older than MAX_AGE_DAYS are dropped, then the least
+# recently used entries go until the cache fits in MAX_CACHE_BYTES
+MAX_AGE_DAYS = 30
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+# Per-page extraction output (text or positioned words) kept for revised drawing sets,
+# keyed by page fingerprint (see pdf_text.page_fingerprints); evicted the same way
+MAX_PAGE_CACHE_BYTES = 500 * 1024 * 1024
+
+def init_cache():
+    """Initialize the result cache table if it doesn't exist."""
+    with connect(CACHE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            file_hash TEXT NOT NULL,
+            method TEXT NOT NULL,
+            parser_version TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            last_access TIMESTAMP NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            result_json TEXT NOT NULL,
+            PRIMARY KEY (file_hash, method, parser_version)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS page_cache (
+            page_hash TEXT NOT NULL,
+            method TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            last_access TIMESTAMP NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            content_json TEXT NOT NULL,
+            PRIMARY KEY (page_hash, method)
+        )
+        ''')
+
+def compute_parser_version(*patterns):
+    """Fingerprint the parser so cached results are invalidated when the regex patterns change."""
+    digest = hashlib.sha256(str(PARSER_VERSION).encode("utf-8"))
+    for pattern in patterns:
+        digest.update(b"\0" + pattern.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def get_cached_result(file_hash, method, parser_version):
+    """Return the cached component DataFrame for this upload, or None on a miss."""
+    if not file_hash:
+        return None
+
+    with connect(CACHE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT result_json FROM extraction_cache
+            WHERE file_hash = ? AND method = ? AND parser_version = ?
+            """,
+            (file_hash, method, parser_version)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        cursor.execute(
+            """
+            UPDATE extraction_cache SET last_access = ?
+            WHERE file_hash = ? AND method = ? AND parser_version = ?
+            """,
+            (datetime.datetime.now().isoformat(), file_hash, method, parser_version)
+        )
+
+    import pandas as pd  # not needed to create the cache at app start-up
+
+    return pd.read_json(io.StringIO(row[0]), orient="split", dtype=False)
+
+def store_result(file_hash, method, parser_version, df):
+    """Store an extraction result and evict stale entries."""
+    if not file_hash:
+        return
+
+    result_json = df.to_json(orient="split", index=False)
+    now = datetime.datetime.now().isoformat()
+
+    with connect(CACHE_DB) as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO extraction_cache
+            (file_hash, method, parser_version, created_at, last_access, size_bytes, result_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (file_hash, method, parser_version, now, now, len(result_json), result_json)
+        )
+
+    evict()
+
+def get_cached_pages(page_keys):
+    """The stored extraction output of each (page_hash, method) key found, as a dict by key.
+
+    Text comes back as a string and positioned words as lists of [x0, y0, x1, y1, text].
+    """
+    if not page_keys:
+        return {}
+
+    found = {}
+    now = datetime.datetime.now().isoformat()
+    with connect(CACHE_DB) as conn:
+        cursor = conn.cursor()
+        for page_hash, method in page_keys:
+            cursor.execute(
+                "SELECT content_json FROM page_cache WHERE page_hash = ? AND method = ?",
+                (page_hash, method)
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                found[(page_hash, method)] = json.loads(row[0])
+        cursor.executemany(
+            "UPDATE page_cache SET last_access = ? WHERE page_hash = ? AND method = ?",
+            [(now, page_hash, method) for page_hash, method in found]
+        )
+    return found
+
+def store_pages(pages):
+    """Store per-page extraction output, a dict of content by (page_hash, method), and evict stale entries."""
+    if not pages:
+        return
+
+    now = datetime.datetime.now().isoformat()
+    rows = []
+    for (page_hash, method), content in pages.items():
+        content_json = json.dumps(content)
+        rows.append((page_hash, method, now, now, len(content_json), content_json))
+
+    with connect(CACHE_DB) as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO page_cache
+            (page_hash, method, created_at, last_access, size_bytes, content_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+
+    evict_pages()
+
+def evict_pages(max_age_days=MAX_AGE_DAYS, max_bytes=MAX_PAGE_CACHE_BYTES):
+    """Like evict, for the per-page cache."""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat()
+
+    with connect(CACHE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM page_cache WHERE last_access < ?", (cutoff,))
+
+        cursor.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM page_cache")
+        total = cursor.fetchone()[0]
+        if total > max_bytes:
+            cursor.execute("SELECT page_hash, method, size_bytes FROM page_cache ORDER BY last_access ASC")
+            stale = []
+            for page_hash, method, size_bytes in cursor.fetchall():
+                if total <= max_bytes:
+                    break
+                stale.append((page_hash, method))
+                total -= size_bytes
+            cursor.executemany("DELETE FROM page_cache WHERE page_hash = ? AND method = ?", stale)
+
+def evict(max_age_days=MAX_AGE_DAYS, max_bytes=MAX_CACHE_BYTES):
+    """Drop entries past the age limit, then least recently used ones until under the size limit."""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat()
+
+    with connect(CACHE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM extraction_cache WHERE last_access < ?", (cutoff,))
+
+        cursor.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extraction_cache")
+        total = cursor.fetchone()[0]
+        if total > max_bytes:
+            cursor.execute(
+                "SELECT file_hash, method, parser_version, size_bytes FROM extraction_cache ORDER BY last_access ASC"
+            )
+            stale = []
+            for file_hash, method, parser_version, size_bytes in cursor.fetchall():
+                if total <= max_bytes:
+                    break
+                stale.append((file_hash, method, parser_version))
+                total -= size_bytes
+            cursor.executemany(
+                "DELETE FROM extraction_cache WHERE file_hash = ? AND method = ? AND parser_version = ?",
+                stale
+            )
@@ -0,0 +1,171 @@
+"""Layout-aware pairing of level brackets with component codes.
+
+Instead of attaching each bracket to the component that precedes it in the
+flattened text, words keep their positions on the sheet, brackets are
+rebuilt from the words of each line, and every bracket goes to the nearest
+component on the same page via a uniform grid index.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+from component_parser import TOKEN_SCANNER, OCR_TOKEN_SCANNER, REJECTED, count_levels
+
+# A positioned word or token on a page, in page points (or any consistent unit per page)
+Word = namedtuple("Word", ["x0", "y0", "x1", "y1", "text"])
+
+# Grid cell size and the farthest a bracket may be from its component, in points
+GRID_CELL = 24.0
+MAX_DISTANCE = 300.0
+
+def group_lines(words):
+    """Group words into text lines (top to bottom, each left to right) by vertical overlap."""
+    lines = []
+    for word in sorted(words, key=lambda w: ((w.y0 + w.y1) / 2, w.x0)):
+        center = (word.y0 + word.y1) / 2
+        if lines:
+            line = lines[-1]
+            line_center = (line["y0"] + line["y1"]) / 2
+            half_height = max(line["y1"] - line["y0"], word.y1 - word.y0) / 2
+            if abs(center - line_center) <= half_height:
+                line["words"].append(word)
+                line["y0"] = min(line["y0"], word.y0)
+                line["y1"] = max(line["y1"], word.y1)
+                continue
+        lines.append({"y0": word.y0, "y1": word.y1, "words": [word]})
+    return [sorted(line["words"], key=lambda w: w.x0) for line in lines]
+
+def words_to_text(words):
+    """Plain text of positioned words, a line per text line, for the text parser."""
+    return "".join(" ".join(word.text for word in line) + "\n" for line in group_lines(words))
+
+def tokens_from_words(words, resolve=None):
+    """Component and bracket tokens with boxes, in reading order.
+
+    Each line's words are joined with spaces and scanned as text, so a bracket
+    split over several words, like "(2," "4-6)", becomes one token whose box
+    spans them. resolve works as in extract_components_from_pages, except that
+    a rejected component is kept with text None, so the brackets nearest to it
+    still attach to it rather than to a neighbour.
+    """
+    scanner = OCR_TOKEN_SCANNER if resolve else TOKEN_SCANNER
+    components = []
+    brackets = []
+    for line in group_lines(words):
+        text = ""
+        spans = []
+        for word in line:
+            if text:
+                text += " "
+            spans.append((len(text), len(text) + len(word.text), word))
+            text += word.text
+
+        for match in scanner.finditer(text):
+            token_text = match.group()
+            if resolve and match.lastgroup == "component":
+                token_text = resolve(token_text)
+                if token_text is None:
+                    continue
+                if token_text is REJECTED:
+                    token_text = None
+            start, end = match.span()
+            covered = [word for a, b, word in spans if a < end and b > start]
+            token = Word(
+                min(w.x0 for w in covered), min(w.y0 for w in covered),
+                max(w.x1 for w in covered), max(w.y1 for w in covered),
+                token_text,
+            )
+            if match.lastgroup == "component":
+                components.append(token)
+            else:
+                brackets.append(token)
+    return components, brackets
+
+def box_distance(a, b):
+    """Gap between two boxes; 0 when they touch or overlap."""
+    dx = max(0.0, b.x0 - a.x1, a.x0 - b.x1)
+    dy = max(0.0, b.y0 - a.y1, a.y0 - b.y1)
+    return math.hypot(dx, dy)
+
+def _ring_cells(x0, y0, x1, y1, fill):
+    """Cells on the border of the cell rectangle [x0, x1] x [y0, y1], or all of them when fill is set."""
+    if fill:
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield cx, cy
+        return
+    for cx in range(x0, x1 + 1):
+        yield cx, y0
+        yield cx, y1
+    for cy in range(y0 + 1, y1):
+        yield x0, cy
+        yield x1, cy
+
+class ComponentGrid:
+    """Uniform grid over component boxes for nearest-component queries."""
+
+    def __init__(self, components, cell=GRID_CELL):
+        self.components = components
+        self.cell = cell
+        self.cells = defaultdict(list)
+        for index, box in enumerate(components):
+            for cx in range(self._cell(box.x0), self._cell(box.x1) + 1):
+                for cy in range(self._cell(box.y0), self._cell(box.y1) + 1):
+                    self.cells[(cx, cy)].append(index)
+
+    def _cell(self, value):
+        return int(math.floor(value / self.cell))
+
+    def nearest(self, box, max_distance=MAX_DISTANCE):
+        """Index of the component closest to box, or None if none is within max_distance.
+
+        Rings of cells are searched outwards from the box. After ring r every
+        unseen component is more than r cells away, so the search stops as soon
+        as the best match is closer than that. Ties go to the earlier component
+        in reading order.
+        """
+        if not self.components:
+            return None
+        cx0, cx1 = self._cell(box.x0), self._cell(box.x1)
+        cy0, cy1 = self._cell(box.y0), self._cell(box.y1)
+        max_ring = int(math.ceil(max_distance / self.cell)) + 1
+
+        best = None
+        seen = set()
+        for ring in range(max_ring + 1):
+            for key in _ring_cells(cx0 - ring, cy0 - ring, cx1 + ring, cy1 + ring, ring == 0):
+                for index in self.cells.get(key, ()):
+                    if index in seen:
+                        continue
+                    seen.add(index)
+                    candidate = (box_distance(box, self.components[index]), index)
+                    if best is None or candidate < best:
+                        best = candidate
+            if best is not None and best[0] <= ring * self.cell:
+                break
+
+        if best is None or best[0] > max_distance:
+            return None
+        return best[1]
+
+def associate_page(words, max_distance=MAX_DISTANCE, resolve=None):
+    """(component, level text, quantity) for one page, attaching each bracket to its nearest component."""
+    components, brackets = tokens_from_words(words, resolve)
+    grid = ComponentGrid(components)
+    levels = [[] for _ in components]
+    for bracket in brackets:
+        index = grid.nearest(bracket, max_distance)
+        if index is not None:
+            levels[index].append(bracket.text)
+
+    return [
+        (component.text, ", ".join(component_levels), sum(count_levels(lvl) for lvl in component_levels))
+        for component, component_levels in zip(components, levels)
+        if component.text is not None
+    ]
+
+def associate_components(page_words, max_distance=MAX_DISTANCE, resolve=None):
+    """Layout-aware equivalent of extract_components_from_pages, from per-page word lists."""
+    pairs = []
+    for words in page_words:
+        pairs.extend(associate_page(words, max_distance, resolve))
+    return pairs
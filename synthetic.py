@@ -0,0 +1,136 @@
+"""Synthetic precast drawing PDFs for benchmarks and checks.
+
+Each sheet is a grid of component outlines, each labelled with a component
+code and its level bracket, e.g. "1TD2aX-3 (2, 4-6)", inside a border with
+grid references and a title block. Scanned sheets are the same drawing
+rendered to an image with no text layer, like a scan of a printed sheet.
+
+    python synthetic.py drawing.pdf --pages 20 --components 150 --scanned 0.25
+"""
+import argparse
+import math
+import random
+
+import fitz  # PyMuPDF
+
+# Landscape sheet sizes in points
+SHEET_SIZES = {"A3": (1191, 842), "A2": (1684, 1191), "A1": (2384, 1684), "A0": (3370, 2384)}
+
+STRUCTURE_TYPES = ["A", "AC", "TD", "TC", "CWD", "S", "W", "DW"]
+SUFFIXES = ["", "", "", "-CS", "-E", "-P", "-M", "-L"]
+
+def random_component(rng):
+    """A component code in the 1TD2aX-3 style."""
+    return (f"{rng.choice('12')}{rng.choice(STRUCTURE_TYPES)}{rng.randint(1, 9)}"
+            f"{rng.choice(['a', 'b', 'bX', ''])}-{rng.randint(1, 12)}{rng.choice(SUFFIXES)}")
+
+def random_levels(rng):
+    """A level bracket like (3), (2-9) or (2, 4-6)."""
+    parts = []
+    level = rng.randint(1, 4)
+    for _ in range(rng.randint(1, 3)):
+        if rng.random() < 0.5:
+            end = level + rng.randint(1, 6)
+            parts.append(f"{level}-{end}")
+            level = end + rng.randint(2, 3)
+        else:
+            parts.append(str(level))
+            level += rng.randint(1, 3)
+    return f"({', '.join(parts)})"
+
+def draw_sheet(page, rng, components, sheet_no):
+    """Draw one vector sheet and return its (code, levels) labels in drawing order."""
+    width, height = page.rect.width, page.rect.height
+    margin = 30
+    title_height = 60
+    frame = fitz.Rect(margin, margin, width - margin, height - margin - title_height)
+
+    shape = page.new_shape()
+    shape.draw_rect(fitz.Rect(margin / 2, margin / 2, width - margin / 2, height - margin / 2))
+    shape.draw_rect(frame)
+    shape.draw_rect(fitz.Rect(margin, height - margin - title_height + 8, width - margin, height - margin))
+    shape.finish(color=(0, 0, 0), width=0.8)
+
+    # Grid of bays sized so the components fit with the sheet's aspect ratio
+    cols = max(1, math.ceil(math.sqrt(components * frame.width / frame.height)))
+    rows = max(1, math.ceil(components / cols))
+    cell_w = frame.width / cols
+    cell_h = frame.height / rows
+    fontsize = max(3.0, min(9.0, cell_w / 16, cell_h / 3))
+
+    for col in range(cols):
+        shape.draw_line(fitz.Point(frame.x0 + col * cell_w, frame.y0), fitz.Point(frame.x0 + col * cell_w, frame.y1))
+    for row in range(rows):
+        shape.draw_line(fitz.Point(frame.x0, frame.y0 + row * cell_h), fitz.Point(frame.x1, frame.y0 + row * cell_h))
+    shape.finish(color=(0.6, 0.6, 0.6), width=0.3, dashes="[4 2] 0")
+
+    labels = []
+    for index in range(components):
+        col, row = index % cols, index // cols
+        cell = fitz.Rect(frame.x0 + col * cell_w, frame.y0 + row * cell_h,
+                         frame.x0 + (col + 1) * cell_w, frame.y0 + (row + 1) * cell_h)
+        # The panel outline, plus some hatching so pages carry realistic line work
+        panel = fitz.Rect(cell.x0 + cell_w * 0.1, cell.y0 + cell_h * 0.45, cell.x1 - cell_w * 0.1, cell.y1 - cell_h * 0.1)
+        shape.draw_rect(panel)
+        for k in range(1, 4):
+            x = panel.x0 + panel.width * k / 4
+            shape.draw_line(fitz.Point(x, panel.y0), fitz.Point(x - panel.width / 8, panel.y1))
+
+        code, levels = random_component(rng), random_levels(rng)
+        page.insert_text(fitz.Point(cell.x0 + cell_w * 0.1, cell.y0 + cell_h * 0.35), f"{code} {levels}", fontsize=fontsize)
+        labels.append((code, levels))
+    shape.finish(color=(0, 0, 0.5), width=0.4)
+
+    for col in range(cols):
+        page.insert_text(fitz.Point(frame.x0 + (col + 0.5) * cell_w, frame.y0 - 6), str(col + 1), fontsize=7)
+    for row in range(rows):
+        page.insert_text(fitz.Point(frame.x0 - 14, frame.y0 + (row + 0.5) * cell_h), chr(65 + row % 26), fontsize=7)
+    page.insert_text(fitz.Point(margin + 10, height - margin - 20),
+                     f"PRECAST KEY PLAN - BLOCK {rng.randint(100, 999)} - SHEET {sheet_no}    SCALE 1:100    LEVEL 1 TO 12",
+                     fontsize=12)
+    shape.commit()
+    return labels
+
+def make_drawing(pages=10, sheet="A1", components=150, scanned=0.0, dpi=150, seed=0):
+    """Generate a drawing set and return (PDF bytes, labels per page).
+
+    `scanned` is the fraction of pages turned into images at `dpi` with no
+    text layer; which pages is chosen at random (by `seed`).
+    """
+    rng = random.Random(seed)
+    width, height = SHEET_SIZES[sheet]
+    scanned_pages = set(rng.sample(range(pages), round(pages * scanned)))
+
+    doc = fitz.open()
+    truth = []
+    for page_index in range(pages):
+        page = doc.new_page(width=width, height=height)
+        truth.append(draw_sheet(page, rng, components, page_index + 1))
+        if page_index in scanned_pages:
+            png = page.get_pixmap(dpi=dpi, alpha=False).tobytes("png")
+            doc.delete_page(page_index)
+            page = doc.new_page(pno=page_index, width=width, height=height)
+            page.insert_image(page.rect, stream=png)
+
+    pdf = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return pdf, truth
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--sheet", default="A1", choices=SHEET_SIZES)
+    parser.add_argument("--components", type=int, default=150, help="Labelled components per sheet")
+    parser.add_argument("--scanned", type=float, default=0.0, help="Fraction of sheets without a text layer")
+    parser.add_argument("--dpi", type=int, default=150, help="Resolution of the scanned sheets")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pdf, truth = make_drawing(args.pages, args.sheet, args.components, args.scanned, args.dpi, args.seed)
+    with open(args.out, "wb") as f:
+        f.write(pdf)
+    print(f"Wrote {args.out}: {args.pages} {args.sheet} sheets, {sum(map(len, truth))} labels, {len(pdf) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
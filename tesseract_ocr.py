@@ -0,0 +1,140 @@
+"""Local OCR with Tesseract, for scanned drawings without a cloud service.
+
+Pages are rendered with PyMuPDF and read by the tesseract binary (through
+pytesseract) in worker processes, one page per task, so throughput grows
+with the number of cores, and nothing leaves the machine. Pages are never
+read in the calling process, even with one worker: pytesseract's binary
+path is a module global and the thread limit an environment variable, and
+in the app's server process those would be shared by every session. One
+image_to_data call per image gives both the positioned words and the text.
+
+Settings come from a [tesseract] section of the credentials mapping, next
+to the cloud services' keys; every entry is optional:
+
+    [tesseract]
+    psm = 11                     # page segmentation mode, see PSM_MODES
+    dpi = 300
+    lang = "eng"
+    cmd = "/usr/bin/tesseract"   # if it isn't on PATH
+"""
+import os
+import tempfile
+import time
+from contextlib import closing
+
+import fitz  # PyMuPDF
+
+from pdf_text import MAX_WORKERS, count_pages, open_pdf, run_in_pool
+from spatial import Word
+from zones import zones_for_page, display_rect
+
+TESSERACT_METHOD = "Tesseract (local)"
+
+# Sparse text finds the labels scattered over a drawing; the automatic modes look for columns
+TESSERACT_DEFAULTS = {"psm": 11, "dpi": 300, "lang": "eng", "cmd": None}
+
+# Page segmentation modes that make sense for drawings (see tesseract --help-psm)
+PSM_MODES = {
+    3: "Automatic",
+    4: "Single column of text",
+    6: "Single block of text",
+    11: "Sparse text",
+    12: "Sparse text with orientation detection",
+}
+
+def tesseract_settings(credentials=None):
+    """TESSERACT_DEFAULTS updated with the [tesseract] section of the credentials, if any."""
+    settings = dict(TESSERACT_DEFAULTS)
+    if credentials is not None:
+        settings.update(credentials.get("tesseract") or {})
+    return settings
+
+def settings_key(settings):
+    """The settings that change the result, for the result cache key."""
+    return f"psm {settings['psm']} dpi {settings['dpi']} lang {settings['lang']}"
+
+def _image_data(image_path, settings):
+    try:
+        import pytesseract
+    except ImportError as e:
+        raise RuntimeError("Tesseract OCR needs pytesseract: pip install pytesseract") from e
+
+    # Set on every call, as pool workers are reused by tasks with other settings
+    pytesseract.pytesseract.tesseract_cmd = settings["cmd"] or "tesseract"
+    try:
+        return pytesseract.image_to_data(image_path, lang=settings["lang"], config=f"--psm {settings['psm']}",
+                                         output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractNotFoundError as e:
+        raise RuntimeError("Tesseract OCR needs the tesseract binary: apt install tesseract-ocr "
+                           "(or set cmd in the [tesseract] settings)") from e
+
+def _ocr_page(pdf, page_no, zones, settings, words):
+    """OCR one page (or its zones) in a pool worker and return (text or Words in page points, seconds)."""
+    # Pages already run in parallel; Tesseract's own threads would only compete with them
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    start = time.perf_counter()
+    dpi = settings["dpi"]
+    scale = 72.0 / dpi
+    page_words = []
+    lines = {}
+    with open_pdf(pdf) as doc:
+        page = doc[page_no - 1]
+        clips = [None] if not zones else [display_rect(zone, page) for zone in zones_for_page(zones, page_no)]
+        for region, clip in enumerate(clips):
+            # Tesseract works on grayscale anyway; rendering it directly is a third of the pixels.
+            # The image is handed over as an uncompressed PGM file: pytesseract would otherwise
+            # PNG-encode a PIL image, which takes longer than rendering it (0.56s vs 0.03s for A1)
+            pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+            fd, image_path = tempfile.mkstemp(suffix=".pgm")
+            os.close(fd)
+            try:
+                pix.save(image_path)
+                del pix
+                data = _image_data(image_path, settings)
+            finally:
+                os.remove(image_path)
+            x_offset, y_offset = (clip.x0 - page.rect.x0, clip.y0 - page.rect.y0) if clip else (0.0, 0.0)
+            for i, text in enumerate(data["text"]):
+                # Rows for blocks, paragraphs and lines have no text and a confidence of -1
+                text = text.strip()
+                if not text or float(data["conf"][i]) < 0:
+                    continue
+                left, top = data["left"][i], data["top"][i]
+                page_words.append(Word(x_offset + left * scale, y_offset + top * scale,
+                                       x_offset + (left + data["width"][i]) * scale,
+                                       y_offset + (top + data["height"][i]) * scale, text))
+                line = (region, data["block_num"][i], data["par_num"][i], data["line_num"][i])
+                lines.setdefault(line, []).append(text)
+
+    if words:
+        return page_words, time.perf_counter() - start
+    text = "".join(" ".join(line_words) + "\n" for line_words in lines.values())
+    return text, time.perf_counter() - start
+
+def tesseract_pages(pdf, pages=None, zones=None, words=False, credentials=None, workers=1, timer=None,
+                    progress=None):
+    """OCR the given 1-based pages (all pages by default) locally and return one result per page, in page order.
+
+    Results are text, or with words=True lists of Words in page points. Pages
+    are spread over `workers` processes of the shared pool. progress, if
+    given, is called with 1 after each page; an exception it raises stops
+    the OCR.
+    """
+    settings = tesseract_settings(credentials)
+    page_numbers = sorted(pages) if pages is not None else list(range(1, count_pages(pdf) + 1))
+    workers = max(1, min(workers, MAX_WORKERS, len(page_numbers)))
+    results = {}
+
+    def finished(page_no, result, seconds):
+        results[page_no] = result
+        if timer is not None:
+            timer.add_page("tesseract", seconds)
+        if progress:
+            progress(1)
+
+    # One page per task: pages take seconds each, so finer tasks balance the workers
+    tasks = [(pdf, page_no, zones, settings, words) for page_no in page_numbers]
+    with closing(run_in_pool(_ocr_page, tasks, workers)) as done:
+        for index, (result, seconds) in done:
+            finished(page_numbers[index], result, seconds)
+    return [results[page_no] for page_no in page_numbers]
@@ -0,0 +1,124 @@
+"""Tiled OCR for sheets too large to send whole.
+
+A page (or zone) whose image at the OCR resolution is longer than the
+service's tile side is cut into a grid of overlapping tiles, and each tile
+is sent as its own image, concurrently like separate pages. Labels stay at
+full resolution instead of being scaled down to fit a size limit or by the
+service itself.
+
+Each tile owns the part of the page nearest to it: its core, which ends
+halfway across the overlap with each neighbour. Words from a tile are kept
+only if their centre lies in its core, so a label in an overlap is counted
+once, by position, and a label cut by a tile's edge is dropped there and
+read whole from the neighbour (it is whole there as long as it is narrower
+than half the overlap).
+
+Settings come from a [tiling] section of the credentials mapping:
+
+    [tiling]
+    tile_side = 5000   # pixels at the OCR resolution; 0 turns tiling off
+    overlap = 144      # points
+"""
+import math
+from collections import namedtuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from pdf_text import count_pages, open_pdf
+from zones import zones_for_page, display_rect
+
+# Longest tile side per service, in pixels at its OCR resolution. Azure reads up to
+# 10000 px; Google takes 75 megapixels but reads small text better in smaller images;
+# OCR.space's 1 MB limit would otherwise shrink an A1 sheet to about a third
+TILE_SIDE = {
+    "OCR Space API": 5000,
+    "Microsoft Azure OCR": 10000,
+    "Google Vision OCR": 10000,
+}
+
+# Overlap between neighbouring tiles, in points; labels up to half as wide are read whole once
+TILE_OVERLAP = 144.0
+
+# page: 1-based page number; rect: the tile in displayed page points;
+# core: the part of the page whose words this tile owns (infinite towards the region's edges)
+Tile = namedtuple("Tile", ["page", "rect", "core"])
+
+def tiling_settings(credentials=None, method=None):
+    """The tile side for the method and the overlap, updated with the [tiling] section of the credentials."""
+    settings = {"tile_side": TILE_SIDE.get(method, 0), "overlap": TILE_OVERLAP}
+    if credentials is not None:
+        settings.update(credentials.get("tiling") or {})
+    return settings
+
+def settings_key(settings):
+    """The settings that change the result, for the result cache key."""
+    return f"tiles {settings['tile_side']} overlap {settings['overlap']:g}" if settings["tile_side"] else "no tiles"
+
+def _axis_tiles(start, stop, max_length, overlap):
+    # Equal tiles over [start, stop), each at most max_length long and overlapping the next by `overlap`
+    length = stop - start
+    count = max(1, math.ceil((length - overlap) / (max_length - overlap)))
+    size = (length + (count - 1) * overlap) / count
+    spans = [(start + i * (size - overlap), start + i * (size - overlap) + size) for i in range(count)]
+    # Neighbouring cores meet in the middle of their overlap
+    cores = [(-math.inf if i == 0 else (spans[i - 1][1] + spans[i][0]) / 2,
+              math.inf if i == count - 1 else (spans[i][1] + spans[i + 1][0]) / 2) for i in range(count)]
+    return spans, cores
+
+def split_region(page_no, rect, max_side, overlap):
+    """Tiles covering rect (points), none longer than max_side points, as a list of Tiles."""
+    if max_side <= overlap:
+        raise ValueError("Tiles must be longer than their overlap")
+    x_spans, x_cores = _axis_tiles(rect.x0, rect.x1, max_side, overlap)
+    y_spans, y_cores = _axis_tiles(rect.y0, rect.y1, max_side, overlap)
+    return [
+        Tile(page_no, fitz.Rect(x0, y0, x1, y1), (core_x0, core_y0, core_x1, core_y1))
+        for (y0, y1), (core_y0, core_y1) in zip(y_spans, y_cores)
+        for (x0, x1), (core_x0, core_x1) in zip(x_spans, x_cores)
+    ]
+
+def page_tiles(pdf, dpi, settings, pages=None, zones=None):
+    """Every image to OCR as a Tile: each page (or each of its zones), split into tiles where it is too large.
+
+    Returns None when nothing needs splitting, so the caller can render whole pages as before.
+    """
+    if not settings["tile_side"]:
+        return None
+    max_side = settings["tile_side"] * 72.0 / dpi
+    page_count = count_pages(pdf)
+    if pages is None:
+        pages = range(1, page_count + 1)
+    tiles = []
+    split = False
+    with open_pdf(pdf) as doc:
+        for page_no in sorted(p for p in set(pages) if 1 <= p <= page_count):
+            page = doc[page_no - 1]
+            regions = [display_rect(zone, page) for zone in zones_for_page(zones, page_no)] if zones else [page.rect]
+            for rect in regions:
+                region_tiles = split_region(page_no, rect, max_side, settings["overlap"])
+                split = split or len(region_tiles) > 1
+                tiles.extend(region_tiles)
+    return tiles if split else None
+
+def iter_tile_images(pdf, tiles, dpi=300, grayscale=False):
+    """Lazily render each tile, one PIL image per tile; each image is closed once the consumer moves on."""
+    with open_pdf(pdf) as doc:
+        for tile in tiles:
+            page = doc[tile.page - 1]
+            pix = page.get_pixmap(dpi=dpi, clip=tile.rect, alpha=False,
+                                  colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
+            img = Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+            del pix
+            try:
+                yield img
+            finally:
+                img.close()
+
+def owned_words(tile, words):
+    """The words (in page points) whose centre is in the tile's core."""
+    core_x0, core_y0, core_x1, core_y1 = tile.core
+    return [
+        word for word in words
+        if core_x0 <= (word.x0 + word.x1) / 2 < core_x1 and core_y0 <= (word.y0 + word.y1) / 2 < core_y1
+    ]
@@ -1,28 +1,29 @@
-import sqlite3
 import bcrypt
 import re
 import os
 from pathlib import Path
 
+from db_pool import connect
+
 # Create data directory if it doesn't exist
 Path("data").mkdir(exist_ok=True)
 
+USERS_DB = "data/users.db"
+
 def init_user_db():
     """Initialize user database with a table if it doesn't exist."""
-    conn = sqlite3.connect("data/users.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        role TEXT NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    conn.commit()
-    conn.close()
+    with connect(USERS_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            role TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
 
 def validate_email(email):
     """Validate email format."""
@@ -47,37 +48,31 @@ def add_user(name, email, role, password):
     if not validate_password(password):
         raise ValueError("Password must be at least 8 characters long")
     
-    # Check if user already exists
-    conn = sqlite3.connect("data/users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM users WHERE email = ?", (email,))
-    if cursor.fetchone()[0] > 0:
-        conn.close()
-        raise ValueError("User with this email already exists")
-    
-    # Hash the password
+    # Hash the password before taking a connection; bcrypt is deliberately slow
     password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    
-    # Insert user with parameterized query
-    cursor.execute(
-        "INSERT INTO users (name, email, role, password_hash) VALUES (?, ?, ?, ?)",
-        (name, email, role, password_hash.decode('utf-8'))
-    )
-    conn.commit()
-    conn.close()
+
+    with connect(USERS_DB) as conn:
+        cursor = conn.cursor()
+
+        # Check if user already exists
+        cursor.execute("SELECT COUNT(*) FROM users WHERE email = ?", (email,))
+        if cursor.fetchone()[0] > 0:
+            raise ValueError("User with this email already exists")
+
+        # Insert user with parameterized query
+        cursor.execute(
+            "INSERT INTO users (name, email, role, password_hash) VALUES (?, ?, ?, ?)",
+            (name, email, role, password_hash.decode('utf-8'))
+        )
 
 def authenticate_user(email, password):
     """Authenticate a user with protection against SQL injection."""
     if not email or not password:
         return False
     
-    conn = sqlite3.connect("data/users.db")
-    cursor = conn.cursor()
-    
-    # Use parameterized query to prevent SQL injection
-    cursor.execute("SELECT name, role, password_hash FROM users WHERE email = ?", (email,))
-    user = cursor.fetchone()
-    conn.close()
+    with connect(USERS_DB) as conn:
+        # Use parameterized query to prevent SQL injection
+        user = conn.execute("SELECT name, role, password_hash FROM users WHERE email = ?", (email,)).fetchone()
 
     if user and bcrypt.checkpw(password.encode('utf-8'), user[2].encode('utf-8')):
         return user[0], user[1]  # Return name and role
@@ -0,0 +1,89 @@
+"""Extraction zones: page regions that restrict where text is read or OCR'd.
+
+A zone is a dict with "page" (1-based, or 0 for every page) and "x0", "y0",
+"x1", "y1" as fractions of the page width/height measured from the top-left
+corner of the page as displayed. Fractions keep a template reusable across
+drawings of the same layout whatever their sheet size.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+# Create template directory if it doesn't exist
+TEMPLATE_DIR = Path("data/zone_templates")
+TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+
+def clean_zones(zones):
+    """Drop incomplete or empty zones and clamp the rest to the page."""
+    cleaned = []
+    for zone in zones or []:
+        try:
+            page = int(zone.get("page") or 0)
+            x0, y0, x1, y1 = (min(1.0, max(0.0, float(zone[k]))) for k in ("x0", "y0", "x1", "y1"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        if x1 - x0 > 0 and y1 - y0 > 0 and page >= 0:
+            cleaned.append({"page": page, "x0": x0, "y0": y0, "x1": x1, "y1": y1})
+    return cleaned
+
+def zones_for_page(zones, page_no):
+    """Zones that apply to a 1-based page number."""
+    return [zone for zone in zones if zone["page"] in (0, page_no)]
+
+def zones_key(zones):
+    """Short fingerprint of a zone set, for cache keys; empty when there are no zones."""
+    if not zones:
+        return ""
+    payload = json.dumps(clean_zones(zones), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+def display_rect(zone, page):
+    """Zone as a fitz.Rect in the page's displayed (rotated) coordinates, as used by get_pixmap."""
+    rect = page.rect
+    return fitz.Rect(
+        rect.x0 + zone["x0"] * rect.width,
+        rect.y0 + zone["y0"] * rect.height,
+        rect.x0 + zone["x1"] * rect.width,
+        rect.y0 + zone["y1"] * rect.height,
+    )
+
+def text_rect(zone, page):
+    """Zone as a fitz.Rect in unrotated page coordinates, as used by get_text(clip=...)."""
+    return display_rect(zone, page) * page.derotation_matrix
+
+def plumber_bbox(zone, page):
+    """Zone as a pdfplumber crop bbox (x0, top, x1, bottom)."""
+    left, top, right, bottom = page.bbox
+    width, height = right - left, bottom - top
+    return (
+        left + zone["x0"] * width,
+        top + zone["y0"] * height,
+        left + zone["x1"] * width,
+        top + zone["y1"] * height,
+    )
+
+def _template_path(name):
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name.strip()).strip("._")
+    if not slug:
+        raise ValueError("Template name is required")
+    return TEMPLATE_DIR / f"{slug}.json"
+
+def list_templates():
+    """Names of saved zone templates."""
+    return sorted(path.stem for path in TEMPLATE_DIR.glob("*.json"))
+
+def save_template(name, zones):
+    """Save a zone set as a reusable template for a drawing layout."""
+    zones = clean_zones(zones)
+    if not zones:
+        raise ValueError("A template needs at least one zone")
+    _template_path(name).write_text(json.dumps(zones, indent=2))
+
+def load_template(name):
+    """Load a saved zone template."""
+    return clean_zones(json.loads(_template_path(name).read_text()))